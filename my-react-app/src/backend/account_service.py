@@ -0,0 +1,151 @@
+"""
+Limpieza masiva de cuentas inactivas (eliminar o anonimizar)
+
+Una cuenta es inactiva si no es admin, se creó antes del corte y no tiene
+reservas (creadas o con fecha de evento) ni eventos desde entonces. Se
+procesan en lotes de ACCOUNT_PURGE_BATCH_SIZE con sentencias por conjunto,
+un commit por lote:
+
+- delete: DELETE de los usuarios; eventos, reservas, trabajos programados
+  y tokens de recuperación caen por ON DELETE CASCADE en la base. Antes se
+  liberan las unidades de disfraz, se descuenta de los rollups el aporte
+  de sus reservas (también las archivadas), se registran tombstones para
+  /api/changes y se borra lo archivado de esos usuarios.
+- anonymize: conserva reservas y eventos (historial del negocio) pero
+  reemplaza nombre, email, teléfono y contraseña, y borra dirección,
+  pedidos especiales y descripciones.
+"""
+import os
+import secrets
+from datetime import datetime, timedelta
+from sqlalchemy import String, case, cast, delete, func, insert, literal, select, update
+from models import (
+    db, bcrypt, User, Booking, Event, PasswordReset, ChangeLog, CostumeStockDay,
+    BookingArchive, EventArchive
+)
+from analytics_service import booking_analytics
+from calendar_service import booking_calendar
+from cache import data_cache
+
+
+ANONYMIZED_DOMAIN = "anonimizado.invalid"
+
+
+class AccountService:
+    """Selecciona cuentas inactivas y las elimina o anonimiza por lotes"""
+
+    def __init__(self):
+        self.batch_size = int(os.environ.get("ACCOUNT_PURGE_BATCH_SIZE", "200"))
+        self.default_inactive_days = int(os.environ.get("ACCOUNT_INACTIVE_DAYS", "730"))
+
+    # ------------------------------------
+    # Selección
+    # ------------------------------------
+
+    def _inactive_filters(self, cutoff):
+        recent_booking = select(Booking.id).where(
+            Booking.user_id == User.id,
+            db.or_(Booking.created_at >= cutoff, Booking.event_date >= cutoff.date())
+        ).exists()
+        recent_event = select(Event.id).where(Event.user_id == User.id, Event.created_at >= cutoff).exists()
+        return [
+            User.role != "admin",
+            User.created_at < cutoff,
+            ~User.email.like(f"%@{ANONYMIZED_DOMAIN}"),
+            ~recent_booking,
+            ~recent_event,
+        ]
+
+    def count_inactive(self, inactive_days):
+        cutoff = datetime.utcnow() - timedelta(days=inactive_days)
+        return db.session.query(func.count(User.id)).filter(*self._inactive_filters(cutoff)).scalar()
+
+    # ------------------------------------
+    # Ejecución por lotes
+    # ------------------------------------
+
+    def purge(self, mode, inactive_days, max_batches=50):
+        """Procesa las cuentas inactivas. Devuelve cuántas"""
+        cutoff = datetime.utcnow() - timedelta(days=inactive_days)
+        filters = self._inactive_filters(cutoff)
+        handler = self._delete_batch if mode == "delete" else self._anonymize_batch
+        processed = 0
+        for _ in range(max_batches):
+            ids = [row.id for row in db.session.query(User.id).filter(*filters)
+                   .order_by(User.id).limit(self.batch_size)]
+            if not ids:
+                break
+            touched_days = handler(ids)
+            db.session.commit()
+            booking_calendar.invalidate(*touched_days)
+            data_cache.invalidate("users", "stats")
+            processed += len(ids)
+            if len(ids) < self.batch_size:
+                break
+        print(f"🧹 {processed} cuentas inactivas procesadas ({mode})")
+        return processed
+
+    def _delete_batch(self, ids):
+        """Borra un lote de usuarios. Devuelve los días con reservas eliminadas"""
+        days = [day for (day,) in db.session.query(Booking.event_date).filter(Booking.user_id.in_(ids)).distinct()]
+
+        # Rollups: se resta el aporte agregado del lote, en la misma transacción. También el
+        # de lo archivado: backfill no reconstruye los días anteriores al corte de archivo
+        for model in (Booking, BookingArchive):
+            booking_analytics.apply(booking_analytics.aggregate(model.user_id.in_(ids), source=model), sign=-1)
+
+        # Unidades de disfraz que ocupaban sus reservas activas
+        held = select(func.count(Booking.id)).where(
+            Booking.user_id.in_(ids), Booking.status != "cancelled",
+            Booking.costume_id == CostumeStockDay.costume_id, Booking.event_date == CostumeStockDay.day
+        ).scalar_subquery()
+        db.session.execute(
+            update(CostumeStockDay).where(held > 0)
+            .values(reserved=case((CostumeStockDay.reserved > held, CostumeStockDay.reserved - held), else_=0))
+            .execution_options(synchronize_session=False)
+        )
+
+        # Tombstones para los clientes de /api/changes
+        now = literal(datetime.utcnow(), db.DateTime)
+        for entity, model in (("booking", Booking), ("event", Event)):
+            db.session.execute(insert(ChangeLog).from_select(
+                ["entity", "entity_id", "user_id", "action", "created_at"],
+                select(literal(entity), model.id, model.user_id, literal("delete"), now).where(model.user_id.in_(ids))
+            ))
+
+        for archive in (BookingArchive, EventArchive):
+            db.session.execute(delete(archive).where(archive.user_id.in_(ids)))
+        # Eventos, reservas, trabajos y tokens: ON DELETE CASCADE
+        db.session.execute(delete(User).where(User.id.in_(ids)).execution_options(synchronize_session=False))
+        return days
+
+    def _anonymize_batch(self, ids):
+        """Anonimiza un lote de usuarios (las reservas no cambian de día)"""
+        # Un solo hash para todo el lote: nadie conoce la contraseña
+        password_hash = bcrypt.generate_password_hash(secrets.token_urlsafe(32)).decode("utf-8")
+        db.session.execute(
+            update(User).where(User.id.in_(ids)).values(
+                name="Usuario eliminado",
+                email=literal("anon-") + cast(User.id, String) + literal(f"@{ANONYMIZED_DOMAIN}"),
+                phone=None,
+                password_hash=password_hash,
+            ).execution_options(synchronize_session=False)
+        )
+        db.session.execute(delete(PasswordReset).where(PasswordReset.user_id.in_(ids)))
+        for model in (Booking, BookingArchive):
+            db.session.execute(
+                update(model).where(model.user_id.in_(ids))
+                .values(event_address=None, special_requests=None)
+                .execution_options(synchronize_session=False)
+            )
+        for model in (Event, EventArchive):
+            db.session.execute(
+                update(model).where(model.user_id.in_(ids))
+                .values(location=None, description="")
+                .execution_options(synchronize_session=False)
+            )
+        return []
+
+
+# Instancia global del servicio
+account_service = AccountService()
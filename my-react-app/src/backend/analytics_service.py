@@ -0,0 +1,300 @@
+"""
+Analítica de revenue y utilización basada en rollups diarios
+
+booking_daily_rollup se mantiene incrementalmente en la misma transacción
+que cada escritura de reserva (upsert con deltas +/-). Las reservas
+canceladas no suman. El backfill recalcula un rango desde la tabla booking
+y es idempotente (borra y reinserta el rango). Los endpoints leen solo de
+los rollups.
+
+Cada reserva aporta su total_price completo a cada dimensión que referencia
+(su paquete, su disfraz y la categoría del disfraz) y siempre a "all".
+La categoría se toma del disfraz al escribir: si el admin la cambia,
+recategorize mueve lo acumulado por ese disfraz a la categoría nueva.
+"""
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import db, Booking, Costume, AnimationPackage, BookingDailyRollup
+from archive_service import archive_service
+
+
+class AnalyticsError(ValueError):
+    """Parámetros de analítica inválidos"""
+
+
+DIMENSIONS = ("all", "package", "costume", "category")
+GRANULARITIES = ("day", "week", "month")
+NO_CATEGORY = "Sin categoría"
+
+
+class BookingAnalytics:
+    """Mantiene los rollups y responde consultas de series de tiempo y top-N"""
+
+    # ------------------------------------
+    # Mantenimiento incremental
+    # ------------------------------------
+
+    @staticmethod
+    def category_key(category):
+        return category or NO_CATEGORY
+
+    @staticmethod
+    def contribution(booking):
+        """Aporte de una reserva a los rollups: lista de (día, dimensión, clave, reservas, revenue, unidades)"""
+        if booking.status == "cancelled" or not booking.event_date:
+            return []
+        revenue = booking.total_price or 0
+        rows = [(booking.event_date, "all", "", 1, revenue, 1 if booking.costume_id else 0)]
+        if booking.package_id:
+            rows.append((booking.event_date, "package", str(booking.package_id), 1, revenue, 0))
+        if booking.costume_id:
+            category = BookingAnalytics.category_key(booking.costume.category if booking.costume else None)
+            rows.append((booking.event_date, "costume", str(booking.costume_id), 1, revenue, 1))
+            rows.append((booking.event_date, "category", category, 1, revenue, 1))
+        return rows
+
+    def apply(self, rows, sign=1):
+        """Suma (sign=1) o resta (sign=-1) un aporte. No hace commit"""
+        if not rows:
+            return
+        insert = pg_insert if db.engine.dialect.name == "postgresql" else sqlite_insert
+        for day, dimension, key, bookings, revenue, units in rows:
+            stmt = insert(BookingDailyRollup.__table__).values(
+                day=day, dimension=dimension, dimension_key=key,
+                bookings=sign * bookings, revenue=sign * revenue, units=sign * units
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["day", "dimension", "dimension_key"],
+                set_={
+                    "bookings": BookingDailyRollup.__table__.c.bookings + stmt.excluded.bookings,
+                    "revenue": BookingDailyRollup.__table__.c.revenue + stmt.excluded.revenue,
+                    "units": BookingDailyRollup.__table__.c.units + stmt.excluded.units,
+                }
+            )
+            db.session.execute(stmt)
+
+    def replace(self, old_rows, booking):
+        """Reemplaza el aporte anterior de una reserva por el actual (update)"""
+        new_rows = self.contribution(booking)
+        if old_rows != new_rows:
+            self.apply(old_rows, sign=-1)
+            self.apply(new_rows, sign=1)
+
+    def recategorize(self, costume_id, old_category, new_category):
+        """
+        Mueve el aporte de un disfraz de una categoría a otra (update del
+        disfraz). Los rollups "costume" de ese disfraz son exactamente lo que
+        sumó a su categoría, día por día. No hace commit
+        """
+        old_key, new_key = self.category_key(old_category), self.category_key(new_category)
+        if old_key == new_key:
+            return
+        rows = [
+            (row.day, "category", old_key, row.bookings, row.revenue, row.units)
+            for row in BookingDailyRollup.query.filter_by(dimension="costume", dimension_key=str(costume_id))
+        ]
+        self.apply(rows, sign=-1)
+        self.apply([(day, dim, new_key, *values) for day, dim, _, *values in rows], sign=1)
+
+    # ------------------------------------
+    # Backfill idempotente
+    # ------------------------------------
+
+    def backfill(self, start=None, end=None):
+        """
+        Recalcula los rollups de [start, end] desde booking. Devuelve filas escritas.
+        Nunca antes del corte de archivo: los días con reservas ya archivadas
+        conservan sus rollups.
+        """
+        if archive_service.enabled:
+            start = max(start or date.min, archive_service.booking_cutoff())
+            if end and start > end:
+                return 0
+        filters = []
+        rollup_filters = []
+        if start:
+            filters.append(Booking.event_date >= start)
+            rollup_filters.append(BookingDailyRollup.day >= start)
+        if end:
+            filters.append(Booking.event_date <= end)
+            rollup_filters.append(BookingDailyRollup.day <= end)
+
+        BookingDailyRollup.query.filter(*rollup_filters).delete(synchronize_session=False)
+
+        written = 0
+        for day, dimension, key, bookings, revenue, units in self.aggregate(*filters):
+            db.session.add(BookingDailyRollup(
+                day=day, dimension=dimension, dimension_key=key,
+                bookings=bookings, revenue=revenue, units=units
+            ))
+            written += 1
+        db.session.commit()
+        return written
+
+    @staticmethod
+    def aggregate(*filters, source=Booking):
+        """
+        Aporte conjunto de las reservas que cumplen `filters` (GROUP BY por
+        día y dimensión), con el formato de contribution: sirve para apply.
+        `source` puede ser BookingArchive (mismas columnas)
+        """
+        filters = (*filters, source.status != "cancelled")
+        category = func.coalesce(func.nullif(Costume.category, ""), NO_CATEGORY)  # igual que category_key
+        groups = [
+            ("all", db.session.query(
+                source.event_date, literal(""), func.count(source.id),
+                func.sum(source.total_price), func.count(source.costume_id)
+            ).filter(*filters).group_by(source.event_date)),
+            ("package", db.session.query(
+                source.event_date, source.package_id, func.count(source.id),
+                func.sum(source.total_price), literal(0)
+            ).filter(*filters, source.package_id.isnot(None)).group_by(source.event_date, source.package_id)),
+            ("costume", db.session.query(
+                source.event_date, source.costume_id, func.count(source.id),
+                func.sum(source.total_price), func.count(source.id)
+            ).filter(*filters, source.costume_id.isnot(None)).group_by(source.event_date, source.costume_id)),
+            ("category", db.session.query(
+                source.event_date, category, func.count(source.id),
+                func.sum(source.total_price), func.count(source.id)
+            ).join(Costume, source.costume_id == Costume.id).filter(*filters)
+             .group_by(source.event_date, category)),
+        ]
+        return [
+            (day, dimension, str(key), bookings, revenue or 0, units or 0)
+            for dimension, query in groups
+            for day, key, bookings, revenue, units in query
+        ]
+
+    # ------------------------------------
+    # Consultas
+    # ------------------------------------
+
+    @staticmethod
+    def parse_range(start, end, default_days=365):
+        """Valida from/to (YYYY-MM-DD); por defecto los últimos `default_days` días"""
+        try:
+            end = datetime.strptime(end, "%Y-%m-%d").date() if end else date.today()
+            start = datetime.strptime(start, "%Y-%m-%d").date() if start else end - timedelta(days=default_days)
+        except ValueError:
+            raise AnalyticsError("Formato de fecha inválido (usar YYYY-MM-DD)")
+        if start > end:
+            raise AnalyticsError("'from' debe ser anterior a 'to'")
+        return start, end
+
+    @staticmethod
+    def _bucket(day, granularity):
+        if granularity == "month":
+            return day.strftime("%Y-%m")
+        if granularity == "week":
+            return (day - timedelta(days=day.weekday())).isoformat()
+        return day.isoformat()
+
+    def timeseries(self, start, end, granularity="month", dimension="all", key=None):
+        """Revenue y reservas por bucket de tiempo"""
+        if granularity not in GRANULARITIES:
+            raise AnalyticsError(f"granularity inválida. Permitidas: {', '.join(GRANULARITIES)}")
+        if dimension not in DIMENSIONS:
+            raise AnalyticsError(f"dimension inválida. Permitidas: {', '.join(DIMENSIONS)}")
+
+        query = db.session.query(
+            BookingDailyRollup.day, func.sum(BookingDailyRollup.bookings), func.sum(BookingDailyRollup.revenue)
+        ).filter(
+            BookingDailyRollup.dimension == dimension,
+            BookingDailyRollup.day >= start,
+            BookingDailyRollup.day <= end
+        )
+        if key is not None:
+            query = query.filter(BookingDailyRollup.dimension_key == str(key))
+
+        series = OrderedDict()
+        for day, bookings, revenue in query.group_by(BookingDailyRollup.day).order_by(BookingDailyRollup.day):
+            bucket = series.setdefault(self._bucket(day, granularity), {"bookings": 0, "revenue": 0})
+            bucket["bookings"] += bookings or 0
+            bucket["revenue"] += revenue or 0
+
+        return {
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "granularity": granularity,
+            "dimension": dimension,
+            "series": [{"period": period, **values} for period, values in series.items()],
+        }
+
+    def top(self, start, end, dimension="package", metric="revenue", limit=5):
+        """Top-N de paquetes, disfraces o categorías por revenue o reservas"""
+        if dimension not in DIMENSIONS[1:]:
+            raise AnalyticsError(f"dimension inválida. Permitidas: {', '.join(DIMENSIONS[1:])}")
+        if metric not in ("revenue", "bookings"):
+            raise AnalyticsError("metric inválida. Permitidas: revenue, bookings")
+
+        revenue = func.sum(BookingDailyRollup.revenue).label("revenue")
+        bookings = func.sum(BookingDailyRollup.bookings).label("bookings")
+        rows = db.session.query(BookingDailyRollup.dimension_key, bookings, revenue).filter(
+            BookingDailyRollup.dimension == dimension,
+            BookingDailyRollup.day >= start,
+            BookingDailyRollup.day <= end
+        ).group_by(BookingDailyRollup.dimension_key).order_by(
+            (revenue if metric == "revenue" else bookings).desc()
+        ).limit(limit).all()
+
+        names = self._names(dimension, [row.dimension_key for row in rows])
+        return {
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "dimension": dimension,
+            "metric": metric,
+            "items": [
+                {
+                    "key": row.dimension_key,
+                    "name": names.get(row.dimension_key, row.dimension_key),
+                    "bookings": row.bookings or 0,
+                    "revenue": row.revenue or 0,
+                }
+                for row in rows
+            ],
+        }
+
+    def utilisation(self, start, end):
+        """Unidades reservadas vs stock_quantity disponible por disfraz en el rango"""
+        days = (end - start).days + 1
+        units = dict(db.session.query(
+            BookingDailyRollup.dimension_key, func.sum(BookingDailyRollup.units)
+        ).filter(
+            BookingDailyRollup.dimension == "costume",
+            BookingDailyRollup.day >= start,
+            BookingDailyRollup.day <= end
+        ).group_by(BookingDailyRollup.dimension_key).all())
+
+        items = []
+        for costume in db.session.query(Costume.id, Costume.name, Costume.category, Costume.stock_quantity):
+            booked = units.get(str(costume.id), 0) or 0
+            capacity = (costume.stock_quantity or 0) * days
+            items.append({
+                "costume_id": costume.id,
+                "name": costume.name,
+                "category": costume.category,
+                "stock_quantity": costume.stock_quantity,
+                "units_booked": booked,
+                "capacity": capacity,
+                "utilisation": round(booked / capacity, 4) if capacity else None,
+            })
+        items.sort(key=lambda item: item["utilisation"] or 0, reverse=True)
+        return {"from": start.isoformat(), "to": end.isoformat(), "days": days, "items": items}
+
+    @staticmethod
+    def _names(dimension, keys):
+        ids = [int(key) for key in keys if key.isdigit()]
+        if dimension == "package" and ids:
+            return {str(row.id): row.name for row in db.session.query(
+                AnimationPackage.id, AnimationPackage.name).filter(AnimationPackage.id.in_(ids))}
+        if dimension == "costume" and ids:
+            return {str(row.id): row.name for row in db.session.query(
+                Costume.id, Costume.name).filter(Costume.id.in_(ids))}
+        return {}
+
+
+# Instancia global del servicio
+booking_analytics = BookingAnalytics()
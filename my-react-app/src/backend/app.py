@@ -4,6 +4,8 @@ from flask import Flask, jsonify
 from flask_cors import CORS
 from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
+from sqlalchemy import event
+from werkzeug.middleware.proxy_fix import ProxyFix
 from models import db, bcrypt
 
 
@@ -14,6 +16,12 @@ def normalize_database_url(database_url: str) -> str:
     return database_url
 
 
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
 def create_app():
     """Factory function para crear la aplicación Flask"""
 
@@ -22,6 +30,11 @@ def create_app():
 
     app = Flask(__name__)
 
+    # Detrás de un proxy (Render), usar la IP real del cliente para rate limiting
+    trusted_proxies = int(os.getenv('TRUSTED_PROXY_COUNT', '0'))
+    if trusted_proxies:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxies, x_proto=trusted_proxies)
+
     # Directorio de instancia para la base de datos
     app.instance_path = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'instance')
     os.makedirs(app.instance_path, exist_ok=True)
@@ -30,6 +43,8 @@ def create_app():
     app.config['DEBUG'] = os.getenv('FLASK_DEBUG', 'false').lower() == 'true'
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
     app.config['FRONTEND_URL'] = os.getenv('FRONTEND_URL', 'http://localhost:5173')
+    # Imágenes: detrás de nginx/Apache se puede delegar el envío del archivo (X-Sendfile)
+    app.config['USE_X_SENDFILE'] = os.getenv('MEDIA_X_SENDFILE', 'false').lower() == 'true'
 
     # Base de datos
     database_url = normalize_database_url(
@@ -37,6 +52,13 @@ def create_app():
     )
     app.config['SQLALCHEMY_DATABASE_URI'] = database_url
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if not database_url.startswith('sqlite'):
+        # Con workers gevent hay muchos requests por proceso: dimensionar el pool
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'pool_size': int(os.getenv('DB_POOL_SIZE', '5')),
+            'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '10')),
+            'pool_pre_ping': True,
+        }
 
     # Configuración JWT
     app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'jwt-secret-key-change-in-production')
@@ -75,6 +97,10 @@ def create_app():
     cors_origins = [origin.strip() for origin in cors_origins if origin.strip()]
     CORS(app, origins=cors_origins, supports_credentials=True)
 
+    # Compresión gzip/brotli negociada con Accept-Encoding
+    from compression import compressor
+    compressor.init_app(app)
+
     # Registro de blueprints
     from routes import api
     app.register_blueprint(api, url_prefix='/api')
@@ -106,9 +132,26 @@ def create_app():
 
     # Crear tablas
     with app.app_context():
+        if db.engine.dialect.name == "sqlite":
+            # SQLite ignora las FKs (y ON DELETE CASCADE) si no se activan por conexión
+            event.listen(db.engine, "connect", _enable_sqlite_foreign_keys)
         db.create_all()
+        # create_all no modifica tablas existentes: avisar si falta migrar
+        from migrate_schema import pending_actions
+        pending = pending_actions()
+        if pending:
+            print(f"⚠️ Esquema desactualizado ({len(pending)} cambios): correr python migrate_schema.py --apply")
         print("✅ Base de datos inicializada")
 
+    # Notificaciones en vivo para el panel admin (SSE)
+    from event_stream import event_broker
+    event_broker.init_app(app)
+
+    # Trabajos en segundo plano (compactación de tokens, etc.)
+    from jobs import jobs
+    if os.getenv('BACKGROUND_JOBS_ENABLED', 'true').lower() == 'true' and not app.testing:
+        jobs.start(app)
+
     return app
 
 
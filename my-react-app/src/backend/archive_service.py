@@ -0,0 +1,135 @@
+"""
+Archivo frío de reservas, eventos y mensajes de contacto
+
+Las filas que ya no se trabajan pasan de la tabla caliente a su copia
+<tabla>_archive (mismas columnas + archived_at) en lotes acotados, con
+INSERT ... SELECT y DELETE en la misma transacción por lote:
+
+- reservas completadas o canceladas con event_date anterior a
+  ARCHIVE_BOOKING_DAYS (365)
+- eventos creados antes de ARCHIVE_EVENT_DAYS (365)
+- mensajes respondidos anteriores a ARCHIVE_CONTACT_DAYS (180)
+
+Así los listados y los índices de las tablas calientes cubren solo el
+conjunto de trabajo. Lo archivado se lee únicamente con
+?include_archived=true y no se modifica.
+
+Para los clientes de /api/changes una fila archivada sale del listado:
+se registra como tombstone. Los rollups de analítica anteriores al corte
+quedan fijos (el backfill no recalcula días archivados).
+"""
+import os
+from datetime import date, datetime, timedelta
+from flask import request
+from sqlalchemy import literal, select
+from models import (
+    db, Booking, Event, Contact, ScheduledJob, ChangeLog,
+    BookingArchive, EventArchive, ContactArchive
+)
+from cache import data_cache
+
+
+class ArchiveService:
+    """Mueve filas frías a las tablas de archivo y las lee de vuelta"""
+
+    BATCH_SIZE = 500
+    ARCHIVES = {Booking: BookingArchive, Event: EventArchive, Contact: ContactArchive}
+    CHANGE_FEED_ENTITIES = {Booking: "booking", Event: "event"}
+
+    def __init__(self):
+        self.enabled = os.environ.get("ARCHIVE_ENABLED", "true").lower() == "true"
+        self.booking_days = int(os.environ.get("ARCHIVE_BOOKING_DAYS", "365"))
+        self.event_days = int(os.environ.get("ARCHIVE_EVENT_DAYS", "365"))
+        self.contact_days = int(os.environ.get("ARCHIVE_CONTACT_DAYS", "180"))
+        self.batch_size = int(os.environ.get("ARCHIVE_BATCH_SIZE", str(self.BATCH_SIZE)))
+
+    # ------------------------------------
+    # Políticas de retención
+    # ------------------------------------
+
+    def booking_cutoff(self):
+        """Reservas con event_date anterior a este día pueden estar archivadas"""
+        return date.today() - timedelta(days=self.booking_days)
+
+    def _policies(self):
+        now = datetime.utcnow()
+        return {
+            Booking: [Booking.status.in_(("completed", "cancelled")), Booking.event_date < self.booking_cutoff()],
+            Event: [Event.created_at < now - timedelta(days=self.event_days)],
+            Contact: [Contact.status == "replied", Contact.created_at < now - timedelta(days=self.contact_days)],
+        }
+
+    # ------------------------------------
+    # Archivado (trabajo periódico)
+    # ------------------------------------
+
+    def archive_all(self, max_batches=20):
+        """Archiva lo que cumple cada política. Devuelve {tabla: filas movidas}"""
+        if not self.enabled:
+            return {}
+        return {
+            model.__tablename__: self.archive(model, filters, max_batches)
+            for model, filters in self._policies().items()
+        }
+
+    def archive(self, model, filters, max_batches=20):
+        """Mueve en lotes las filas de `model` que cumplen `filters`. Devuelve cuántas"""
+        archive_table = self.ARCHIVES[model].__table__
+        columns = [column.name for column in model.__table__.columns]
+        moved = 0
+        for _ in range(max_batches):
+            ids = [row.id for row in db.session.query(model.id).filter(*filters)
+                   .order_by(model.id).limit(self.batch_size)]
+            if not ids:
+                break
+
+            source = select(*model.__table__.columns, literal(datetime.utcnow(), db.DateTime)).where(
+                model.id.in_(ids)
+            )
+            db.session.execute(archive_table.insert().from_select(columns + ["archived_at"], source))
+            self._detach_dependents(model, ids)
+            model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+            moved += len(ids)
+            if len(ids) < self.batch_size:
+                break
+        if moved:
+            data_cache.invalidate("stats")
+            print(f"🗄️ {moved} filas de {model.__tablename__} archivadas")
+        return moved
+
+    def _detach_dependents(self, model, ids):
+        """Limpia lo que referencia a las filas archivadas (misma transacción)"""
+        if model is Booking:
+            ScheduledJob.query.filter(ScheduledJob.booking_id.in_(ids)).delete(synchronize_session=False)
+        entity = self.CHANGE_FEED_ENTITIES.get(model)
+        if entity:
+            owners = db.session.query(model.id, model.user_id).filter(model.id.in_(ids))
+            db.session.add_all([
+                ChangeLog(entity=entity, entity_id=row_id, user_id=user_id, action="delete")
+                for row_id, user_id in owners
+            ])
+
+    # ------------------------------------
+    # Lectura (?include_archived=true)
+    # ------------------------------------
+
+    @staticmethod
+    def requested():
+        return request.args.get("include_archived", "").lower() == "true"
+
+    def archived(self, model, *filters, order_by=None):
+        """Filas archivadas de `model` que cumplen `filters` (columnas del modelo archivo)"""
+        query = self.ARCHIVES[model].query.filter(*filters)
+        if order_by is not None:
+            query = query.order_by(order_by)
+        return query.all()
+
+    @staticmethod
+    def serialize(rows, *args):
+        """Serializa filas archivadas marcándolas con "archived": true"""
+        return [dict(row.serialize(*args), archived=True) for row in rows]
+
+
+# Instancia global del servicio
+archive_service = ArchiveService()
@@ -0,0 +1,126 @@
+"""
+POST /api/batch: varias lecturas del blueprint api en un solo request HTTP
+
+Cada sub-request se despacha dentro del mismo contexto de aplicación que el
+batch, así comparten la sesión de SQLAlchemy: una sola conexión para todas
+las lecturas y el usuario del token se carga una vez (las demás búsquedas
+por id salen del identity map, sin SQL). Cada sub-request verifica el token
+con su propio @jwt_required, por la API pública de flask-jwt-extended (la
+firma HS256 cuesta ~150 µs; lo caro, cargar el usuario, se comparte). Los
+sub-requests se ejecutan en secuencia; solo se admite GET.
+
+Las respuestas en streaming (SSE, feeds .ics, imágenes) no entran en el
+JSON combinado: esos sub-requests responden 400 y se piden directo.
+
+No pasan por los hooks after_request (compresión, CORS): se aplican una
+sola vez a la respuesta combinada.
+"""
+import os
+from urllib.parse import urlsplit
+from flask import current_app, request
+from werkzeug.exceptions import HTTPException, NotFound
+from werkzeug.test import EnvironBuilder
+from models import db
+
+
+class BatchError(ValueError):
+    """Cuerpo de batch inválido"""
+
+
+class BatchDispatcher:
+    """Valida y ejecuta los sub-requests de un batch"""
+
+    ALLOWED_METHODS = {"GET"}
+    FORWARDED_HEADERS = ("Authorization", "Accept-Language", "User-Agent")
+    # Responden en streaming o con archivos: se rechazan antes de ejecutarlos
+    STREAMING_ENDPOINTS = {"api.admin_stream", "api.calendar_feed", "api.serve_media"}
+
+    def __init__(self):
+        self.max_requests = int(os.environ.get("BATCH_MAX_REQUESTS", "20"))
+
+    def parse(self, body):
+        """Valida el cuerpo {"requests": [{"id", "method", "path"}, ...]}"""
+        items = body.get("requests") if isinstance(body, dict) else None
+        if not isinstance(items, list) or not items:
+            raise BatchError("Se requiere 'requests' con al menos un sub-request")
+        if len(items) > self.max_requests:
+            raise BatchError(f"Máximo {self.max_requests} sub-requests por batch")
+
+        parsed = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict) or not isinstance(item.get("path"), str):
+                raise BatchError(f"Sub-request {index}: 'path' es requerido")
+            method = str(item.get("method", "GET")).upper()
+            if method not in self.ALLOWED_METHODS:
+                raise BatchError(f"Sub-request {index}: método no permitido ({method})")
+            url = urlsplit(item["path"])
+            if url.scheme or url.netloc or not url.path.startswith("/api/"):
+                raise BatchError(f"Sub-request {index}: 'path' debe empezar con /api/")
+            parsed.append({
+                "id": item.get("id", index),
+                "method": method,
+                "path": url.path,
+                "query_string": url.query,
+            })
+        return parsed
+
+    def dispatch(self, items):
+        """Ejecuta los sub-requests ya validados y devuelve sus respuestas"""
+        app = current_app._get_current_object()
+        headers = {name: request.headers[name] for name in self.FORWARDED_HEADERS if name in request.headers}
+        base_environ = {key: request.environ[key] for key in ("REMOTE_ADDR",) if key in request.environ}
+        return [self._dispatch_one(app, item, headers, base_environ) for item in items]
+
+    def _dispatch_one(self, app, item, headers, base_environ):
+        builder = EnvironBuilder(
+            path=item["path"], method=item["method"], query_string=item["query_string"],
+            headers=headers, environ_base=base_environ,
+        )
+        try:
+            environ = builder.get_environ()
+        finally:
+            builder.close()
+
+        # Mismo contexto de aplicación (y sesión de BD) que el batch
+        with app.request_context(environ):
+            response = self._call_view(app)
+
+        body = response.get_json(silent=True) if response.is_json else response.get_data(as_text=True)
+        return {"id": item["id"], "status": response.status_code, "body": body}
+
+    @staticmethod
+    def _call_view(app):
+        try:
+            if request.routing_exception is not None:
+                raise request.routing_exception
+            endpoint = request.url_rule.endpoint
+            if not endpoint.startswith("api.") or endpoint == "api.batch":
+                raise NotFound()
+            if endpoint in BatchDispatcher.STREAMING_ENDPOINTS:
+                return BatchDispatcher._not_batchable(app)
+            rv = app.ensure_sync(app.view_functions[endpoint])(**request.view_args)
+            response = app.make_response(rv)
+            if response.is_streamed:
+                response.close()
+                return BatchDispatcher._not_batchable(app)
+            return response
+        except Exception as error:
+            # Mismos handlers que un request normal (404, FieldsError, JWT, ...)
+            try:
+                response = app.make_response(app.handle_user_exception(error))
+                if isinstance(error, HTTPException) and not response.is_json:
+                    # Sin handler propio (405, 400...): responder JSON igual
+                    response = app.make_response(({"msg": error.description}, error.code))
+                return response
+            except Exception:
+                print(f"❌ Error en sub-request {request.path}: {error}")
+                db.session.rollback()
+                return app.make_response(({"msg": "Error interno del servidor"}, 500))
+
+    @staticmethod
+    def _not_batchable(app):
+        return app.make_response(({"msg": "Respuesta en streaming: pedir este recurso directamente"}, 400))
+
+
+# Instancia global del despachador
+batch_dispatcher = BatchDispatcher()
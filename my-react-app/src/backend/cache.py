@@ -0,0 +1,275 @@
+"""
+Caché de datos de lectura (catálogo, /api/stats, usuarios) con invalidación por tags
+
+Backend en memoria (LRU + TTL, un proceso) o Redis (CACHE_STORAGE_URL)
+compartido entre workers; en local sirve cualquier redis-server, y en
+pruebas cualquier cliente compatible (p. ej. fakeredis) pasado como
+`client`. Si Redis no responde se calcula directo desde la base.
+
+En memoria cada worker tiene su copia y una invalidación solo llega al
+worker que hizo la escritura: con varios workers (WEB_CONCURRENCY > 1) y
+sin Redis el TTL se limita a CACHE_LOCAL_TTL segundos.
+
+Cada entrada se guarda con la versión de sus tags al momento de calcularla.
+Invalidar un tag ("catalog", "costume:<id>", ...) solo incrementa su
+versión: las entradas con una versión anterior dejan de valer sin tener que
+buscarlas. Como la versión se lee antes de calcular, una escritura que se
+confirma durante el cálculo también deja la entrada vencida. Invalidar
+siempre después del commit.
+
+Protección contra estampidas: en cada proceso una sola petición por clave
+recalcula y las demás esperan su resultado; con Redis además un lock
+(SET NX) evita que varios workers recalculen lo mismo a la vez.
+
+Aciertos y fallos quedan en /api/metrics (cache.hit.<prefijo>, cache.miss.<prefijo>).
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from metrics import metrics
+
+
+MISS = object()
+
+
+class MemoryBackend:
+    """LRU + TTL en memoria (un proceso)"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._tags = {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISS
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return MISS
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def tag_versions(self, tags):
+        with self._lock:
+            return [self._tags.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._tags[tag] = self._tags.get(tag, 0) + 1
+
+    def acquire(self, key, ttl):
+        return True  # el single-flight del proceso ya serializa
+
+    def release(self, key):
+        pass
+
+    def size(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+
+class RedisBackend:
+    """Entradas JSON con TTL en Redis; versiones de tags con INCR"""
+
+    PREFIX = "cache:"
+
+    def __init__(self, url=None, client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+            client.ping()  # URL mal configurada: usar memoria desde el arranque
+        self.client = client
+
+    def get(self, key):
+        raw = self.client.get(f"{self.PREFIX}{key}")
+        return MISS if raw is None else json.loads(raw)
+
+    def set(self, key, value, ttl):
+        self.client.set(f"{self.PREFIX}{key}", json.dumps(value), px=int(ttl * 1000))
+
+    def tag_versions(self, tags):
+        if not tags:
+            return []
+        return [int(value or 0) for value in self.client.mget([f"{self.PREFIX}tag:{tag}" for tag in tags])]
+
+    def bump(self, tags):
+        pipeline = self.client.pipeline()
+        for tag in tags:
+            pipeline.incr(f"{self.PREFIX}tag:{tag}")
+        pipeline.execute()
+
+    def acquire(self, key, ttl):
+        return bool(self.client.set(f"{self.PREFIX}lock:{key}", "1", nx=True, px=int(ttl * 1000)))
+
+    def release(self, key):
+        self.client.delete(f"{self.PREFIX}lock:{key}")
+
+    def size(self):
+        return None  # Redis aplica su propia política (maxmemory-policy allkeys-lru)
+
+    def clear(self):
+        for key in self.client.scan_iter(f"{self.PREFIX}*"):
+            self.client.delete(key)
+
+
+class DataCache:
+    """get_or_set con tags, single-flight y métricas sobre el backend configurado"""
+
+    POLL_INTERVAL = 0.05
+
+    def __init__(self):
+        self.enabled = os.environ.get("CACHE_ENABLED", "true").lower() == "true"
+        self.default_ttl = float(os.environ.get("CACHE_DEFAULT_TTL", "300"))
+        self.lock_timeout = float(os.environ.get("CACHE_LOCK_TIMEOUT", "5"))
+        self.backend = self._build_backend(
+            os.environ.get("CACHE_STORAGE_URL"), int(os.environ.get("CACHE_MAX_ENTRIES", "2000"))
+        )
+        self.max_ttl = None
+        workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+        if self.enabled and workers > 1 and isinstance(self.backend, MemoryBackend):
+            self.max_ttl = float(os.environ.get("CACHE_LOCAL_TTL", "5"))
+            print(f"⚠️⚠️⚠️ Caché en memoria con {workers} workers: las invalidaciones no llegan a los demás "
+                  f"workers. TTL limitado a {self.max_ttl:g}s; configurar CACHE_STORAGE_URL (Redis)")
+        self._flights_lock = threading.Lock()
+        self._flights = {}
+        metrics.register_gauge("cache.entries", lambda: self.backend.size())
+
+    def _build_backend(self, storage_url, max_entries):
+        if storage_url:
+            try:
+                return RedisBackend(storage_url)
+            except Exception as error:
+                print(f"⚠️ Caché: Redis no disponible ({error}), usando memoria")
+        return MemoryBackend(max_entries)
+
+    # ------------------------------------
+    # Lectura
+    # ------------------------------------
+
+    def get_or_set(self, key, compute, tags=(), ttl=None):
+        """
+        Devuelve el valor cacheado de `key` o lo calcula con `compute()`
+
+        El valor debe ser serializable a JSON (dicts, listas, None...).
+        `tags` son los tags cuya invalidación vence la entrada.
+        """
+        if not self.enabled:
+            return compute()
+
+        prefix = key.split(":", 1)[0]
+        value = self._lookup(key, tags)
+        if value is MISS:
+            with self._flight(key):
+                # Otra petición del proceso pudo calcularlo mientras esperábamos
+                value = self._lookup(key, tags)
+                if value is MISS:
+                    metrics.incr(f"cache.miss.{prefix}")
+                    ttl = ttl or self.default_ttl
+                    return self._fill(key, compute, tags, min(ttl, self.max_ttl) if self.max_ttl else ttl)
+        metrics.incr(f"cache.hit.{prefix}")
+        return value
+
+    def _lookup(self, key, tags):
+        try:
+            entry = self.backend.get(key)
+            if entry is MISS or entry["t"] != self.backend.tag_versions(tags):
+                return MISS
+            return entry["v"]
+        except Exception as error:
+            self._backend_error(error)
+            return MISS
+
+    def _fill(self, key, compute, tags, ttl):
+        try:
+            versions = self.backend.tag_versions(tags)
+            acquired = self.backend.acquire(key, self.lock_timeout)
+        except Exception as error:
+            self._backend_error(error)
+            return compute()
+
+        if not acquired:
+            # Otro worker lo está calculando: esperar su resultado un momento
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(self.POLL_INTERVAL)
+                value = self._lookup(key, tags)
+                if value is not MISS:
+                    return value
+            metrics.incr("cache.lock_timeouts")
+
+        try:
+            value = compute()
+            try:
+                self.backend.set(key, {"v": value, "t": versions}, ttl)
+            except Exception as error:
+                self._backend_error(error)
+            return value
+        finally:
+            if acquired:
+                try:
+                    self.backend.release(key)
+                except Exception as error:
+                    self._backend_error(error)
+
+    @contextmanager
+    def _flight(self, key):
+        """Lock por clave dentro del proceso (se descarta cuando nadie lo espera)"""
+        with self._flights_lock:
+            lock, waiters = self._flights.get(key, (None, 0))
+            lock = lock or threading.Lock()
+            self._flights[key] = (lock, waiters + 1)
+        try:
+            with lock:
+                yield
+        finally:
+            with self._flights_lock:
+                lock, waiters = self._flights[key]
+                if waiters == 1:
+                    del self._flights[key]
+                else:
+                    self._flights[key] = (lock, waiters - 1)
+
+    # ------------------------------------
+    # Invalidación
+    # ------------------------------------
+
+    def invalidate(self, *tags):
+        """Vence todas las entradas con alguno de los tags (llamar después del commit)"""
+        tags = [tag for tag in tags if tag]
+        if not self.enabled or not tags:
+            return
+        try:
+            self.backend.bump(tags)
+            metrics.incr("cache.invalidations", len(tags))
+        except Exception as error:
+            self._backend_error(error)
+
+    def clear(self):
+        self.backend.clear()
+
+    @staticmethod
+    def _backend_error(error):
+        metrics.incr("cache.errors")
+        print(f"⚠️ Caché no disponible: {error}")
+
+
+# Instancia global del servicio
+data_cache = DataCache()
@@ -0,0 +1,98 @@
+"""
+Agregación mensual de reservas para la vista de calendario del admin
+
+Un solo GROUP BY sobre booking.event_date (indexado) por mes. Los meses
+consultados se cachean en memoria y se invalidan cuando una reserva de ese
+mes se crea, se mueve, cambia o se elimina. Con varios workers, el TTL
+acota cuánto puede quedar desactualizado el caché de los demás procesos.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from sqlalchemy import func, case
+from models import db, Booking
+
+
+class CalendarError(ValueError):
+    """Parámetro month inválido"""
+
+
+class BookingCalendar:
+    """Resumen por día (conteos por estado/tipo y revenue) con caché por mes"""
+
+    MAX_MONTHS = 24
+
+    def __init__(self):
+        self.ttl = float(os.environ.get("CALENDAR_CACHE_TTL", "60"))
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+
+    @staticmethod
+    def parse_month(value):
+        """'YYYY-MM' -> (año, mes)"""
+        try:
+            year, month = (int(part) for part in (value or "").split("-"))
+            date(year, month, 1)
+        except (TypeError, ValueError):
+            raise CalendarError("Parámetro month inválido (usar YYYY-MM)")
+        return year, month
+
+    def month_summary(self, year, month):
+        key = (year, month)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and time.monotonic() - cached[0] < self.ttl:
+                self._cache.move_to_end(key)
+                return cached[1]
+
+        summary = self._compute(year, month)
+        with self._lock:
+            self._cache[key] = (time.monotonic(), summary)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.MAX_MONTHS:
+                self._cache.popitem(last=False)
+        return summary
+
+    def invalidate(self, *dates):
+        """Invalida los meses de las fechas dadas (None se ignora)"""
+        with self._lock:
+            for value in dates:
+                if value:
+                    self._cache.pop((value.year, value.month), None)
+
+    def _compute(self, year, month):
+        start = date(year, month, 1)
+        end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+        revenue = func.sum(case((Booking.status != "cancelled", Booking.total_price), else_=0))
+
+        rows = db.session.query(
+            Booking.event_date, Booking.status, Booking.booking_type,
+            func.count(Booking.id), revenue
+        ).filter(
+            Booking.event_date >= start, Booking.event_date < end
+        ).group_by(Booking.event_date, Booking.status, Booking.booking_type).all()
+
+        days = {}
+        totals = {"bookings": 0, "revenue": 0}
+        for event_date, status, booking_type, count, amount in rows:
+            day = days.setdefault(event_date.isoformat(), {
+                "total": 0, "revenue": 0, "by_status": {}, "by_type": {}
+            })
+            day["total"] += count
+            day["revenue"] += amount or 0
+            day["by_status"][status] = day["by_status"].get(status, 0) + count
+            day["by_type"][booking_type] = day["by_type"].get(booking_type, 0) + count
+            totals["bookings"] += count
+            totals["revenue"] += amount or 0
+
+        return {
+            "month": f"{year:04d}-{month:02d}",
+            "days": dict(sorted(days.items())),
+            "totals": totals,
+        }
+
+
+# Instancia global del servicio
+booking_calendar = BookingCalendar()
@@ -0,0 +1,213 @@
+"""
+Campañas de email masivas (recordatorios de reservas, anuncios del catálogo)
+
+Los destinatarios se leen por páginas con keyset (id > cursor), se empaquetan
+en lotes de hasta 1000 personalizations por llamada a SendGrid y los lotes se
+envían con concurrencia acotada. El cursor se guarda en la BD después de cada
+tanda, así una campaña interrumpida se reanuda donde quedó (a lo sumo se
+reenvía la última tanda en curso).
+
+Para probar sin SendGrid real: SENDGRID_API_HOST=http://localhost:<puerto>
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from html import escape
+from flask import current_app
+from models import db, User, Booking, EmailCampaign
+from email_service import email_service
+from email_templates import email_templates
+
+
+class CampaignError(ValueError):
+    """Campaña inválida o que no se puede iniciar"""
+
+
+class CampaignService:
+    """Crea, ejecuta y reanuda campañas de email"""
+
+    BATCH_SIZE = 1000  # máximo de personalizations por request en SendGrid
+    STALE_AFTER = timedelta(minutes=10)  # campaña "running" sin avance se considera interrumpida
+    KINDS = ("booking_reminder", "announcement")
+    REMINDER_FIELDS = ("user_name", "event_date", "event_time", "event_location")
+
+    def __init__(self):
+        self.concurrency = int(os.environ.get("CAMPAIGN_CONCURRENCY", "4"))
+        self._runner = ThreadPoolExecutor(max_workers=2, thread_name_prefix="campaign")
+
+    # ------------------------------------
+    # Creación y arranque
+    # ------------------------------------
+
+    def create(self, kind, subject=None, message=None, target_date=None, created_by=None):
+        """Crea la campaña (sin enviar). Hace commit."""
+        if kind not in self.KINDS:
+            raise CampaignError(f"Tipo de campaña inválido. Permitidos: {', '.join(self.KINDS)}")
+
+        if kind == "announcement":
+            if not subject or not message:
+                raise CampaignError("Asunto y mensaje son requeridos para un anuncio")
+        else:
+            subject = subject or "¡Tu fiesta DiverKids es mañana! 🎉"
+            if target_date:
+                try:
+                    target_date = datetime.strptime(target_date, "%Y-%m-%d").date()
+                except (TypeError, ValueError):
+                    raise CampaignError("Formato de fecha inválido (usar YYYY-MM-DD)")
+            else:
+                target_date = date.today() + timedelta(days=1)
+
+        campaign = EmailCampaign(
+            kind=kind,
+            subject=subject,
+            message=message,
+            target_date=target_date if kind == "booking_reminder" else None,
+            created_by=created_by
+        )
+        db.session.add(campaign)
+        db.session.commit()
+        return campaign
+
+    def claim(self, campaign_id):
+        """Marca la campaña como 'running' si nadie más la está ejecutando (UPDATE condicional)"""
+        stale = datetime.utcnow() - self.STALE_AFTER
+        claimed = EmailCampaign.query.filter(
+            EmailCampaign.id == campaign_id,
+            db.or_(
+                EmailCampaign.status.in_(("pending", "failed")),
+                db.and_(EmailCampaign.status == "running", EmailCampaign.updated_at < stale)
+            )
+        ).update({"status": "running", "last_error": None, "updated_at": datetime.utcnow()},
+                 synchronize_session=False)
+        db.session.commit()
+        return claimed == 1
+
+    def start(self, campaign_id):
+        """Reclama la campaña y la ejecuta en segundo plano"""
+        if not self.claim(campaign_id):
+            raise CampaignError("La campaña ya está en ejecución o terminó")
+        app = current_app._get_current_object()
+        self._runner.submit(self._run_in_context, app, campaign_id)
+
+    def _run_in_context(self, app, campaign_id):
+        with app.app_context():
+            try:
+                self.run(campaign_id)
+            except Exception as error:
+                print(f"❌ Error en campaña {campaign_id}: {error}")
+                db.session.rollback()
+                EmailCampaign.query.filter_by(id=campaign_id).update(
+                    {"status": "failed", "last_error": str(error)}, synchronize_session=False
+                )
+                db.session.commit()
+            finally:
+                db.session.remove()
+
+    # ------------------------------------
+    # Ejecución
+    # ------------------------------------
+
+    def run(self, campaign_id):
+        """Envía la campaña desde su cursor hasta el final (la campaña ya debe estar reclamada)"""
+        campaign = db.session.get(EmailCampaign, campaign_id)
+        subject, html_content, text_content = self._content(campaign)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="sendgrid") as pool:
+            while True:
+                page = self._recipients(campaign, limit=self.BATCH_SIZE * self.concurrency)
+                if not page:
+                    break
+
+                batches = [page[i:i + self.BATCH_SIZE] for i in range(0, len(page), self.BATCH_SIZE)]
+                results = list(pool.map(
+                    lambda batch: email_service.send_bulk(
+                        subject, html_content, text_content, [personalization for _, personalization in batch]
+                    ),
+                    batches
+                ))
+
+                # Avanzar el cursor solo por los lotes consecutivos enviados
+                for batch, ok in zip(batches, results):
+                    if not ok:
+                        campaign.status = "failed"
+                        campaign.last_error = f"Lote desde destinatario {batch[0][0]} rechazado por SendGrid"
+                        db.session.commit()
+                        print(f"⚠️ Campaña {campaign.id} detenida en cursor {campaign.cursor}")
+                        return campaign
+                    campaign.cursor = batch[-1][0]
+                    campaign.sent_count += len(batch)
+                    campaign.batch_count += 1
+                db.session.commit()
+
+        campaign.status = "completed"
+        campaign.completed_at = datetime.utcnow()
+        db.session.commit()
+        print(f"✅ Campaña {campaign.id} completada: {campaign.sent_count} emails")
+        return campaign
+
+    def _content(self, campaign):
+        """
+        Renderiza el template una vez por parte con tags de sustitución de SendGrid
+
+        SendGrid aplica las mismas sustituciones a las dos partes: el HTML usa
+        tags -x_html- (valor escapado) y el texto plano -x- (valor tal cual).
+        """
+        if campaign.kind == "booking_reminder":
+            template, fields, context = "booking_reminder", self.REMINDER_FIELDS, {}
+        else:
+            template, fields, context = "announcement", ("user_name",), {
+                "title": campaign.subject,
+                "message": campaign.message,
+                "frontend_url": os.environ.get("FRONTEND_URL", "http://localhost:5173"),
+            }
+        html_content, _ = email_templates.render(
+            template, **context, **{field: self._tag(field, html=True) for field in fields}
+        )
+        _, text_content = email_templates.render(
+            template, **context, **{field: self._tag(field) for field in fields}
+        )
+        return campaign.subject, html_content, text_content
+
+    @staticmethod
+    def _tag(field, html=False):
+        name = "name" if field == "user_name" else field
+        return f"-{name}_html-" if html else f"-{name}-"
+
+    def _recipients(self, campaign, limit):
+        """Siguiente página de destinatarios: lista de (id, personalization)"""
+        if campaign.kind == "booking_reminder":
+            rows = db.session.query(
+                Booking.id, Booking.event_date, Booking.event_time, Booking.event_location,
+                User.email, User.name
+            ).join(User, Booking.user_id == User.id).filter(
+                Booking.id > campaign.cursor,
+                Booking.event_date == campaign.target_date,
+                Booking.status == "confirmed"
+            ).order_by(Booking.id).limit(limit).all()
+            return [
+                (row.id, self._personalization(row.email, row.name, {
+                    "event_date": row.event_date.strftime("%d/%m/%Y"),
+                    "event_time": row.event_time or "Por confirmar",
+                    "event_location": row.event_location or "Por confirmar",
+                }))
+                for row in rows
+            ]
+
+        rows = db.session.query(User.id, User.email, User.name).filter(
+            User.id > campaign.cursor
+        ).order_by(User.id).limit(limit).all()
+        return [(row.id, self._personalization(row.email, row.name)) for row in rows]
+
+    @classmethod
+    def _personalization(cls, email, name, extra=None):
+        # SendGrid no escapa las sustituciones: la variante _html va escapada, la de texto no
+        values = {"user_name": name or "", **(extra or {})}
+        substitutions = {}
+        for field, value in values.items():
+            substitutions[cls._tag(field)] = value
+            substitutions[cls._tag(field, html=True)] = escape(value)
+        return {"to": [{"email": email, "name": name}], "substitutions": substitutions}
+
+# Instancia global del servicio
+campaign_service = CampaignService()
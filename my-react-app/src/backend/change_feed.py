@@ -0,0 +1,152 @@
+"""
+Feed de cambios para sincronización incremental (GET /api/changes?since=)
+
+Cada escritura de reserva o evento agrega una fila a change_log en la misma
+transacción (upsert o delete). El cliente guarda el último cursor y pide
+solo lo que cambió después: recibe el estado actual de cada fila modificada
+y tombstones de las eliminadas.
+
+Cursor monótono: los ids se asignan al insertar, pero las transacciones
+pueden confirmar en otro orden. Si falta un id (transacción aún abierta)
+y el siguiente cambio es más nuevo que CHANGES_SETTLE_SECONDS, la página se
+corta antes del hueco; pasado ese tiempo el hueco se da por un rollback.
+"""
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from models import db, ChangeLog, Booking, Event
+
+
+class ChangeFeedError(ValueError):
+    """Cursor inválido"""
+
+
+class CursorExpiredError(ChangeFeedError):
+    """El cursor es anterior a la retención: el cliente debe resincronizar"""
+
+
+class ChangeFeed:
+    """Registra cambios y arma páginas de deltas por usuario"""
+
+    ENTITIES = {"booking": Booking, "event": Event}
+    PAGE_SIZE = 200
+    PURGE_BATCH_SIZE = 1000
+
+    def __init__(self):
+        self.settle = timedelta(seconds=float(os.environ.get("CHANGES_SETTLE_SECONDS", "5")))
+        self.retention = timedelta(days=int(os.environ.get("CHANGES_RETENTION_DAYS", "30")))
+
+    # ------------------------------------
+    # Escritura (llamado desde las rutas, sin commit)
+    # ------------------------------------
+
+    def record(self, entity, obj, action="upsert"):
+        """Agrega el cambio de una reserva/evento. La fila debe tener id (flush)"""
+        db.session.add(ChangeLog(entity=entity, entity_id=obj.id, user_id=obj.user_id, action=action))
+
+    # ------------------------------------
+    # Lectura
+    # ------------------------------------
+
+    @staticmethod
+    def parse_cursor(value):
+        try:
+            cursor = int(value)
+        except (TypeError, ValueError):
+            raise ChangeFeedError("Parámetro since inválido (usar el cursor devuelto por /api/changes)")
+        if cursor < 0:
+            raise ChangeFeedError("Parámetro since inválido (usar el cursor devuelto por /api/changes)")
+        return cursor
+
+    def current_cursor(self):
+        """Cursor inicial: pedirlo antes de la carga completa de los listados"""
+        return self._horizon(0)
+
+    def changes(self, since, user_id=None, limit=None):
+        """
+        Cambios con cursor > since (user_id=None: todos, para admin).
+        Devuelve {"changes", "cursor", "has_more"}; cada fila aparece una vez
+        con su estado actual o como tombstone.
+        """
+        limit = limit or self.PAGE_SIZE
+        oldest = db.session.query(func.min(ChangeLog.id)).scalar()
+        if since and oldest and since < oldest - 1:
+            raise CursorExpiredError("El cursor expiró: volver a cargar los listados y usar el nuevo cursor")
+
+        horizon = self._horizon(since)
+        query = ChangeLog.query.filter(ChangeLog.id > since, ChangeLog.id <= horizon)
+        if user_id is not None:
+            query = query.filter(ChangeLog.user_id == user_id)
+        rows = query.order_by(ChangeLog.id).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        latest = {}
+        for row in rows:
+            latest[(row.entity, row.entity_id)] = row  # el último cambio de cada fila gana
+
+        objects = {}
+        for entity, model in self.ENTITIES.items():
+            ids = [entity_id for name, entity_id in latest if name == entity]
+            if ids:
+                objects.update({(entity, obj.id): obj for obj in model.query.filter(model.id.in_(ids))})
+
+        changes = []
+        for key, row in sorted(latest.items(), key=lambda item: item[1].id):
+            obj = objects.get(key)
+            change = {"cursor": row.id, "entity": row.entity, "id": row.entity_id, "action": "delete"}
+            if row.action != "delete" and obj is not None:
+                change.update(action="upsert", data=obj.serialize())
+            changes.append(change)
+
+        # Sin más páginas, el cursor avanza hasta el horizonte aunque los
+        # últimos cambios fueran de otros usuarios (no se vuelven a recorrer)
+        cursor = rows[-1].id if has_more else max(since, horizon)
+        return {"changes": changes, "cursor": cursor, "has_more": has_more}
+
+    def _horizon(self, since):
+        """
+        Mayor id hasta el cual el log está completo: se corta antes del primer
+        hueco seguido de cambios recientes (puede ser una transacción abierta)
+        """
+        first_recent = db.session.query(func.min(ChangeLog.id)).filter(
+            ChangeLog.id > since, ChangeLog.created_at >= datetime.utcnow() - self.settle
+        ).scalar()
+        if first_recent is None:
+            return max(db.session.query(func.max(ChangeLog.id)).scalar() or 0, since)
+
+        previous = db.session.query(func.max(ChangeLog.id)).filter(ChangeLog.id < first_recent).scalar() or 0
+        tail = [row.id for row in db.session.query(ChangeLog.id).filter(
+            ChangeLog.id >= first_recent
+        ).order_by(ChangeLog.id)]
+        for current in tail:
+            if current > previous + 1 and current - 1 > since:
+                break
+            previous = current
+        return max(previous, since)
+
+    # ------------------------------------
+    # Retención (trabajo periódico)
+    # ------------------------------------
+
+    def purge_expired(self, batch_size=None, max_batches=20):
+        """Elimina cambios más viejos que la retención en lotes acotados. Devuelve cuántos borró"""
+        batch_size = batch_size or self.PURGE_BATCH_SIZE
+        cutoff = datetime.utcnow() - self.retention
+        deleted = 0
+        for _ in range(max_batches):
+            ids = [row.id for row in db.session.query(ChangeLog.id).filter(
+                ChangeLog.created_at < cutoff
+            ).order_by(ChangeLog.id).limit(batch_size)]
+            if not ids:
+                break
+            ChangeLog.query.filter(ChangeLog.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+            deleted += len(ids)
+            if len(ids) < batch_size:
+                break
+        return deleted
+
+
+# Instancia global del servicio
+change_feed = ChangeFeed()
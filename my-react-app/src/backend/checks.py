@@ -0,0 +1,298 @@
+"""
+Verificaciones autocontenidas: base SQLite temporal y servicios externos falsos
+
+A diferencia de loadtest.py no necesitan un servidor corriendo ni
+credenciales. Cada verificación termina con código 1 si falla:
+
+    python checks.py campaign   # campaña contra un SendGrid falso: lotes y reanudación
+    python checks.py outbound   # reintentos y circuit breaker ante 5xx y timeouts
+    python checks.py stock      # checkouts concurrentes por la última unidad de un disfraz
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class CheckFailed(AssertionError):
+    """Una verificación no se cumplió"""
+
+
+def expect(condition, message):
+    if not condition:
+        raise CheckFailed(message)
+    print(f"  ✓ {message}")
+
+
+def start_stub(respond):
+    """
+    Servidor HTTP falso en un puerto libre. `respond(path, body)` devuelve el
+    status (o lanza para cortar la conexión). Devuelve (servidor, URL base)
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            status = respond(self.path, json.loads(raw) if raw else None)
+            try:
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # el cliente ya se fue por timeout
+
+        do_GET = do_POST
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def create_test_app(**env):
+    """App sobre una base SQLite temporal. `env` se aplica antes de importar los servicios"""
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{tempfile.mktemp(suffix='.db')}",
+        "BACKGROUND_JOBS_ENABLED": "false",
+        "RATE_LIMIT_ENABLED": "false",
+        "OUTBOUND_ASYNC": "false",
+        **env,
+    })
+    from app import create_app
+    return create_app()
+
+
+# ====================================
+# CAMPAÑAS
+# ====================================
+
+def check_campaign(args):
+    """Lotes de hasta 1000 destinatarios, detención en el lote rechazado y reanudación sin duplicados"""
+    received, lock = [], threading.Lock()
+    reject_once = {"user1500@example.com"}
+
+    def respond(path, body):
+        emails = [p["to"][0]["email"] for p in body["personalizations"]]
+        with lock:
+            if reject_once & set(emails):
+                reject_once.clear()
+                return 400  # el lote no se envió: la campaña debe detenerse antes de él
+            received.append(body)
+        return 202
+
+    server, url = start_stub(respond)
+    app = create_test_app(SENDGRID_API_KEY="test", SENDGRID_FROM_EMAIL="diverkids@example.com",
+                          SENDGRID_API_HOST=url)
+    from sqlalchemy import insert
+    from models import db, User
+    from campaign_service import campaign_service
+
+    with app.app_context():
+        db.session.execute(insert(User), [
+            {"name": "O'Brien & Hijos" if i == 1 else f"Usuario {i}", "email": f"user{i}@example.com",
+             "password_hash": "x", "role": "parent"}
+            for i in range(1, args.users + 1)
+        ])
+        db.session.commit()
+        campaign_service.concurrency = 2
+        campaign = campaign_service.create("announcement", subject="Novedades", message="Llegaron disfraces")
+
+        campaign_service.claim(campaign.id)
+        campaign_service.run(campaign.id)
+        expect(campaign.status == "failed", "la campaña se detiene en el lote rechazado")
+        expect(campaign.cursor == 1000 and campaign.sent_count == 1000,
+               f"el cursor queda al final del último lote aceptado ({campaign.cursor})")
+
+        campaign_service.claim(campaign.id)
+        campaign_service.run(campaign.id)
+        expect(campaign.status == "completed", "la reanudación termina la campaña")
+
+    sizes = [len(body["personalizations"]) for body in received]
+    emails = [p["to"][0]["email"] for body in received for p in body["personalizations"]]
+    expect(max(sizes) <= 1000, f"lotes de a lo sumo 1000 destinatarios {sizes}")
+    expect(len(emails) == len(set(emails)) == args.users, f"cada destinatario recibe un solo email ({len(emails)})")
+
+    first = received[0]
+    substitutions = first["personalizations"][0]["substitutions"]
+    html, text = first["content"][1]["value"], first["content"][0]["value"]
+    expect(substitutions["-name-"] == "O'Brien & Hijos", "el texto plano recibe el nombre sin escapar")
+    expect(substitutions["-name_html-"] == "O&#x27;Brien &amp; Hijos", "el HTML recibe el nombre escapado")
+    expect("-name_html-" in html and "-name-" not in html and "-name-" in text,
+           "cada parte usa su propio tag de sustitución")
+    server.shutdown()
+
+
+# ====================================
+# LLAMADAS SALIENTES
+# ====================================
+
+def check_outbound(args):
+    """Qué se reintenta según el método y transiciones closed -> open -> half_open -> closed"""
+    faults = {"status": 503, "delay": 0}  # lo que responde el stub en cada momento
+    hits = []
+
+    def respond(path, body):
+        hits.append(path)
+        time.sleep(faults["delay"])
+        return faults["status"]
+
+    server, url = start_stub(respond)
+    os.environ.update({
+        "STUB_READ_TIMEOUT": "0.3", "STUB_RETRIES": "2", "STUB_BACKOFF": "0",
+        "STUB_BREAKER_THRESHOLD": "100", "STUB_BREAKER_RESET": "0.5",
+    })
+    from outbound import OutboundClient, OutboundError, CircuitOpenError
+
+    def calls(method, **kwargs):
+        """Cuántas veces llegó la llamada al stub y qué devolvió"""
+        hits.clear()
+        try:
+            result = client.request(method, "/", **kwargs).status_code
+        except OutboundError as error:
+            result = type(error).__name__
+        return len(hits), result
+
+    client = OutboundClient("stub", url)
+    expect(calls("POST") == (1, 503), "un POST con 5xx no se reintenta (podría duplicar el email)")
+    expect(calls("GET") == (3, 503), "un GET con 5xx se reintenta")
+    expect(calls("POST", idempotent=True) == (3, 503), "idempotent=True habilita los reintentos del POST")
+    faults["status"] = 429
+    expect(calls("POST") == (3, 429), "un POST con 429 se reintenta")
+    faults.update(status=202, delay=0.5)
+    expect(calls("POST") == (1, "OutboundError"), "un POST con timeout de lectura no se reintenta")
+    expect(calls("GET") == (3, "OutboundError"), "un GET con timeout de lectura se reintenta")
+
+    refused = OutboundClient("stub", "http://127.0.0.1:9")  # puerto cerrado: nunca se envió
+    attempts, send = [], refused.session.request
+    refused.session.request = lambda *a, **kw: attempts.append(1) or send(*a, **kw)
+    try:
+        refused.request("POST", "/")
+    except OutboundError:
+        pass
+    expect(len(attempts) == 3, "un POST que no llegó a conectar se reintenta")
+
+    # Circuit breaker
+    os.environ["STUB_BREAKER_THRESHOLD"] = "3"
+    client = OutboundClient("stub", url)
+    faults.update(status=503, delay=0)
+    for _ in range(3):
+        calls("POST")
+    expect(client.breaker.snapshot()["state"] == "open", "3 fallas seguidas abren el circuito")
+    expect(calls("POST") == (0, "CircuitOpenError"), "con el circuito abierto no se llama al proveedor")
+
+    time.sleep(0.6)
+    expect(calls("POST") == (1, 503), "pasado el reset se deja pasar una llamada de prueba")
+    expect(client.breaker.snapshot()["state"] == "open", "si la prueba falla el circuito vuelve a abrirse")
+
+    time.sleep(0.6)
+    faults.update(status=202, delay=0.2)
+    trial = threading.Thread(target=calls, args=("POST",))
+    trial.start()
+    time.sleep(0.1)
+    states = client.breaker.snapshot()["state"]
+    try:
+        client.request("POST", "/")
+        concurrent = "llamó"
+    except CircuitOpenError:
+        concurrent = "rechazada"
+    trial.join()
+    expect(states == "half_open" and concurrent == "rechazada",
+           "en half_open solo pasa la llamada de prueba; las demás se rechazan")
+    expect(client.breaker.snapshot()["state"] == "closed", "una prueba exitosa cierra el circuito")
+    expect(calls("POST") == (1, 202), "con el circuito cerrado las llamadas vuelven a pasar")
+    server.shutdown()
+
+
+# ====================================
+# STOCK DE DISFRACES
+# ====================================
+
+def check_stock(args):
+    """N hilos reservan el mismo disfraz y día a la vez: nunca más unidades que el stock"""
+    app = create_test_app()
+    from datetime import date
+    from sqlalchemy.exc import OperationalError
+    from models import db, Costume, CostumeStockDay
+    from inventory_service import costume_inventory, StockError
+
+    day = date(2030, 1, 15)
+    with app.app_context():
+        costume = Costume(name="Pirata", price_per_day=10000, stock_quantity=args.stock)
+        db.session.add(costume)
+        db.session.commit()
+        costume_id = costume.id
+
+    results, lock = {"accepted": 0, "rejected": 0, "lock_errors": 0}, threading.Lock()
+    waits = []
+    start = threading.Barrier(args.threads)
+
+    def checkout():
+        with app.app_context():
+            start.wait()
+            began = time.perf_counter()
+            try:
+                costume_inventory.reserve(costume_id, day)
+                db.session.commit()
+                outcome = "accepted"
+            except StockError:
+                db.session.rollback()
+                outcome = "rejected"
+            except OperationalError as error:
+                db.session.rollback()
+                print(f"  ! {error.orig}")
+                outcome = "lock_errors"
+            finally:
+                db.session.remove()
+            with lock:
+                results[outcome] += 1
+                waits.append(time.perf_counter() - began)
+
+    threads = [threading.Thread(target=checkout) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        reserved = db.session.query(CostumeStockDay.reserved).filter_by(costume_id=costume_id, day=day).scalar()
+
+    waits.sort()
+    print(f"  {args.threads} hilos, stock {args.stock}: {results}")
+    print(f"  espera p50 {waits[len(waits) // 2] * 1000:.1f} ms, máx {waits[-1] * 1000:.1f} ms")
+    expect(results["accepted"] <= args.stock, f"aceptadas ({results['accepted']}) <= stock ({args.stock})")
+    expect(reserved == results["accepted"], f"reserved ({reserved}) == aceptadas ({results['accepted']})")
+    expect(results["lock_errors"] or results["accepted"] == min(args.stock, args.threads),
+           "sin errores de lock se vende todo el stock disponible")
+
+
+CHECKS = {
+    "campaign": check_campaign,
+    "outbound": check_outbound,
+    "stock": check_stock,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("check", choices=CHECKS)
+    parser.add_argument("--users", type=int, default=2500, help="destinatarios de la campaña")
+    parser.add_argument("--threads", type=int, default=32, help="checkouts simultáneos (stock)")
+    parser.add_argument("--stock", type=int, default=5, help="unidades del disfraz (stock)")
+    args = parser.parse_args()
+
+    print(f"🔎 {args.check}")
+    try:
+        CHECKS[args.check](args)
+    except CheckFailed as error:
+        print(f"  ✗ {error}")
+        sys.exit(1)
+    print("✅ OK")
+
+
+if __name__ == "__main__":
+    main()
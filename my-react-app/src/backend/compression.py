@@ -0,0 +1,184 @@
+"""
+Compresión de respuestas negociada con Accept-Encoding (br, gzip)
+
+- Solo tipos compresibles (JSON, texto) y cuerpos sobre COMPRESSION_MIN_SIZE
+- Nivel configurable (COMPRESSION_GZIP_LEVEL / COMPRESSION_BROTLI_QUALITY)
+- Respuestas en streaming se comprimen por chunk, sin bufferizar
+- Los endpoints marcados con @compressor.cached (catálogo público) guardan
+  el resultado comprimido indexado por el hash del cuerpo: pedir de nuevo
+  los mismos bytes no los vuelve a comprimir, y cualquier cambio en el
+  catálogo produce otro hash, sin necesidad de invalidar
+
+brotli es opcional: sin el paquete solo se ofrece gzip.
+"""
+import hashlib
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from flask import request, current_app
+from metrics import metrics
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependencia opcional
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = {
+    "application/json", "application/javascript", "text/plain", "text/html",
+    "text/css", "text/csv", "text/calendar", "image/svg+xml",
+}
+
+
+class ResponseCompressor:
+    """after_request que comprime con br o gzip según lo que acepta el cliente"""
+
+    CACHED_LEVELS = {"gzip": 9, "br": 11}  # se comprime una vez: usar el máximo
+
+    def __init__(self):
+        self.enabled = os.environ.get("COMPRESSION_ENABLED", "true").lower() == "true"
+        self.min_size = int(os.environ.get("COMPRESSION_MIN_SIZE", "1024"))
+        self.levels = {
+            "gzip": int(os.environ.get("COMPRESSION_GZIP_LEVEL", "6")),
+            "br": int(os.environ.get("COMPRESSION_BROTLI_QUALITY", "5")),
+        }
+        self.cache_max_bytes = int(os.environ.get("COMPRESSION_CACHE_BYTES", str(8 * 1024 * 1024)))
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+
+    @property
+    def encodings(self):
+        """Codificaciones soportadas, en orden de preferencia"""
+        return ("br", "gzip") if brotli else ("gzip",)
+
+    def init_app(self, app):
+        app.after_request(self.compress_response)
+
+    def cached(self, fn):
+        """Decorador: cachea el cuerpo comprimido de este endpoint"""
+        fn.compression_cached = True
+        return fn
+
+    # ------------------------------------
+    # Negociación
+    # ------------------------------------
+
+    def negotiate(self, accept_encoding):
+        """Elige la codificación preferida por el cliente (respeta q=0). None = sin comprimir"""
+        accepted = {}
+        for part in (accept_encoding or "").split(","):
+            name, _, params = part.strip().partition(";")
+            name = name.strip().lower()
+            if not name:
+                continue
+            quality = 1.0
+            params = params.strip()
+            if params.startswith("q="):
+                try:
+                    quality = float(params[2:])
+                except ValueError:
+                    quality = 0.0
+            accepted[name] = quality
+
+        best, best_quality = None, 0.0
+        for encoding in self.encodings:
+            quality = accepted.get(encoding, accepted.get("*", 0.0))
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    # ------------------------------------
+    # Compresión
+    # ------------------------------------
+
+    def _compressor(self, encoding, level):
+        if encoding == "br":
+            return brotli.Compressor(quality=level)
+        return zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 = formato gzip
+
+    def compress(self, data, encoding, level=None):
+        level = self.levels[encoding] if level is None else level
+        if encoding == "br":
+            return brotli.compress(data, quality=level)
+        compressor = self._compressor(encoding, level)
+        return compressor.compress(data) + compressor.flush()
+
+    def _stream(self, chunks, encoding):
+        compressor = self._compressor(encoding, self.levels[encoding])
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                if encoding == "br":
+                    data = compressor.process(chunk) + compressor.flush()
+                else:
+                    data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                if data:
+                    yield data
+            yield compressor.finish() if encoding == "br" else compressor.flush()
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+
+    def _cached_compress(self, data, encoding):
+        key = (hashlib.blake2b(data, digest_size=16).digest(), encoding)
+        with self._lock:
+            body = self._cache.get(key)
+            if body is not None:
+                self._cache.move_to_end(key)
+                metrics.incr("compression.cache_hits")
+                return body
+
+        body = self.compress(data, encoding, self.CACHED_LEVELS[encoding])
+        metrics.incr("compression.cache_misses")
+        with self._lock:
+            if key not in self._cache and len(body) <= self.cache_max_bytes:
+                self._cache[key] = body
+                self._cache_bytes += len(body)
+                while self._cache_bytes > self.cache_max_bytes:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._cache_bytes -= len(evicted)
+        return body
+
+    def _is_cached_endpoint(self):
+        view = current_app.view_functions.get(request.endpoint) if request.endpoint else None
+        return getattr(view, "compression_cached", False)
+
+    def compress_response(self, response):
+        if not self.enabled or request.method == "HEAD":
+            return response
+        if response.status_code < 200 or response.status_code >= 300 or response.status_code == 204:
+            return response
+        if response.direct_passthrough or "Content-Encoding" in response.headers:
+            return response
+        if response.mimetype not in COMPRESSIBLE_TYPES:
+            return response
+
+        response.vary.add("Accept-Encoding")
+        encoding = self.negotiate(request.headers.get("Accept-Encoding"))
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self._stream(response.response, encoding)
+            response.headers.pop("Content-Length", None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            if self._is_cached_endpoint():
+                response.set_data(self._cached_compress(data, encoding))
+            else:
+                response.set_data(self.compress(data, encoding))
+
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)  # los bytes ya no son idénticos al original
+        return response
+
+
+# Instancia global del servicio
+compressor = ResponseCompressor()
@@ -0,0 +1,99 @@
+"""
+Migración: normaliza los emails de usuario y fusiona cuentas duplicadas
+
+Antes de normalizar, "Ana@Mail.com" y "ana@mail.com" podían ser cuentas
+distintas. Este script agrupa los usuarios por email normalizado (sin
+espacios, en minúsculas) y en cada grupo conserva una cuenta: la admin si
+la hay, si no la con más reservas y, a igualdad, la más antigua. Las
+reservas, eventos, archivos, change_log y lo creado por las demás pasan a
+la conservada; luego se eliminan y todos los emails quedan normalizados,
+de modo que el índice único de user.email cubre la forma normalizada.
+
+Sin --apply solo muestra lo que haría. Correr una vez al desplegar (con
+poco tráfico) y antes de que los usuarios duplicados vuelvan a entrar:
+
+    python dedupe_emails.py           # vista previa
+    python dedupe_emails.py --apply
+"""
+import argparse
+import os
+from collections import defaultdict
+from sqlalchemy import delete, func, update
+from models import (
+    db, User, Booking, Event, PasswordReset, EmailCampaign, MediaAsset, ChangeLog,
+    BookingArchive, EventArchive, normalize_email
+)
+
+
+# (modelo, columna) que referencian user.id y se reasignan a la cuenta conservada
+REASSIGN = (
+    (Booking, "user_id"), (Event, "user_id"), (BookingArchive, "user_id"), (EventArchive, "user_id"),
+    (ChangeLog, "user_id"), (EmailCampaign, "created_by"), (MediaAsset, "created_by"),
+)
+
+
+def duplicate_groups():
+    """{email normalizado: [usuarios]} solo para los grupos con más de una cuenta"""
+    booking_counts = dict(db.session.query(Booking.user_id, func.count(Booking.id)).group_by(Booking.user_id))
+    groups = defaultdict(list)
+    for user in User.query.order_by(User.id):
+        groups[normalize_email(user.email)].append(user)
+    return {
+        email: sorted(users, key=lambda user: (not user.is_admin, -booking_counts.get(user.id, 0), user.id))
+        for email, users in groups.items() if len(users) > 1
+    }
+
+
+def merge(survivor, duplicates):
+    """Mueve las filas de `duplicates` a `survivor` y los elimina. No hace commit"""
+    ids = [user.id for user in duplicates]
+    for model, column in REASSIGN:
+        attribute = getattr(model, column)
+        db.session.execute(
+            update(model).where(attribute.in_(ids)).values({column: survivor.id})
+            .execution_options(synchronize_session=False)
+        )
+    db.session.execute(delete(PasswordReset).where(PasswordReset.user_id.in_(ids)))
+    db.session.execute(delete(User).where(User.id.in_(ids)).execution_options(synchronize_session=False))
+
+
+def normalize_remaining():
+    """Reescribe los emails que aún no están en forma normalizada. Devuelve cuántos"""
+    changed = 0
+    for user in User.query.filter(User.email != func.lower(func.trim(User.email))):
+        user.email = user.email  # el validador del modelo normaliza
+        changed += 1
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apply", action="store_true", help="aplicar los cambios (sin esto, solo vista previa)")
+    args = parser.parse_args()
+
+    from app import create_app
+    from cache import data_cache
+
+    os.environ["BACKGROUND_JOBS_ENABLED"] = "false"
+    app = create_app()
+    with app.app_context():
+        groups = duplicate_groups()
+        for email, (survivor, *duplicates) in groups.items():
+            print(f"👥 {email}: se conserva #{survivor.id} ({survivor.email}), "
+                  f"se fusionan {', '.join(f'#{user.id} ({user.email})' for user in duplicates)}")
+            if args.apply:
+                merge(survivor, duplicates)
+
+        if not args.apply:
+            pending = User.query.filter(User.email != func.lower(func.trim(User.email))).count()
+            print(f"🔎 Vista previa: {len(groups)} grupos duplicados, {pending} emails por normalizar. Usar --apply")
+            return
+
+        changed = normalize_remaining()
+        db.session.commit()
+        data_cache.invalidate("users")  # con CACHE_STORAGE_URL, vence el caché compartido de los workers
+        print(f"✅ {len(groups)} grupos fusionados, {changed} emails normalizados")
+
+
+if __name__ == "__main__":
+    main()
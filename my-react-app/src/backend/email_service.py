@@ -3,8 +3,9 @@ Servicio de Email usando SendGrid
 Maneja envío de emails de confirmación, recuperación de contraseña, etc.
 """
 import os
-from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail, Email, To, Content
+from email_templates import email_templates
+from outbound import OutboundClient, register_client
 
 class EmailService:
     """Servicio para enviar emails usando SendGrid"""
@@ -18,7 +19,16 @@ class EmailService:
             print("⚠️  SENDGRID_API_KEY no configurada. Los emails no se enviarán.")
             self.client = None
         else:
-            self.client = SendGridAPIClient(self.api_key)
+            # Sesión keep-alive con timeouts, reintentos y circuit breaker.
+            # SENDGRID_API_HOST permite apuntar a un servidor falso local en pruebas
+            self.client = register_client(OutboundClient(
+                "sendgrid",
+                os.environ.get('SENDGRID_API_HOST', 'https://api.sendgrid.com'),
+                headers={"Authorization": f"Bearer {self.api_key}"}
+            ))
+        
+        # Compilar templates una vez al iniciar
+        email_templates.compile_all()
     
     def send_email(self, to_email, subject, html_content, text_content=None):
         """
@@ -54,7 +64,7 @@ class EmailService:
                     Content("text/html", html_content)
                 ]
             
-            response = self.client.send(message)
+            response = self._post_mail(message.get())
             
             if response.status_code == 202:
                 print(f"✅ Email enviado a {to_email}")
@@ -62,7 +72,7 @@ class EmailService:
             else:
                 print(f"⚠️  Error al enviar email: {response.status_code}")
                 try:
-                    print(f"⚠️  Response body: {response.body}")
+                    print(f"⚠️  Response body: {response.text}")
                 except Exception:
                     pass
                 return False
@@ -71,166 +81,90 @@ class EmailService:
             print(f"❌ Error al enviar email: {str(e)}")
             return False
     
-    def send_welcome_email(self, user_email, user_name):
-        """Enviar email de bienvenida a nuevo usuario"""
-        subject = "¡Bienvenido a DiverKids! 🎉"
-        
-        html_content = f"""
-        <html>
-            <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-                <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 40px; text-align: center;">
-                    <h1 style="color: white; margin: 0;">¡Bienvenido a DiverKids!</h1>
-                </div>
-                <div style="padding: 40px; background-color: #f9f9f9;">
-                    <h2 style="color: #333;">Hola {user_name},</h2>
-                    <p style="color: #666; line-height: 1.6;">
-                        Gracias por registrarte en DiverKids. Estamos emocionados de ser parte de las celebraciones 
-                        especiales de tu familia.
-                    </p>
-                    <p style="color: #666; line-height: 1.6;">
-                        Con tu cuenta puedes:
-                    </p>
-                    <ul style="color: #666; line-height: 1.8;">
-                        <li>Reservar paquetes de animación</li>
-                        <li>Rentar disfraces para tus eventos</li>
-                        <li>Gestionar tus reservas</li>
-                        <li>Ver el historial de tus eventos</li>
-                    </ul>
-                    <div style="text-align: center; margin-top: 30px;">
-                        <a href="{os.environ.get('FRONTEND_URL', 'http://localhost:5173')}" 
-                           style="background-color: #667eea; color: white; padding: 15px 30px; 
-                                  text-decoration: none; border-radius: 5px; display: inline-block;">
-                            Explorar Servicios
-                        </a>
-                    </div>
-                </div>
-                <div style="padding: 20px; text-align: center; color: #999; font-size: 12px;">
-                    <p>© 2024 DiverKids. Todos los derechos reservados.</p>
-                </div>
-            </body>
-        </html>
+    def _post_mail(self, message):
+        """POST /v3/mail/send a través de la capa de llamadas salientes"""
+        return self.client.request("POST", "/v3/mail/send", json=message)
+    
+    def send_bulk(self, subject, html_content, text_content, personalizations):
         """
+        Enviar un mismo contenido a muchos destinatarios en una sola llamada
         
-        text_content = f"""
-        Hola {user_name},
-        
-        ¡Bienvenido a DiverKids!
-        
-        Gracias por registrarte. Con tu cuenta puedes reservar paquetes de animación, 
-        rentar disfraces y gestionar tus eventos.
-        
-        Visítanos en: {os.environ.get('FRONTEND_URL', 'http://localhost:5173')}
+        Args:
+            subject (str): Asunto (puede contener tags de sustitución)
+            html_content (str): HTML con tags de sustitución (ej. -name-)
+            text_content (str): Texto plano con los mismos tags
+            personalizations (list): Hasta 1000 dicts {"to": [...], "substitutions": {...}}
         
-        Saludos,
-        El equipo de DiverKids
+        Returns:
+            bool: True si SendGrid aceptó el lote
         """
+        if not self.client or not self.from_email:
+            print("❌ No se puede enviar lote - SendGrid no configurado")
+            return False
         
-        return self.send_email(user_email, subject, html_content, text_content)
+        message = {
+            "personalizations": personalizations,
+            "from": {"email": self.from_email, "name": self.from_name},
+            "subject": subject,
+            "content": [
+                {"type": "text/plain", "value": text_content},
+                {"type": "text/html", "value": html_content}
+            ]
+        }
+        
+        try:
+            response = self._post_mail(message)
+            if response.status_code == 202:
+                return True
+            print(f"⚠️  Error al enviar lote: {response.status_code}")
+            return False
+        except Exception as e:
+            print(f"❌ Error al enviar lote: {str(e)}")
+            return False
+    
+    def send_template(self, to_email, subject, template, **context):
+        """Renderiza un template del registro y lo envía con parte HTML y texto"""
+        html_content, text_content = email_templates.render(template, **context)
+        return self.send_email(to_email, subject, html_content, text_content)
+    
+    def send_welcome_email(self, user_email, user_name):
+        """Enviar email de bienvenida a nuevo usuario"""
+        return self.send_template(
+            user_email,
+            "¡Bienvenido a DiverKids! 🎉",
+            "welcome",
+            user_name=user_name,
+            frontend_url=os.environ.get('FRONTEND_URL', 'http://localhost:5173')
+        )
     
     def send_booking_confirmation(self, booking, user):
         """Enviar confirmación de reserva"""
-        subject = f"Confirmación de Reserva - {booking.event_date}"
-        
-        html_content = f"""
-        <html>
-            <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-                <div style="background: #4CAF50; padding: 40px; text-align: center;">
-                    <h1 style="color: white; margin: 0;">¡Reserva Confirmada! ✅</h1>
-                </div>
-                <div style="padding: 40px; background-color: #f9f9f9;">
-                    <h2 style="color: #333;">Hola {user.name},</h2>
-                    <p style="color: #666; line-height: 1.6;">
-                        Tu reserva ha sido confirmada exitosamente. Aquí están los detalles:
-                    </p>
-                    <div style="background: white; padding: 20px; border-left: 4px solid #4CAF50; margin: 20px 0;">
-                        <p><strong>Fecha del evento:</strong> {booking.event_date}</p>
-                        <p><strong>Hora:</strong> {booking.event_time or 'Por confirmar'}</p>
-                        <p><strong>Ubicación:</strong> {booking.event_location or 'Por confirmar'}</p>
-                        <p><strong>Tipo de servicio:</strong> {booking.booking_type}</p>
-                        <p><strong>Total:</strong> ${booking.total_price}</p>
-                    </div>
-                    <p style="color: #666; line-height: 1.6;">
-                        Nos pondremos en contacto contigo pronto para confirmar los detalles finales.
-                    </p>
-                </div>
-                <div style="padding: 20px; text-align: center; color: #999; font-size: 12px;">
-                    <p>© 2024 DiverKids. Todos los derechos reservados.</p>
-                </div>
-            </body>
-        </html>
-        """
-        
-        return self.send_email(user.email, subject, html_content)
+        return self.send_template(
+            user.email,
+            f"Confirmación de Reserva - {booking.event_date}",
+            "booking_confirmation",
+            booking=booking,
+            user=user
+        )
     
     def send_password_reset(self, user_email, reset_token):
         """Enviar email de recuperación de contraseña"""
-        subject = "Recuperación de Contraseña - DiverKids"
         frontend_url = os.environ.get('FRONTEND_URL', 'http://localhost:5173')
-        reset_link = f"{frontend_url}/reset-password?token={reset_token}"
-        
-        html_content = f"""
-        <html>
-            <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-                <div style="background: #FF9800; padding: 40px; text-align: center;">
-                    <h1 style="color: white; margin: 0;">Recuperación de Contraseña</h1>
-                </div>
-                <div style="padding: 40px; background-color: #f9f9f9;">
-                    <p style="color: #666; line-height: 1.6;">
-                        Recibimos una solicitud para restablecer tu contraseña. 
-                        Haz clic en el botón de abajo para crear una nueva contraseña:
-                    </p>
-                    <div style="text-align: center; margin: 30px 0;">
-                        <a href="{reset_link}" 
-                           style="background-color: #FF9800; color: white; padding: 15px 30px; 
-                                  text-decoration: none; border-radius: 5px; display: inline-block;">
-                            Restablecer Contraseña
-                        </a>
-                    </div>
-                    <p style="color: #999; font-size: 12px;">
-                        Este enlace expirará en 1 hora. Si no solicitaste este cambio, 
-                        ignora este email.
-                    </p>
-                    <p style="color: #999; font-size: 12px;">
-                        Si el botón no funciona, copia y pega este enlace en tu navegador:<br>
-                        {reset_link}
-                    </p>
-                </div>
-                <div style="padding: 20px; text-align: center; color: #999; font-size: 12px;">
-                    <p>© 2024 DiverKids. Todos los derechos reservados.</p>
-                </div>
-            </body>
-        </html>
-        """
-        
-        return self.send_email(user_email, subject, html_content)
+        return self.send_template(
+            user_email,
+            "Recuperación de Contraseña - DiverKids",
+            "password_reset",
+            reset_link=f"{frontend_url}/reset-password?token={reset_token}"
+        )
     
-    def send_contact_notification(self, contact):
+    def send_contact_notification(self, contact, to_email=None):
         """Enviar notificación de nuevo mensaje de contacto al admin"""
-        admin_email = os.environ.get('ADMIN_EMAIL', 'admin@diverkids.com')
-        subject = f"Nuevo mensaje de contacto - {contact.name}"
-        
-        html_content = f"""
-        <html>
-            <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-                <div style="background: #2196F3; padding: 40px; text-align: center;">
-                    <h1 style="color: white; margin: 0;">Nuevo Mensaje de Contacto</h1>
-                </div>
-                <div style="padding: 40px; background-color: #f9f9f9;">
-                    <div style="background: white; padding: 20px; border-left: 4px solid #2196F3;">
-                        <p><strong>Nombre:</strong> {contact.name}</p>
-                        <p><strong>Email:</strong> {contact.email}</p>
-                        <p><strong>Teléfono:</strong> {contact.phone or 'No proporcionado'}</p>
-                        <p><strong>Mensaje:</strong></p>
-                        <p style="padding: 15px; background: #f5f5f5; border-radius: 5px;">
-                            {contact.message}
-                        </p>
-                    </div>
-                </div>
-            </body>
-        </html>
-        """
-        
-        return self.send_email(admin_email, subject, html_content)
+        return self.send_template(
+            to_email or os.environ.get('ADMIN_EMAIL', 'admin@diverkids.com'),
+            f"🔔 Nuevo mensaje de {contact.name} - DiverKids",
+            "contact_notification",
+            contact=contact
+        )
 
 
 # Instancia global del servicio
@@ -0,0 +1,148 @@
+"""
+Registro de templates de email (Jinja)
+Compila y cachea los templates al iniciar, con autoescape de los datos del
+usuario. El CSS de templates/emails/styles.css se inlinea una sola vez al
+cargar cada template (no por envío) y la parte de texto plano se deriva
+automáticamente del HTML renderizado.
+"""
+import os
+import re
+from html import unescape
+from html.parser import HTMLParser
+from jinja2 import Environment, FileSystemLoader, StrictUndefined
+
+
+TEMPLATES_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), "templates", "emails")
+
+_CSS_RULE = re.compile(r"([^{}]+)\{([^}]*)\}")
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_OPEN_TAG = re.compile(r"<([a-zA-Z][a-zA-Z0-9]*)(\s[^<>]*?)?(/?)>")
+_ATTR = re.compile(r'\s(class|style)="([^"]*)"')
+_NEWLINE_INDENT = re.compile(r"\s*\n\s*")
+_BETWEEN_TAGS = re.compile(r"(>|%})\s+(<|{%)")
+
+
+def parse_css(css):
+    """Parsea reglas simples `tag {}` y `.clase {}` a {selector: declaraciones}"""
+    rules = {}
+    for selectors, declarations in _CSS_RULE.findall(_CSS_COMMENT.sub("", css)):
+        declarations = " ".join(declarations.split()).strip().rstrip(";")
+        for selector in selectors.split(","):
+            selector = selector.strip()
+            if selector:
+                rules[selector] = f"{rules[selector]}; {declarations}" if selector in rules else declarations
+    return rules
+
+
+def inline_css(source, rules):
+    """Reemplaza class="..." por style="..." según las reglas y compacta espacios"""
+    def replace(match):
+        tag, attrs, self_closing = match.group(1), match.group(2) or "", match.group(3)
+        found = dict(_ATTR.findall(attrs))
+        styles = [rules[tag.lower()]] if tag.lower() in rules else []
+        styles += [rules[f".{name}"] for name in found.get("class", "").split() if f".{name}" in rules]
+        if found.get("style"):
+            styles.append(found["style"].strip().rstrip(";"))
+        if not styles:
+            return match.group(0)
+        attrs = _ATTR.sub("", attrs)
+        return f'<{tag}{attrs} style="{"; ".join(styles)}"{self_closing}>'
+
+    source = _NEWLINE_INDENT.sub(" ", _OPEN_TAG.sub(replace, source))
+    return _BETWEEN_TAGS.sub(r"\1\2", source).strip()
+
+
+class _InliningLoader(FileSystemLoader):
+    """Loader que inlinea el CSS al leer el template (una vez por compilación)"""
+
+    def __init__(self, searchpath, stylesheet="styles.css"):
+        super().__init__(searchpath)
+        with open(os.path.join(searchpath, stylesheet), encoding="utf-8") as css_file:
+            self.rules = parse_css(css_file.read())
+
+    def get_source(self, environment, template):
+        source, filename, uptodate = super().get_source(environment, template)
+        return inline_css(source, self.rules), filename, uptodate
+
+
+class _TextExtractor(HTMLParser):
+    """Convierte el HTML del email a texto plano legible"""
+
+    BLOCK_TAGS = {"p", "div", "h1", "h2", "h3", "ul", "ol", "tr", "table"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._href = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "br":
+            self.parts.append("\n")
+        elif tag == "li":
+            self.parts.append("\n- ")
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n\n")
+        elif tag == "a":
+            self._href = dict(attrs).get("href")
+
+    def handle_endtag(self, tag):
+        if tag == "a" and self._href:
+            self.parts.append(f" ({self._href})")
+            self._href = None
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n\n")
+
+    def handle_data(self, data):
+        # El template ya viene compactado: los saltos de línea son del usuario
+        self.parts.append(re.sub(r"[ \t\r\f\v]+", " ", data))
+
+    def text(self):
+        text = "".join(self.parts)
+        text = re.sub(r"[ \t]*\n[ \t]*", "\n", text)
+        return unescape(re.sub(r"\n{3,}", "\n\n", text)).strip()
+
+
+def html_to_text(html):
+    """Deriva la parte text/plain desde el HTML renderizado"""
+    extractor = _TextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return extractor.text()
+
+
+class EmailTemplateRegistry:
+    """Templates de email compilados y cacheados en memoria"""
+
+    def __init__(self, templates_dir=TEMPLATES_DIR):
+        self.env = Environment(
+            loader=_InliningLoader(templates_dir),
+            autoescape=True,
+            auto_reload=False,
+            cache_size=-1,
+            undefined=StrictUndefined,
+        )
+        self._templates = {}
+
+    def compile_all(self):
+        """Compila todos los templates (excepto el layout) al iniciar"""
+        for filename in self.env.list_templates(extensions=["html"]):
+            if filename != "base.html":
+                self._templates[filename[:-len(".html")]] = self.env.get_template(filename)
+        return list(self._templates)
+
+    def render(self, name, **context):
+        """
+        Renderiza un template
+
+        Returns:
+            tuple: (html, texto plano)
+        """
+        template = self._templates.get(name)
+        if template is None:
+            template = self._templates[name] = self.env.get_template(f"{name}.html")
+        html = template.render(**context)
+        return html, html_to_text(html)
+
+
+# Instancia global del registro
+email_templates = EmailTemplateRegistry()
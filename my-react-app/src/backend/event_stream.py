@@ -0,0 +1,291 @@
+"""
+Notificaciones en vivo para el panel admin (Server-Sent Events)
+
+Cada commit que crea, modifica o elimina una reserva, un mensaje de contacto
+o un evento publica una notificación (booking.created, contact.deleted, ...)
+con un snapshot de las columnas de la fila. GET /api/admin/stream las envía
+como SSE con heartbeats; al reconectar, EventSource manda Last-Event-ID y se
+reenvía lo que faltó mientras siga en el buffer (si no, llega un evento
+"reset" y el panel vuelve a cargar los listados).
+
+Fan-out entre workers:
+- local: broker en memoria del proceso (un solo worker o desarrollo)
+- postgres: NOTIFY en cada commit y un hilo LISTEN por worker que alimenta
+  el buffer local
+
+Los ids los asigna cada proceso al recibir la notificación ("<época>-<n>"),
+así son correlativos en el orden en que llegan (PostgreSQL entrega los
+NOTIFY en orden de commit; un nextval tomado antes del commit no lo
+respeta). La reanudación es por worker: un Last-Event-ID de otro worker,
+de antes de un reinicio o de antes de que se cortara el LISTEN (época
+distinta) recibe "reset".
+
+Con workers sync cada conexión abierta ocupa un worker: usar gevent
+(GUNICORN_WORKER_CLASS=gevent) o acotar EVENT_STREAM_MAX_SECONDS.
+"""
+import itertools
+import json
+import os
+import select
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import date, datetime
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+from models import db, Booking, Contact, Event
+
+
+TRACKED_MODELS = {Booking: "booking", Contact: "contact", Event: "event"}
+CHANNEL = "diverkids_events"
+PAYLOAD_LIMIT = 7900  # NOTIFY acepta hasta 8000 bytes
+
+
+class StreamAuthError(ValueError):
+    """Ticket de stream inválido o expirado"""
+
+
+class EventBroker:
+    """Buffer circular de notificaciones y espera de suscriptores"""
+
+    def __init__(self):
+        self.backend = os.environ.get("EVENT_STREAM_BACKEND", "auto")
+        self.heartbeat = float(os.environ.get("EVENT_STREAM_HEARTBEAT", "15"))
+        self.max_seconds = float(os.environ.get("EVENT_STREAM_MAX_SECONDS", "300"))
+        self._buffer = deque(maxlen=int(os.environ.get("EVENT_STREAM_BUFFER", "1000")))
+        self._condition = threading.Condition()
+        self._epoch = uuid.uuid4().hex[:8]
+        self._ids = itertools.count(1)
+        self._engine_url = None
+        self._listener = None
+
+    # ------------------------------------
+    # Configuración
+    # ------------------------------------
+
+    def init_app(self, app):
+        with app.app_context():
+            url = db.engine.url
+        if self.backend == "auto":
+            self.backend = "postgres" if url.get_backend_name() == "postgresql" else "local"
+        self._engine_url = url
+
+    # ------------------------------------
+    # Publicación
+    # ------------------------------------
+
+    def publish(self, events):
+        """Publica notificaciones ya confirmadas (lista de (tipo, datos))"""
+        if not events:
+            return
+        if self.backend == "postgres":
+            self._notify(events)
+        else:
+            for kind, data in events:
+                self._append(kind, data)
+
+    def _notify(self, events):
+        try:
+            with db.engine.begin() as connection:
+                for kind, data in events:
+                    payload = json.dumps({"type": kind, "data": data}, default=str)
+                    if len(payload) > PAYLOAD_LIMIT:
+                        payload = json.dumps({"type": kind, "data": {"id": data.get("id")}})
+                    connection.execute(
+                        text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": payload}
+                    )
+        except Exception as error:
+            print(f"⚠️ No se pudo publicar notificación en vivo: {error}")
+
+    def _append(self, kind, data):
+        # El id se asigna bajo el lock: el buffer queda siempre ordenado
+        with self._condition:
+            self._buffer.append((next(self._ids), kind, data))
+            self._condition.notify_all()
+
+    def _restart(self):
+        """Nueva época (se perdieron notificaciones): los ids anteriores dejan de valer"""
+        with self._condition:
+            self._epoch = uuid.uuid4().hex[:8]
+            self._ids = itertools.count(1)
+            self._buffer.clear()
+            self._condition.notify_all()
+
+    # ------------------------------------
+    # Suscripción
+    # ------------------------------------
+
+    def position(self):
+        """(época, último id) del buffer"""
+        with self._condition:
+            return self._epoch, self._buffer[-1][0] if self._buffer else 0
+
+    @staticmethod
+    def parse_event_id(raw):
+        """Last-Event-ID "<época>-<n>" -> (época, n); None si no tiene ese formato"""
+        epoch, _, number = (raw or "").partition("-")
+        return (epoch, int(number)) if epoch and number.isdigit() else None
+
+    def events_after(self, epoch, last_id, strict=True):
+        """
+        Eventos con id > last_id. None si la época cambió o, con strict, si
+        last_id ya salió del buffer (el cliente debe recargar).
+        """
+        with self._condition:
+            if epoch != self._epoch:
+                return None
+            newest = self._buffer[-1][0] if self._buffer else 0
+            if strict and (last_id > newest or (self._buffer and last_id < self._buffer[0][0] - 1)):
+                return None
+            return [item for item in self._buffer if item[0] > last_id]
+
+    def wait(self, epoch, last_id, timeout, strict=True):
+        """Espera hasta `timeout` segundos por eventos nuevos"""
+        with self._condition:
+            if epoch == self._epoch and (not self._buffer or self._buffer[-1][0] <= last_id):
+                self._condition.wait(timeout)
+        return self.events_after(epoch, last_id, strict)
+
+    def subscribe(self, last_event_id=None):
+        """
+        Generador SSE: reenvía desde Last-Event-ID (tal como llegó, str),
+        luego eventos en vivo y heartbeats
+        """
+        if self.backend == "postgres":
+            self._ensure_listener()
+
+        deadline = time.monotonic() + self.max_seconds
+
+        def reset():
+            # El cliente perdió eventos que ya no están en el buffer (o son de otra época)
+            epoch, last_id = self.position()
+            return epoch, last_id, f"id: {epoch}-{last_id}\nevent: reset\ndata: {{}}\n\n"
+
+        def stream():
+            yield "retry: 3000\n: conectado\n\n"
+            # Sin Last-Event-ID se empieza desde ahora; con buffer vacío no hay
+            # referencia para detectar huecos hasta recibir el primer evento
+            epoch, last_id = self.position()
+            strict = last_id > 0
+            if last_event_id:
+                resume = self.parse_event_id(last_event_id)
+                if resume and resume[0] == epoch:
+                    last_id, strict = resume[1], True
+                else:
+                    epoch, last_id, message = reset()
+                    yield message
+            while time.monotonic() < deadline:
+                events = self.wait(epoch, last_id, self.heartbeat, strict)
+                if events is None:
+                    epoch, last_id, message = reset()
+                    yield message
+                    continue
+                if not events:
+                    yield ": ping\n\n"
+                    continue
+                for event_id, kind, data in events:
+                    last_id, strict = event_id, True
+                    yield f"id: {epoch}-{event_id}\nevent: {kind}\ndata: {json.dumps(data, default=str)}\n\n"
+
+        return stream()
+
+    # ------------------------------------
+    # LISTEN (backend postgres)
+    # ------------------------------------
+
+    def _ensure_listener(self):
+        with self._condition:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name="event-stream-listen", daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        import psycopg2
+
+        dsn = self._engine_url.set(drivername="postgresql").render_as_string(hide_password=False)
+        delay = 1
+        interrupted = False
+        while True:
+            try:
+                connection = psycopg2.connect(dsn)
+                connection.autocommit = True
+                connection.cursor().execute(f"LISTEN {CHANNEL}")
+                if interrupted:
+                    # Lo notificado mientras no escuchábamos se perdió
+                    self._restart()
+                    interrupted = False
+                delay = 1
+                while True:
+                    if select.select([connection], [], [], self.heartbeat) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        notification = connection.notifies.pop(0)
+                        message = json.loads(notification.payload)
+                        self._append(message["type"], message["data"])
+            except Exception as error:
+                interrupted = True
+                print(f"⚠️ LISTEN de notificaciones interrumpido: {error}. Reintentando en {delay}s")
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+
+    # ------------------------------------
+    # Tickets para EventSource (no permite enviar Authorization)
+    # ------------------------------------
+
+    TICKET_MAX_AGE = 60
+
+    def issue_ticket(self, secret_key, user_id):
+        return URLSafeTimedSerializer(secret_key, salt="event-stream").dumps({"user_id": user_id})
+
+    def verify_ticket(self, secret_key, ticket):
+        try:
+            data = URLSafeTimedSerializer(secret_key, salt="event-stream").loads(
+                ticket, max_age=self.TICKET_MAX_AGE
+            )
+        except (BadSignature, SignatureExpired):
+            raise StreamAuthError("Ticket de stream inválido o expirado")
+        return data["user_id"]
+
+
+# Instancia global del broker
+event_broker = EventBroker()
+
+
+# ====================================
+# CAPTURA DE CAMBIOS EN LA SESIÓN
+# ====================================
+
+def _snapshot(obj):
+    """Columnas de la fila como dict serializable (sin cargar relaciones)"""
+    data = {}
+    for attr in inspect(obj).mapper.column_attrs:
+        value = getattr(obj, attr.key)
+        data[attr.key] = value.isoformat() if isinstance(value, (date, datetime)) else value
+    return data
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    pending = session.info.setdefault("stream_events", [])
+    for objects, action in ((session.new, "created"), (session.dirty, "updated"), (session.deleted, "deleted")):
+        for obj in objects:
+            name = TRACKED_MODELS.get(type(obj))
+            if name is None or (action == "updated" and not session.is_modified(obj)):
+                continue
+            data = {"id": obj.id} if action == "deleted" else _snapshot(obj)
+            pending.append((f"{name}.{action}", data))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_changes(session):
+    events = session.info.pop("stream_events", None)
+    if events:
+        event_broker.publish(events)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("stream_events", None)
@@ -1,5 +1,7 @@
 import os
 from datetime import datetime
+from urllib.parse import quote
+from outbound import OutboundClient, CircuitOpenError, register_client
 
 
 class GoogleCalendarService:
@@ -13,16 +15,14 @@ class GoogleCalendarService:
         self.timezone = os.environ.get("GOOGLE_CALENDAR_TIMEZONE", "America/Santiago")
         self.credentials_file = os.environ.get("GOOGLE_CALENDAR_CREDENTIALS", "credentials.json")
         self.token_file = os.environ.get("GOOGLE_CALENDAR_TOKEN", "token.json")
+        self.api_host = os.environ.get("GOOGLE_CALENDAR_API_HOST", "https://www.googleapis.com")
+        self._client = None
 
-    def _build_service(self):
-        """Construye cliente de Calendar API usando token OAuth existente."""
-        if not self.enabled:
-            return None
-
+    def _load_credentials(self):
+        """Carga (y refresca si hace falta) el token OAuth existente."""
         try:
             from google.auth.transport.requests import Request
             from google.oauth2.credentials import Credentials
-            from googleapiclient.discovery import build
         except Exception as error:
             print(f"⚠️ Google Calendar libs no disponibles: {error}")
             return None
@@ -52,16 +52,32 @@ class GoogleCalendarService:
                 print(f"⚠️ No se pudo refrescar token de Google Calendar: {error}")
                 return None
 
-        try:
-            return build("calendar", "v3", credentials=creds, cache_discovery=False)
-        except Exception as error:
-            print(f"⚠️ No se pudo inicializar Google Calendar API: {error}")
+        return creds
+
+    def _get_client(self):
+        """Cliente HTTP keep-alive autenticado (se crea una vez y se reutiliza)."""
+        if not self.enabled:
+            return None
+        if self._client:
+            return self._client
+
+        creds = self._load_credentials()
+        if not creds:
             return None
 
+        # AuthorizedSession (requests) refresca el token solo ante un 401
+        from google.auth.transport.requests import AuthorizedSession
+        self._client = register_client(OutboundClient(
+            "google_calendar",
+            self.api_host,
+            session=AuthorizedSession(creds),
+        ))
+        return self._client
+
     def create_event(self, summary, description, start_dt, end_dt, location=""):
         """Crea evento en Google Calendar. No lanza excepción hacia rutas."""
-        service = self._build_service()
-        if not service:
+        client = self._get_client()
+        if not client:
             return {"ok": False, "reason": "calendar_not_configured"}
 
         if not isinstance(start_dt, datetime) or not isinstance(end_dt, datetime):
@@ -82,17 +98,27 @@ class GoogleCalendarService:
         }
 
         try:
-            created = service.events().insert(calendarId=self.calendar_id, body=body).execute()
+            response = client.request(
+                "POST",
+                f"/calendar/v3/calendars/{quote(self.calendar_id, safe='')}/events",
+                json=body,
+            )
+            if response.status_code not in (200, 201):
+                print(f"⚠️ Error creando evento en Google Calendar: HTTP {response.status_code}")
+                return {"ok": False, "reason": f"http_{response.status_code}"}
+            created = response.json()
             print(f"✅ Evento creado en Google Calendar: {created.get('id')}")
             return {
                 "ok": True,
                 "id": created.get("id"),
                 "htmlLink": created.get("htmlLink"),
             }
+        except CircuitOpenError as error:
+            print(f"⚠️ {error}")
+            return {"ok": False, "reason": "circuit_open"}
         except Exception as error:
             print(f"⚠️ Error creando evento en Google Calendar: {error}")
             return {"ok": False, "reason": str(error)}
 
 
 google_calendar_service = GoogleCalendarService()
-
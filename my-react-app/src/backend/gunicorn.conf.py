@@ -0,0 +1,29 @@
+"""
+Configuración de gunicorn: gunicorn -c gunicorn.conf.py wsgi:app
+
+GUNICORN_WORKER_CLASS elige el modo de servicio:
+- sync (por defecto): un request a la vez por worker
+- gthread: GUNICORN_THREADS requests concurrentes por worker
+- gevent: modo asíncrono; cada request es un greenlet y las esperas de red
+  (SendGrid, Google Calendar, PostgreSQL vía psycogreen) ceden el control,
+  así las llamadas lentas no bloquean las lecturas del catálogo
+  Los hilos de la app pasan a ser greenlets; el trabajo de CPU (Pillow en
+  media_service) se manda al threadpool nativo del hub
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ['PORT']}" if os.environ.get("PORT") else "127.0.0.1:8000"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+os.environ["WEB_CONCURRENCY"] = str(workers)  # lo leen los workers (p. ej. el caché en memoria)
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "sync")
+threads = int(os.getenv("GUNICORN_THREADS", "8")) if worker_class == "gthread" else 1
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "200"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+keepalive = 5
+
+
+def post_fork(server, worker):
+    """Con gevent, hace cooperativo también al driver de PostgreSQL"""
+    if worker_class == "gevent":
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
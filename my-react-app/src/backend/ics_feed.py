@@ -0,0 +1,220 @@
+"""
+Feeds iCalendar (.ics) firmados para suscribirse desde cualquier calendario
+
+Cada usuario obtiene una URL con token firmado (itsdangerous) para sus
+reservas y eventos; el admin además una URL con la agenda completa. El
+token incluye una huella del hash de la contraseña: cambiarla invalida las
+URLs entregadas. No expira (los clientes de calendario consultan la misma
+URL durante meses).
+
+El feed cubre de ICS_PAST_DAYS atrás a ICS_FUTURE_DAYS adelante, se arma
+con consultas por rango sobre columnas indexadas (event_date, user_id) y se
+envía en streaming, un VEVENT a la vez. El ETag sale del último updated_at
+de las reservas del rango, del cursor de change_log (altas, cambios y
+bajas de reservas y eventos) y de la versión del catálogo (los nombres de
+disfraces y paquetes van en el resumen): si nada cambió se responde 304
+sin generar el feed.
+
+Las horas van como hora local flotante (sin zona) y el calendario declara
+X-WR-TIMEZONE, igual que la sincronización con Google Calendar.
+"""
+import hashlib
+import os
+from datetime import date, datetime, timedelta
+from itsdangerous import URLSafeSerializer, BadSignature
+from sqlalchemy import func
+from models import db, User, Booking, Event, Costume, AnimationPackage, ChangeLog
+from quote_service import quote_service
+
+
+class FeedTokenError(ValueError):
+    """Token de feed inválido o revocado"""
+
+
+STATUS_MAP = {"pending": "TENTATIVE", "confirmed": "CONFIRMED", "completed": "CONFIRMED", "cancelled": "CANCELLED"}
+SCOPES = ("user", "all")
+
+
+class IcsFeedService:
+    """Firma URLs de feed y genera el .ics en streaming"""
+
+    DEFAULT_DURATION_HOURS = 2
+    CHUNK_SIZE = 200
+
+    def __init__(self):
+        self.past_days = int(os.environ.get("ICS_PAST_DAYS", "90"))
+        self.future_days = int(os.environ.get("ICS_FUTURE_DAYS", "365"))
+        self.max_age = int(os.environ.get("ICS_MAX_AGE", "300"))
+        self.timezone = os.environ.get("GOOGLE_CALENDAR_TIMEZONE", "America/Santiago")
+
+    # ------------------------------------
+    # Tokens
+    # ------------------------------------
+
+    @staticmethod
+    def _fingerprint(user):
+        return hashlib.sha256(user.password_hash.encode()).hexdigest()[:12]
+
+    def issue_token(self, secret_key, user, scope="user"):
+        payload = {"u": user.id, "s": scope, "k": self._fingerprint(user)}
+        return URLSafeSerializer(secret_key, salt="ics-feed").dumps(payload)
+
+    def verify_token(self, secret_key, token):
+        """Devuelve (usuario, scope) o lanza FeedTokenError"""
+        try:
+            payload = URLSafeSerializer(secret_key, salt="ics-feed").loads(token)
+        except BadSignature:
+            raise FeedTokenError("Feed no encontrado")
+        user = db.session.get(User, payload.get("u"))
+        scope = payload.get("s")
+        if user is None or scope not in SCOPES or payload.get("k") != self._fingerprint(user):
+            raise FeedTokenError("Feed no encontrado")
+        if scope == "all" and not user.is_admin:
+            raise FeedTokenError("Feed no encontrado")
+        return user, scope
+
+    # ------------------------------------
+    # Consultas
+    # ------------------------------------
+
+    def date_range(self):
+        today = date.today()
+        return today - timedelta(days=self.past_days), today + timedelta(days=self.future_days)
+
+    def _booking_filters(self, user, scope, start, end):
+        filters = [Booking.event_date >= start, Booking.event_date <= end]
+        if scope == "user":
+            filters.append(Booking.user_id == user.id)
+        return filters
+
+    def _event_filters(self, user, scope, start, end):
+        # Event.date es texto YYYY-MM-DD: la comparación lexicográfica respeta el orden
+        filters = [Event.date >= start.isoformat(), Event.date <= end.isoformat()]
+        if scope == "user":
+            filters.append(Event.user_id == user.id)
+        return filters
+
+    def etag(self, user, scope):
+        """ETag del feed: cambia con cualquier escritura que pueda afectarlo"""
+        start, end = self.date_range()
+        latest_booking = db.session.query(func.max(Booking.updated_at)).filter(
+            *self._booking_filters(user, scope, start, end)
+        ).scalar()
+        changes = db.session.query(func.max(ChangeLog.id))
+        if scope == "user":
+            changes = changes.filter(ChangeLog.user_id == user.id)
+        # El catálogo y el nombre del usuario también van en el cuerpo (SUMMARY, X-WR-CALNAME)
+        parts = [scope, user.id, user.name, start, latest_booking, changes.scalar(), quote_service.catalog_version()]
+        return hashlib.sha256("|".join(str(part) for part in parts).encode()).hexdigest()[:32]
+
+    # ------------------------------------
+    # Generación
+    # ------------------------------------
+
+    def stream(self, user, scope):
+        """Generador de líneas del .ics (requiere contexto de aplicación)"""
+        start, end = self.date_range()
+        name = "DiverKids - Agenda" if scope == "all" else f"DiverKids - {user.name}"
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+
+        yield self._lines(
+            "BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//DiverKids//Reservas//ES",
+            "CALSCALE:GREGORIAN", "METHOD:PUBLISH",
+            f"X-WR-CALNAME:{self._escape(name)}", f"X-WR-TIMEZONE:{self.timezone}",
+            f"REFRESH-INTERVAL;VALUE=DURATION:PT{max(self.max_age // 60, 1)}M",
+        )
+
+        bookings = db.session.query(
+            Booking.id, Booking.booking_type, Booking.event_date, Booking.event_time,
+            Booking.event_location, Booking.event_address, Booking.num_children, Booking.status,
+            Costume.name.label("costume_name"), AnimationPackage.name.label("package_name"),
+            AnimationPackage.duration_hours,
+        ).outerjoin(Costume, Booking.costume_id == Costume.id).outerjoin(
+            AnimationPackage, Booking.package_id == AnimationPackage.id
+        ).filter(*self._booking_filters(user, scope, start, end)).order_by(Booking.event_date, Booking.id)
+
+        for row in bookings.yield_per(self.CHUNK_SIZE):
+            yield self._booking_vevent(row, stamp)
+
+        events = db.session.query(
+            Event.id, Event.title, Event.date, Event.time, Event.location, Event.description, Event.status
+        ).filter(*self._event_filters(user, scope, start, end)).order_by(Event.date, Event.id)
+
+        for row in events.yield_per(self.CHUNK_SIZE):
+            vevent = self._event_vevent(row, stamp)
+            if vevent:
+                yield vevent
+
+        yield self._lines("END:VCALENDAR")
+
+    def _booking_vevent(self, row, stamp):
+        items = [item for item in (row.package_name, row.costume_name) if item]
+        summary = f"Reserva DiverKids: {' + '.join(items)}" if items else f"Reserva DiverKids #{row.id}"
+        location = ", ".join(part for part in (row.event_location, row.event_address) if part)
+        description = f"Niños: {row.num_children}" if row.num_children else ""
+        starts = self._start(row.event_date, row.event_time)
+        ends = starts + timedelta(hours=row.duration_hours or self.DEFAULT_DURATION_HOURS)
+        return self._vevent(f"booking-{row.id}", stamp, starts, ends, summary, location, description, row.status)
+
+    def _event_vevent(self, row, stamp):
+        try:
+            event_date = datetime.strptime(row.date, "%Y-%m-%d").date()
+        except (TypeError, ValueError):
+            return None
+        starts = self._start(event_date, row.time)
+        ends = starts + timedelta(hours=self.DEFAULT_DURATION_HOURS)
+        return self._vevent(f"event-{row.id}", stamp, starts, ends, row.title, row.location, row.description, row.status)
+
+    def _vevent(self, uid, stamp, starts, ends, summary, location, description, status):
+        lines = [
+            "BEGIN:VEVENT",
+            f"UID:{uid}@diverkids",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART:{starts.strftime('%Y%m%dT%H%M%S')}",
+            f"DTEND:{ends.strftime('%Y%m%dT%H%M%S')}",
+            f"SUMMARY:{self._escape(summary)}",
+            f"STATUS:{STATUS_MAP.get(status, 'TENTATIVE')}",
+        ]
+        if location:
+            lines.append(f"LOCATION:{self._escape(location)}")
+        if description:
+            lines.append(f"DESCRIPTION:{self._escape(description)}")
+        lines.append("END:VEVENT")
+        return self._lines(*lines)
+
+    @staticmethod
+    def _start(day, time_str):
+        try:
+            at = datetime.strptime(time_str, "%H:%M").time() if time_str else None
+        except ValueError:
+            at = None
+        return datetime.combine(day, at or datetime.strptime("12:00", "%H:%M").time())
+
+    @staticmethod
+    def _escape(value):
+        return (str(value).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+                .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+    @staticmethod
+    def _fold(line):
+        """Corta líneas de más de 75 octetos (RFC 5545) sin partir caracteres UTF-8"""
+        data = line.encode("utf-8")
+        if len(data) <= 75:
+            return line
+        parts, current, size = [], "", 0
+        for char in line:
+            width = len(char.encode("utf-8"))
+            if size + width > (75 if not parts else 74):
+                parts.append(current)
+                current, size = "", 0
+            current += char
+            size += width
+        parts.append(current)
+        return "\r\n ".join(parts)
+
+    def _lines(self, *lines):
+        return "".join(f"{self._fold(line)}\r\n" for line in lines)
+
+
+# Instancia global del servicio
+ics_feed = IcsFeedService()
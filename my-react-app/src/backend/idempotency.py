@@ -0,0 +1,202 @@
+"""
+Idempotency-Key para POST /api/bookings y POST /api/contact
+
+El primer request con una clave guarda (clave, hash del request) y, al
+terminar, la respuesta serializada. Los duplicados dentro del TTL reciben la
+misma respuesta sin volver a ejecutar el handler. Si llega un duplicado
+mientras el original sigue en curso, espera a que termine (en el mismo
+worker con un Event, entre workers sondeando la fila) en vez de competir.
+"""
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import request, jsonify, make_response, current_app
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+from sqlalchemy.exc import IntegrityError
+from models import db, IdempotencyKey
+
+
+class IdempotencyService:
+    """Guarda y reproduce respuestas por Idempotency-Key"""
+
+    HEADER = "Idempotency-Key"
+    MAX_KEY_LENGTH = 255
+    IN_FLIGHT_TIMEOUT = timedelta(seconds=60)  # request original probablemente caído
+    PURGE_BATCH_SIZE = 500
+
+    def __init__(self):
+        self.ttl = timedelta(hours=int(os.environ.get("IDEMPOTENCY_TTL_HOURS", "24")))
+        self.wait_timeout = float(os.environ.get("IDEMPOTENCY_WAIT_SECONDS", "10"))
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    def idempotent(self, name):
+        """Decorador: aplica Idempotency-Key si el cliente lo envía"""
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                key = request.headers.get(self.HEADER)
+                if not key:
+                    return fn(*args, **kwargs)
+                if len(key) > self.MAX_KEY_LENGTH:
+                    return jsonify({"msg": f"{self.HEADER} demasiado largo"}), 400
+
+                verify_jwt_in_request(optional=True)
+                scope = f"{name}:{get_jwt_identity() or 'anon'}"
+                request_hash = hashlib.sha256(
+                    request.method.encode() + request.path.encode() + b"\n" + request.get_data()
+                ).hexdigest()
+
+                record_id, early_response = self._begin(scope, key, request_hash)
+                if early_response is not None:
+                    return early_response
+
+                try:
+                    response = make_response(fn(*args, **kwargs))
+                except Exception:
+                    self._release(record_id, scope, key)
+                    raise
+                self._finish(record_id, scope, key, response)
+                return response
+            return wrapper
+        return decorator
+
+    # ------------------------------------
+    # Ciclo de vida de una clave
+    # ------------------------------------
+
+    def _begin(self, scope, key, request_hash):
+        """Reserva la clave o resuelve el duplicado. Devuelve (id, respuesta_temprana)"""
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            now = datetime.utcnow()
+            record = IdempotencyKey(
+                scope=scope, key=key, request_hash=request_hash,
+                locked_at=now, expires_at=now + self.ttl
+            )
+            db.session.add(record)
+            try:
+                db.session.commit()
+                with self._lock:
+                    self._in_flight[(scope, key)] = threading.Event()
+                return record.id, None
+            except IntegrityError:
+                db.session.rollback()
+
+            outcome = self._resolve_duplicate(scope, key, request_hash, deadline)
+            if outcome is not None:
+                return outcome
+
+    def _resolve_duplicate(self, scope, key, request_hash, deadline):
+        """Espera/reproduce un duplicado. None = la fila desapareció, reintentar reserva"""
+        delay = 0.05
+        while True:
+            existing = IdempotencyKey.query.filter_by(scope=scope, key=key) \
+                .execution_options(populate_existing=True).first()
+            if existing is None:
+                return None
+
+            now = datetime.utcnow()
+            if existing.request_hash != request_hash:
+                return None, (jsonify({"msg": f"{self.HEADER} ya fue usado con otra petición"}), 422)
+
+            if existing.expires_at < now:
+                IdempotencyKey.query.filter_by(id=existing.id).delete(synchronize_session=False)
+                db.session.commit()
+                return None
+
+            if existing.status == "completed":
+                return None, self._replay(existing)
+
+            # En curso: si el original quedó colgado, tomar la posta con un UPDATE condicional
+            if existing.locked_at < now - self.IN_FLIGHT_TIMEOUT:
+                taken = IdempotencyKey.query.filter_by(
+                    id=existing.id, status="in_progress", locked_at=existing.locked_at
+                ).update({"locked_at": now}, synchronize_session=False)
+                db.session.commit()
+                if taken:
+                    with self._lock:
+                        self._in_flight[(scope, key)] = threading.Event()
+                    return existing.id, None
+                continue
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                response = jsonify({"msg": "La petición original sigue en proceso, reintenta en unos segundos"})
+                response.status_code = 409
+                response.headers["Retry-After"] = "1"
+                return None, response
+
+            db.session.commit()  # cerrar la transacción de lectura mientras se espera
+            with self._lock:
+                event = self._in_flight.get((scope, key))
+            if event:
+                event.wait(remaining)
+            else:
+                time.sleep(min(delay, remaining))
+                delay = min(delay * 2, 0.5)
+
+    def _finish(self, record_id, scope, key, response):
+        """Guarda la respuesta (o libera la clave si fue un error del servidor)"""
+        try:
+            if response.status_code >= 500:
+                IdempotencyKey.query.filter_by(id=record_id).delete(synchronize_session=False)
+            else:
+                IdempotencyKey.query.filter_by(id=record_id).update({
+                    "status": "completed",
+                    "response_status": response.status_code,
+                    "response_body": response.get_data(as_text=True),
+                }, synchronize_session=False)
+            db.session.commit()
+        finally:
+            self._notify(scope, key)
+
+    def _release(self, record_id, scope, key):
+        try:
+            db.session.rollback()
+            IdempotencyKey.query.filter_by(id=record_id).delete(synchronize_session=False)
+            db.session.commit()
+        finally:
+            self._notify(scope, key)
+
+    def _notify(self, scope, key):
+        with self._lock:
+            event = self._in_flight.pop((scope, key), None)
+        if event:
+            event.set()
+
+    @staticmethod
+    def _replay(record):
+        response = current_app.response_class(
+            record.response_body, status=record.response_status, mimetype="application/json"
+        )
+        response.headers["Idempotent-Replayed"] = "true"
+        return response
+
+    # ------------------------------------
+    # Limpieza (trabajo periódico)
+    # ------------------------------------
+
+    def purge_expired(self, batch_size=None, max_batches=20):
+        """Elimina claves expiradas en lotes acotados. Devuelve cuántas borró"""
+        batch_size = batch_size or self.PURGE_BATCH_SIZE
+        deleted = 0
+        for _ in range(max_batches):
+            ids = [row.id for row in db.session.query(IdempotencyKey.id).filter(
+                IdempotencyKey.expires_at < datetime.utcnow()
+            ).limit(batch_size)]
+            if not ids:
+                break
+            IdempotencyKey.query.filter(IdempotencyKey.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+            deleted += len(ids)
+            if len(ids) < batch_size:
+                break
+        return deleted
+
+
+# Instancia global del servicio
+idempotency_service = IdempotencyService()
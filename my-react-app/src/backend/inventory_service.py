@@ -0,0 +1,140 @@
+"""
+Reserva de stock de disfraces por fecha de evento
+
+Cada reserva activa (no cancelada) con disfraz ocupa una unidad del disfraz
+en su event_date. costume_stock_day lleva el contador por (disfraz, día) y
+se reserva con un solo UPDATE condicional:
+
+    UPDATE costume_stock_day SET reserved = reserved + 1
+    WHERE costume_id = :id AND day = :day
+      AND reserved < (SELECT stock_quantity FROM costume WHERE id = :id)
+
+Sin SELECT previo ni locks explícitos: la base de datos evalúa la condición
+y el incremento de forma atómica, así dos checkouts simultáneos nunca
+reservan la última unidad dos veces. Si no quedan unidades el UPDATE no
+afecta filas y la reserva responde 409. La fila del día se crea con
+INSERT ... ON CONFLICT DO NOTHING.
+
+Las reservas se hacen en la misma transacción que la escritura de la
+reserva, justo antes del commit. Eliminar o cancelar libera la unidad;
+cambiar la fecha o reactivar una cancelada vuelve a reservar.
+"""
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import db, Booking, Costume, CostumeStockDay
+from metrics import metrics
+
+
+class StockError(ValueError):
+    """No quedan unidades del disfraz para la fecha"""
+
+
+class CostumeInventory:
+    """Reserva y libera unidades de disfraz por día"""
+
+    @staticmethod
+    def hold(booking):
+        """(costume_id, día) que ocupa la reserva, o None si no ocupa stock"""
+        if not booking.costume_id or not booking.event_date or booking.status == "cancelled":
+            return None
+        return booking.costume_id, booking.event_date
+
+    def _ensure_row(self, costume_id, day):
+        insert = pg_insert if db.engine.dialect.name == "postgresql" else sqlite_insert
+        db.session.execute(
+            insert(CostumeStockDay.__table__)
+            .values(costume_id=costume_id, day=day, reserved=0)
+            .on_conflict_do_nothing(index_elements=["costume_id", "day"])
+        )
+
+    def reserve(self, costume_id, day):
+        """Toma una unidad o lanza StockError. No hace commit"""
+        self._ensure_row(costume_id, day)
+        table = CostumeStockDay.__table__
+        stock = select(Costume.stock_quantity).where(Costume.id == costume_id).scalar_subquery()
+        result = db.session.execute(
+            update(table)
+            .where(table.c.costume_id == costume_id, table.c.day == day, table.c.reserved < stock)
+            .values(reserved=table.c.reserved + 1)
+        )
+        if result.rowcount != 1:
+            metrics.incr("stock.rejected")
+            raise StockError(f"No quedan unidades de este disfraz para el {day.isoformat()}")
+        metrics.incr("stock.reserved")
+
+    def release(self, costume_id, day):
+        """Devuelve una unidad (nunca baja de 0). No hace commit"""
+        table = CostumeStockDay.__table__
+        db.session.execute(
+            update(table)
+            .where(table.c.costume_id == costume_id, table.c.day == day, table.c.reserved > 0)
+            .values(reserved=table.c.reserved - 1)
+        )
+        metrics.incr("stock.released")
+
+    def transition(self, before, after):
+        """Aplica el cambio de hold de una reserva actualizada (fecha, disfraz o estado)"""
+        if before == after:
+            return
+        if before:
+            self.release(*before)
+        if after:
+            self.reserve(*after)
+
+    def available(self, costume_id, day):
+        """Unidades libres de un disfraz en un día"""
+        reserved = db.session.query(CostumeStockDay.reserved).filter_by(costume_id=costume_id, day=day).scalar()
+        stock = db.session.query(Costume.stock_quantity).filter_by(id=costume_id).scalar()
+        return max((stock or 0) - (reserved or 0), 0)
+
+    # ------------------------------------
+    # Reconciliación (trabajo periódico o manual)
+    # ------------------------------------
+
+    def reconcile(self):
+        """
+        Recalcula los contadores desde las reservas activas. Devuelve filas corregidas.
+
+        Cada día se corrige en su propia transacción: primero se bloquea la
+        fila del contador (FOR UPDATE) y recién después se cuentan las
+        reservas. Un checkout en curso ya tiene la fila tomada, así que el
+        recuento espera a que confirme y la incluye; contar antes de
+        bloquear (READ COMMITTED) pisaría esa reserva y liberaría una unidad
+        ocupada
+        """
+        active = db.session.query(Booking.costume_id, Booking.event_date).filter(
+            Booking.costume_id.isnot(None), Booking.status != "cancelled"
+        ).distinct().all()
+        for costume_id, day in active:
+            self._ensure_row(costume_id, day)
+        db.session.commit()
+
+        table = CostumeStockDay.__table__
+        counted = select(func.count(Booking.id)).where(
+            Booking.costume_id == table.c.costume_id,
+            Booking.event_date == table.c.day,
+            Booking.status != "cancelled",
+        ).scalar_subquery()
+        # Candidatos sin bloquear; cada uno se vuelve a contar con la fila tomada
+        candidates = db.session.execute(
+            select(table.c.costume_id, table.c.day).where(table.c.reserved != counted)
+        ).all()
+        db.session.commit()
+
+        fixed = 0
+        for costume_id, day in candidates:
+            row = (table.c.costume_id == costume_id, table.c.day == day)
+            reserved = db.session.execute(select(table.c.reserved).where(*row).with_for_update()).scalar()
+            actual = db.session.query(func.count(Booking.id)).filter(
+                Booking.costume_id == costume_id, Booking.event_date == day, Booking.status != "cancelled"
+            ).scalar()
+            if reserved != actual:
+                db.session.execute(update(table).where(*row).values(reserved=actual))
+                fixed += 1
+            db.session.commit()
+        return fixed
+
+
+# Instancia global del servicio
+costume_inventory = CostumeInventory()
@@ -0,0 +1,208 @@
+"""
+Trabajos periódicos en segundo plano (compactación, limpiezas, etc.)
+
+Cada trabajo se registra con @jobs.register(nombre, intervalo) y se ejecuta
+dentro del contexto de la app en un hilo daemon. Con gunicorn cada worker
+corre su propio hilo, pero la tabla job_lease guarda la próxima ejecución
+de cada trabajo y solo el worker que la reclama (UPDATE condicional) lo
+corre: una vez por intervalo en total, no una por worker. Nada corre al
+arrancar: la primera ejecución es un intervalo después de registrarse y
+los reinicios respetan la fecha guardada.
+
+Ejecución manual: python jobs.py <nombre>
+"""
+import os
+import socket
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import db, JobLease, PasswordReset, ScheduledJob
+from metrics import metrics
+from scheduler_service import reminder_scheduler
+from idempotency import idempotency_service
+from analytics_service import booking_analytics
+from media_service import media_service
+from change_feed import change_feed
+from inventory_service import costume_inventory
+from archive_service import archive_service
+
+
+class JobRunner:
+    """Registro y planificador simple de trabajos periódicos"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._thread = None
+        self._stop = threading.Event()
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+
+    def register(self, name, interval_seconds):
+        """Decorador para registrar un trabajo periódico"""
+        def decorator(fn):
+            self._jobs[name] = {"fn": fn, "interval": interval_seconds}
+            return fn
+        return decorator
+
+    @property
+    def names(self):
+        return list(self._jobs)
+
+    def run(self, app, name):
+        """Ejecuta un trabajo una vez dentro del contexto de la app"""
+        with app.app_context():
+            try:
+                return self._jobs[name]["fn"]()
+            except Exception as error:
+                print(f"⚠️ Error en trabajo '{name}': {error}")
+                db.session.rollback()
+                return None
+            finally:
+                db.session.remove()
+
+    def start(self, app):
+        """Inicia el hilo planificador (una vez por proceso)"""
+        if self._thread or not self._jobs:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(app,), name="diverkids-jobs", daemon=True)
+        self._thread.start()
+        print(f"✅ Trabajos en segundo plano: {', '.join(self._jobs)}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    def claim(self, app, name):
+        """
+        Reclama la ejecución vencida de `name` para este worker. Devuelve
+        (reclamado, segundos hasta la próxima ejecución)
+        """
+        interval = self._jobs[name]["interval"]
+        with app.app_context():
+            try:
+                now = datetime.utcnow()
+                insert = pg_insert if db.engine.dialect.name == "postgresql" else sqlite_insert
+                db.session.execute(
+                    insert(JobLease.__table__)
+                    .values(name=name, next_run_at=now + timedelta(seconds=interval))
+                    .on_conflict_do_nothing(index_elements=["name"])
+                )
+                claimed = JobLease.query.filter(JobLease.name == name, JobLease.next_run_at <= now).update({
+                    "next_run_at": now + timedelta(seconds=interval),
+                    "locked_by": self.worker_id,
+                }, synchronize_session=False)
+                next_run_at = db.session.query(JobLease.next_run_at).filter_by(name=name).scalar()
+                db.session.commit()
+                return claimed == 1, max((next_run_at - now).total_seconds(), 0)
+            except Exception as error:
+                print(f"⚠️ No se pudo reclamar el trabajo '{name}': {error}")
+                db.session.rollback()
+                return False, min(interval, 60)
+            finally:
+                db.session.remove()
+
+    def _loop(self, app):
+        next_run = {name: 0 for name in self._jobs}
+        while not self._stop.is_set():
+            for name in self._jobs:
+                if time.monotonic() >= next_run[name]:
+                    claimed, wait = self.claim(app, name)
+                    if claimed:
+                        self.run(app, name)
+                    next_run[name] = time.monotonic() + wait
+            self._stop.wait(1)
+
+
+# Instancia global del planificador
+jobs = JobRunner()
+
+
+@jobs.register("compact_password_resets", interval_seconds=int(os.getenv("PASSWORD_RESET_COMPACT_INTERVAL", "900")))
+def compact_password_resets():
+    """Elimina tokens de recuperación expirados o usados en lotes acotados"""
+    deleted = PasswordReset.compact()
+    metrics.incr("password_reset.compacted_rows", deleted)
+    if deleted:
+        print(f"🧹 Tokens de recuperación eliminados: {deleted}")
+    return deleted
+
+
+@jobs.register("run_scheduled_jobs", interval_seconds=int(os.getenv("SCHEDULER_POLL_INTERVAL", "30")))
+def run_scheduled_jobs():
+    """Ejecuta recordatorios/avisos de reservas cuyo run_at ya venció"""
+    processed = reminder_scheduler.run_due()
+    metrics.incr("scheduled_jobs.processed", processed)
+    return processed
+
+
+@jobs.register("purge_idempotency_keys", interval_seconds=int(os.getenv("IDEMPOTENCY_PURGE_INTERVAL", "3600")))
+def purge_idempotency_keys():
+    """Elimina Idempotency-Keys expiradas en lotes acotados"""
+    deleted = idempotency_service.purge_expired()
+    metrics.incr("idempotency_keys.purged_rows", deleted)
+    return deleted
+
+
+@jobs.register("backfill_booking_rollups", interval_seconds=int(os.getenv("ANALYTICS_BACKFILL_INTERVAL", "86400")))
+def backfill_booking_rollups():
+    """Recalcula los rollups diarios de reservas desde el corte de archivo (idempotente)"""
+    written = booking_analytics.backfill()
+    metrics.incr("analytics.rollup_rows_written", written)
+    print(f"📊 Rollups de reservas recalculados: {written} filas")
+    return written
+
+
+@jobs.register("process_pending_media", interval_seconds=int(os.getenv("MEDIA_RECOVERY_INTERVAL", "300")))
+def process_pending_media():
+    """Reencola imágenes cuyo procesamiento quedó pendiente o se interrumpió"""
+    return media_service.enqueue_pending()
+
+
+@jobs.register("purge_change_log", interval_seconds=int(os.getenv("CHANGES_PURGE_INTERVAL", "3600")))
+def purge_change_log():
+    """Elimina cambios más viejos que CHANGES_RETENTION_DAYS en lotes acotados"""
+    deleted = change_feed.purge_expired()
+    metrics.incr("change_log.purged_rows", deleted)
+    return deleted
+
+
+@jobs.register("reconcile_costume_stock", interval_seconds=int(os.getenv("STOCK_RECONCILE_INTERVAL", "86400")))
+def reconcile_costume_stock():
+    """Recalcula las unidades reservadas por disfraz y día desde las reservas activas"""
+    fixed = costume_inventory.reconcile()
+    metrics.incr("stock.reconciled_rows", fixed)
+    if fixed:
+        print(f"📦 Stock de disfraces corregido en {fixed} días")
+    return fixed
+
+
+@jobs.register("archive_cold_rows", interval_seconds=int(os.getenv("ARCHIVE_INTERVAL", "86400")))
+def archive_cold_rows():
+    """Mueve reservas, eventos y mensajes fríos a las tablas de archivo"""
+    moved = archive_service.archive_all()
+    for table, count in moved.items():
+        metrics.incr(f"archive.{table}_rows", count)
+    return sum(moved.values())
+
+
+metrics.register_gauge("password_reset.rows", lambda: PasswordReset.query.count())
+metrics.register_gauge(
+    "scheduled_jobs.pending",
+    lambda: ScheduledJob.query.filter_by(status="pending").count()
+)
+
+
+if __name__ == "__main__":
+    from app import create_app
+
+    if len(sys.argv) != 2 or sys.argv[1] not in jobs.names:
+        print(f"Uso: python jobs.py <{'|'.join(jobs.names)}>")
+        sys.exit(1)
+
+    os.environ["BACKGROUND_JOBS_ENABLED"] = "false"
+    print(jobs.run(create_app(), sys.argv[1]))
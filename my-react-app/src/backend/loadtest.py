@@ -0,0 +1,165 @@
+"""
+Pruebas de carga contra un servidor ya corriendo
+
+Escenario "outbound" (por defecto): lecturas del catálogo mientras hay
+llamadas salientes lentas.
+
+Levanta un SendGrid falso que tarda --stub-delay segundos en responder y,
+en paralelo, dispara --slow POST /api/contact (que notifican por SendGrid)
+y --reads GET /api/costumes contra un servidor ya corriendo. Reporta las
+latencias de cada grupo para comparar modos de servicio.
+
+Ejemplo (dos terminales, servidor con el SendGrid falso y sin rate limit):
+
+    SENDGRID_API_KEY=test SENDGRID_FROM_EMAIL=a@b.c SENDGRID_API_HOST=http://127.0.0.1:8025 \\
+    RATE_LIMIT_ENABLED=false OUTBOUND_ASYNC=false GUNICORN_WORKER_CLASS=sync \\
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+    python loadtest.py --url http://127.0.0.1:8000
+
+Repetir con GUNICORN_WORKER_CLASS=gevent y/o OUTBOUND_ASYNC=true.
+
+Escenario "stock": --bookings POST /api/bookings concurrentes por el mismo
+disfraz y fecha. Verifica que las reservas aceptadas no superen el
+stock_quantity del disfraz (sin sobreventa) y que el resto responda 409:
+
+    python loadtest.py --scenario stock --email ana@example.com --password ... \
+        --costume-id 1 --date 2031-01-01 --bookings 200
+"""
+import argparse
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+
+
+def start_stub(port, delay):
+    """SendGrid falso: acepta cualquier POST después de `delay` segundos"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(delay)
+            self.send_response(202)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def timed(session, method, url, **kwargs):
+    start = time.perf_counter()
+    try:
+        response = session.request(method, url, timeout=120, **kwargs)
+        ok = response.status_code < 400
+    except requests.RequestException:
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def summary(label, results):
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, ok in results if not ok)
+    if not latencies:
+        return f"{label}: sin requests"
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return (
+        f"{label}: n={len(latencies)} errores={errors} "
+        f"p50={statistics.median(latencies) * 1000:.0f}ms p95={p95 * 1000:.0f}ms "
+        f"max={latencies[-1] * 1000:.0f}ms"
+    )
+
+
+def run_outbound(args):
+    if not args.no_stub:
+        start_stub(args.stub_port, args.stub_delay)
+        print(f"📨 SendGrid falso en http://127.0.0.1:{args.stub_port} (demora {args.stub_delay}s)")
+
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency + args.slow))
+    contact = {"name": "Carga", "email": "carga@example.com", "message": "Prueba de carga"}
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency + args.slow) as pool:
+        slow = [pool.submit(timed, session, "POST", f"{args.url}/api/contact", json=contact)
+                for _ in range(args.slow)]
+        time.sleep(0.2)  # que las llamadas lentas ocupen los workers primero
+        reads = [pool.submit(timed, session, "GET", f"{args.url}/api/costumes")
+                 for _ in range(args.reads)]
+        slow_results = [future.result() for future in slow]
+        read_results = [future.result() for future in reads]
+    elapsed = time.perf_counter() - started
+
+    print(summary("POST /api/contact", slow_results))
+    print(summary("GET /api/costumes", read_results))
+    print(f"⏱️ Total: {elapsed:.1f}s, {(args.slow + args.reads) / elapsed:.0f} req/s")
+    return 0
+
+
+def run_stock(args):
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency))
+    login = session.post(f"{args.url}/api/login", json={"email": args.email, "password": args.password}, timeout=30)
+    login.raise_for_status()
+    headers = {"Authorization": f"Bearer {login.json()['token']}"}
+    stock = session.get(f"{args.url}/api/costumes/{args.costume_id}", timeout=30).json()["stock_quantity"]
+    body = {"booking_type": "costume", "costume_id": args.costume_id, "event_date": args.date}
+
+    def book():
+        start = time.perf_counter()
+        try:
+            status = session.post(f"{args.url}/api/bookings", json=body, headers=headers, timeout=120).status_code
+        except requests.RequestException:
+            status = None
+        return time.perf_counter() - start, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda _: book(), range(args.bookings)))
+    elapsed = time.perf_counter() - started
+
+    statuses = Counter(status for _, status in results)
+    print(summary("POST /api/bookings", [(latency, status in (201, 409)) for latency, status in results]))
+    print(f"📦 stock={stock} aceptadas={statuses[201]} sin stock (409)={statuses[409]} "
+          f"otros={ {key: value for key, value in statuses.items() if key not in (201, 409)} }")
+    print(f"⏱️ Total: {elapsed:.1f}s, {args.bookings / elapsed:.0f} req/s")
+    if statuses[201] > stock:
+        print("❌ Sobreventa: se aceptaron más reservas que unidades")
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=("outbound", "stock"), default="outbound")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--slow", type=int, default=20, help="POST /api/contact concurrentes")
+    parser.add_argument("--reads", type=int, default=200, help="GET /api/costumes")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--stub-port", type=int, default=8025)
+    parser.add_argument("--stub-delay", type=float, default=2.0)
+    parser.add_argument("--no-stub", action="store_true", help="no levantar el SendGrid falso")
+    parser.add_argument("--email", help="usuario para el escenario stock")
+    parser.add_argument("--password")
+    parser.add_argument("--costume-id", type=int, default=1)
+    parser.add_argument("--date", default="2031-01-01", help="fecha del evento (YYYY-MM-DD)")
+    parser.add_argument("--bookings", type=int, default=200, help="POST /api/bookings concurrentes")
+    args = parser.parse_args()
+
+    if args.scenario == "stock":
+        if not args.email or not args.password:
+            parser.error("el escenario stock requiere --email y --password")
+        sys.exit(run_stock(args))
+    sys.exit(run_outbound(args))
+
+
+if __name__ == "__main__":
+    main()
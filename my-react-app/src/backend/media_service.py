@@ -0,0 +1,284 @@
+"""
+Subida de imágenes del catálogo con almacenamiento direccionado por contenido
+
+El original se guarda como originals/<sha[:2]>/<sha> y las variantes WebP
+(thumb, card, full) como variants/<sha>/<variante>.webp. Subir dos veces la
+misma imagen reutiliza el mismo MediaAsset sin volver a procesarla. Las
+variantes se generan en un pool de hilos en segundo plano (Pillow libera el
+GIL al redimensionar y codificar) y, al terminar, sus URLs se escriben en los
+disfraces/paquetes que apuntan al asset.
+
+Con workers gevent, threading está parcheado y los hilos del pool son
+greenlets: un resize de Pillow bloquearía el hub y con él todas las
+requests del worker. En ese caso solo el trabajo de Pillow (sin base de
+datos) corre en el threadpool nativo del hub, en hilos reales del sistema.
+
+Como el nombre de cada archivo depende de su hash, el contenido de una URL
+nunca cambia y se sirve con Cache-Control immutable.
+
+MEDIA_ROOT debe estar en un disco persistente (en Render, el disco montado
+en /var/data). Si aun así faltan los archivos de un asset, volver a subir
+la misma imagen reescribe el original y regenera las variantes.
+
+Pillow es opcional: sin él, la subida responde 503 y el resto de la API
+sigue funcionando.
+"""
+import hashlib
+import os
+import re
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from models import db, MediaAsset, Costume, AnimationPackage
+from cache import data_cache
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - dependencia opcional
+    Image = None
+
+
+def _green_threads():
+    """True si gevent parcheó threading (los hilos del pool son greenlets)"""
+    monkey = sys.modules.get("gevent.monkey")
+    return bool(monkey and monkey.is_module_patched("threading"))
+
+
+class MediaError(ValueError):
+    """Archivo de imagen inválido"""
+
+
+SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+ALLOWED_FORMATS = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp", "GIF": "image/gif"}
+
+
+class MediaService:
+    """Guarda originales por hash y genera/sirve sus variantes WebP"""
+
+    VARIANTS = {"thumb": 160, "card": 480, "full": 1600}  # lado mayor en píxeles
+    CACHE_SECONDS = 365 * 24 * 3600
+    STALE_AFTER = timedelta(minutes=10)  # asset "processing" sin terminar se considera interrumpido
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self):
+        default_root = os.path.join(os.path.abspath(os.path.dirname(__file__)), "instance", "media")
+        self.root = os.environ.get("MEDIA_ROOT", default_root)
+        self.base_url = os.environ.get("MEDIA_BASE_URL", "").rstrip("/")
+        self.max_bytes = int(os.environ.get("MEDIA_MAX_BYTES", str(10 * 1024 * 1024)))
+        self.max_pixels = int(os.environ.get("MEDIA_MAX_PIXELS", str(40_000_000)))
+        self.quality = int(os.environ.get("MEDIA_WEBP_QUALITY", "80"))
+        self._pool = ThreadPoolExecutor(
+            max_workers=int(os.environ.get("MEDIA_WORKERS", "2")), thread_name_prefix="media"
+        )
+
+    @property
+    def available(self):
+        return Image is not None
+
+    # ------------------------------------
+    # Rutas y URLs
+    # ------------------------------------
+
+    def original_path(self, sha256):
+        return os.path.join(self.root, "originals", sha256[:2], sha256)
+
+    def variant_dir(self, sha256):
+        return os.path.join(self.root, "variants", sha256)
+
+    def variant_url(self, sha256, name):
+        return f"{self.base_url}/api/media/{sha256}/{name}.webp"
+
+    def is_valid_variant(self, sha256, name):
+        return bool(SHA256_PATTERN.match(sha256)) and name in self.VARIANTS
+
+    # ------------------------------------
+    # Subida
+    # ------------------------------------
+
+    def store_upload(self, file_storage, created_by=None):
+        """Guarda el archivo subido. Devuelve (asset, creado); un duplicado no se vuelve a procesar"""
+        if file_storage is None or not file_storage.filename:
+            raise MediaError("Falta el archivo 'file'")
+
+        tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            digest, size = hashlib.sha256(), 0
+            with os.fdopen(fd, "wb") as tmp:
+                while True:
+                    chunk = file_storage.stream.read(self.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise MediaError(f"La imagen supera el máximo de {self.max_bytes // (1024 * 1024)} MB")
+                    digest.update(chunk)
+                    tmp.write(chunk)
+            sha256 = digest.hexdigest()
+
+            existing = MediaAsset.query.filter_by(sha256=sha256).first()
+            if existing:
+                if not self._files_missing(existing):
+                    return existing, False
+                # Archivos perdidos (disco efímero, restauración parcial): reescribir y regenerar
+                self._inspect(tmp_path)
+                self._save_original(tmp_path, sha256)
+                existing.status = "pending"
+                db.session.commit()
+                print(f"⚠️ Archivos de la imagen {existing.id} ausentes: original reescrito, variantes en cola")
+                return existing, False
+
+            content_type, width, height = self._inspect(tmp_path)
+            self._save_original(tmp_path, sha256)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+        asset = MediaAsset(
+            sha256=sha256, content_type=content_type, size_bytes=size,
+            width=width, height=height, created_by=created_by
+        )
+        db.session.add(asset)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Otro request subió la misma imagen al mismo tiempo
+            db.session.rollback()
+            return MediaAsset.query.filter_by(sha256=sha256).first(), False
+        return asset, True
+
+    def _save_original(self, tmp_path, sha256):
+        path = self.original_path(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+
+    def _files_missing(self, asset):
+        """¿Falta el original o (si está lista) alguna variante?"""
+        if not os.path.exists(self.original_path(asset.sha256)):
+            return True
+        return asset.status == "ready" and any(
+            not os.path.exists(os.path.join(self.variant_dir(asset.sha256), f"{name}.webp"))
+            for name in self.VARIANTS
+        )
+
+    def _inspect(self, path):
+        """Valida que el archivo sea una imagen soportada. Devuelve (content_type, ancho, alto)"""
+        try:
+            with Image.open(path) as image:
+                image_format, width, height = image.format, image.width, image.height
+                image.verify()
+        except Exception:
+            raise MediaError("El archivo no es una imagen válida")
+        if image_format not in ALLOWED_FORMATS:
+            raise MediaError(f"Formato no soportado. Permitidos: {', '.join(ALLOWED_FORMATS)}")
+        if width * height > self.max_pixels:
+            raise MediaError("La imagen tiene demasiados píxeles")
+        return ALLOWED_FORMATS[image_format], width, height
+
+    def attach(self, asset, costume=None, package=None):
+        """Asocia el asset a un disfraz/paquete. No hace commit"""
+        for row in (costume, package):
+            if row is None:
+                continue
+            row.image_asset_id = asset.id
+            if asset.status == "ready":
+                row.image_url = asset.variants["full"]
+                row.image_variants = asset.variants
+
+    # ------------------------------------
+    # Procesamiento en segundo plano
+    # ------------------------------------
+
+    def enqueue(self, asset_id, retry_failed=False):
+        """Reclama el asset (UPDATE condicional) y lo procesa en el pool. False si ya estaba tomado"""
+        stale = datetime.utcnow() - self.STALE_AFTER
+        claimable = ("pending", "failed") if retry_failed else ("pending",)
+        claimed = MediaAsset.query.filter(
+            MediaAsset.id == asset_id,
+            db.or_(
+                MediaAsset.status.in_(claimable),
+                db.and_(MediaAsset.status == "processing", MediaAsset.updated_at < stale)
+            )
+        ).update({"status": "processing", "last_error": None, "updated_at": datetime.utcnow()},
+                 synchronize_session=False)
+        db.session.commit()
+        if not claimed:
+            return False
+        app = current_app._get_current_object()
+        self._pool.submit(self._process_in_context, app, asset_id)
+        return True
+
+    def enqueue_pending(self):
+        """Reencola assets pendientes o interrumpidos (p. ej. tras un reinicio). Devuelve cuántos"""
+        stale = datetime.utcnow() - self.STALE_AFTER
+        ids = [row.id for row in db.session.query(MediaAsset.id).filter(db.or_(
+            MediaAsset.status == "pending",
+            db.and_(MediaAsset.status == "processing", MediaAsset.updated_at < stale)
+        ))]
+        return sum(1 for asset_id in ids if self.enqueue(asset_id))
+
+    def _process_in_context(self, app, asset_id):
+        with app.app_context():
+            try:
+                self.process(asset_id)
+            except Exception as error:
+                print(f"❌ Error procesando imagen {asset_id}: {error}")
+                db.session.rollback()
+                MediaAsset.query.filter_by(id=asset_id).update(
+                    {"status": "failed", "last_error": str(error)}, synchronize_session=False
+                )
+                db.session.commit()
+            finally:
+                db.session.remove()
+
+    def process(self, asset_id):
+        """Genera las variantes WebP y publica sus URLs en el catálogo"""
+        asset = db.session.get(MediaAsset, asset_id)
+        if _green_threads():
+            import gevent
+            gevent.get_hub().threadpool.apply(self._render_variants, (asset.sha256,))
+        else:
+            self._render_variants(asset.sha256)
+
+        variants = {name: self.variant_url(asset.sha256, name) for name in self.VARIANTS}
+        asset.status = "ready"
+        asset.variants = variants
+        asset.last_error = None
+        for model in (Costume, AnimationPackage):
+            model.query.filter_by(image_asset_id=asset.id).update(
+                {"image_url": variants["full"], "image_variants": variants}, synchronize_session=False
+            )
+        db.session.commit()
+        data_cache.invalidate("catalog")
+        print(f"🖼️ Variantes generadas para imagen {asset.id} ({asset.sha256[:12]})")
+
+    def _render_variants(self, sha256):
+        """Escribe las variantes WebP del original (solo Pillow y archivos, sin base de datos)"""
+        target_dir = self.variant_dir(sha256)
+        os.makedirs(target_dir, exist_ok=True)
+
+        with Image.open(self.original_path(sha256)) as original:
+            original.seek(0)  # GIF animado: primer cuadro
+            image = ImageOps.exif_transpose(original)
+            has_alpha = image.mode in ("RGBA", "LA") or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+
+            for name, max_side in self.VARIANTS.items():
+                variant = image.copy()
+                variant.thumbnail((max_side, max_side), Image.LANCZOS)
+                fd, tmp_path = tempfile.mkstemp(dir=target_dir, suffix=".tmp")
+                os.close(fd)
+                try:
+                    variant.save(tmp_path, "WEBP", quality=self.quality, method=4)
+                    os.replace(tmp_path, os.path.join(target_dir, f"{name}.webp"))
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.unlink(tmp_path)
+
+
+# Instancia global del servicio
+media_service = MediaService()
@@ -0,0 +1,42 @@
+"""
+Métricas simples en memoria (contadores y gauges) expuestas en /api/metrics
+"""
+import threading
+
+
+class Metrics:
+    """Registro de contadores, gauges y gauges calculados al consultar"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._collectors = {}
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def register_gauge(self, name, fn):
+        """Registra un gauge que se calcula al pedir el snapshot"""
+        self._collectors[name] = fn
+
+    def snapshot(self):
+        """Devuelve todas las métricas (los collectors corren en el contexto actual)"""
+        with self._lock:
+            data = {"counters": dict(self._counters), "gauges": dict(self._gauges)}
+        for name, fn in self._collectors.items():
+            try:
+                data["gauges"][name] = fn()
+            except Exception as error:
+                print(f"⚠️ No se pudo calcular métrica '{name}': {error}")
+                data["gauges"][name] = None
+        return data
+
+
+# Instancia global de métricas
+metrics = Metrics()
@@ -0,0 +1,275 @@
+"""
+Migración: lleva una base existente al esquema actual de models.py
+
+db.create_all() crea las tablas nuevas pero nunca modifica las que ya
+existen. Este script compara la base con los modelos y aplica lo que falta:
+
+- columnas nuevas en tablas existentes (imágenes del catálogo)
+- FKs con ON DELETE CASCADE / SET NULL (borrar un usuario borra sus
+  reservas, eventos y tokens en la base). PostgreSQL las reemplaza con
+  ALTER TABLE; SQLite no puede alterar FKs y reconstruye la tabla
+- SQLite: AUTOINCREMENT en las tablas que se archivan (reservas, eventos,
+  mensajes), reconstruyendo la tabla y arrancando la secuencia después del
+  id más alto entre la tabla y su archivo. Sin eso se reutilizan ids ya
+  archivados y el archivo falla por clave primaria duplicada
+
+Cada paso mira el estado real de la base, así correrlo de nuevo no hace
+nada. Sin --apply solo muestra lo que haría. Correr una vez al desplegar,
+antes de levantar la nueva versión:
+
+    python migrate_schema.py           # vista previa
+    python migrate_schema.py --apply
+"""
+import argparse
+import os
+from collections import Counter
+from functools import partial
+from sqlalchemy import inspect
+from models import db, Costume, AnimationPackage
+
+
+# Columnas agregadas a tablas que ya existían en instalaciones anteriores
+ADDED_COLUMNS = (
+    (Costume, ("image_asset_id", "image_variants")),
+    (AnimationPackage, ("image_asset_id", "image_variants")),
+)
+
+
+def quote(name):
+    return db.engine.dialect.identifier_preparer.quote(name)
+
+
+# ====================================
+# COLUMNAS NUEVAS
+# ====================================
+
+def missing_columns(inspector):
+    """Acciones (descripción, función) para las columnas que faltan"""
+    actions = []
+    for model, names in ADDED_COLUMNS:
+        table = model.__table__
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for name in names:
+            if name not in existing:
+                actions.append((f"{table.name}: agregar columna {name}", partial(add_column, table.c[name])))
+    return actions
+
+
+def add_column(column, connection):
+    """ALTER TABLE ... ADD COLUMN (nullable, con su FK e índice si los tiene)"""
+    ddl = f"ALTER TABLE {quote(column.table.name)} ADD COLUMN {quote(column.name)} " \
+          f"{column.type.compile(dialect=connection.dialect)}"
+    for foreign_key in column.foreign_keys:
+        target = foreign_key.column
+        ddl += f" REFERENCES {quote(target.table.name)} ({quote(target.name)})"
+    connection.exec_driver_sql(ddl)
+    for index in column.table.indexes:
+        if [indexed.name for indexed in index.columns] == [column.name]:
+            index.create(connection, checkfirst=True)
+
+
+# ====================================
+# ON DELETE DE LAS FKs
+# ====================================
+
+def _declared_ondelete():
+    """[(tabla, columna, FK)] de los modelos que declaran ondelete"""
+    return [
+        (table, foreign_key.parent.name, foreign_key)
+        for table in db.metadata.sorted_tables
+        for foreign_key in table.foreign_keys if foreign_key.ondelete
+    ]
+
+
+def _current_ondelete(inspector, table_name, column):
+    """ON DELETE actual de la FK de `column` en la base (None si no hay FK)"""
+    if db.engine.dialect.name == "sqlite":
+        # El inspector de SQLite no informa ON DELETE: leerlo del PRAGMA
+        with db.engine.connect() as connection:
+            rows = connection.exec_driver_sql(f"PRAGMA foreign_key_list({quote(table_name)})").fetchall()
+        for row in rows:
+            if row[3] == column:
+                return row[6].upper()
+        return None
+    for foreign_key in inspector.get_foreign_keys(table_name):
+        if foreign_key["constrained_columns"] == [column]:
+            return (foreign_key["options"].get("ondelete") or "NO ACTION").upper()
+    return None
+
+
+def _ondelete_mismatches(inspector):
+    """[(tabla, columna, FK del modelo, ON DELETE actual)] que no coinciden"""
+    existing_tables = set(inspector.get_table_names())
+    mismatches = []
+    for table, column, foreign_key in _declared_ondelete():
+        if table.name not in existing_tables:
+            continue
+        current = _current_ondelete(inspector, table.name, column)
+        if current != foreign_key.ondelete.upper():
+            mismatches.append((table, column, foreign_key, current))
+    return mismatches
+
+
+def _describe_ondelete(table, column, foreign_key, current):
+    return f"{table.name}.{column}: FK con ON DELETE {foreign_key.ondelete} (hoy {current or 'sin FK'})"
+
+
+def wrong_ondelete(inspector):
+    """Acciones para las FKs cuyo ON DELETE no coincide con el modelo (SQLite: ver sqlite_rebuilds)"""
+    if db.engine.dialect.name == "sqlite":
+        return []
+    return [
+        (_describe_ondelete(*mismatch), partial(replace_foreign_key, inspector, *mismatch[:3]))
+        for mismatch in _ondelete_mismatches(inspector)
+    ]
+
+
+def replace_foreign_key(inspector, table, column, foreign_key, connection):
+    """PostgreSQL: DROP CONSTRAINT de la FK actual y ADD CONSTRAINT con el ON DELETE del modelo"""
+    for current in inspector.get_foreign_keys(table.name):
+        if current["constrained_columns"] == [column] and current["name"]:
+            connection.exec_driver_sql(
+                f"ALTER TABLE {quote(table.name)} DROP CONSTRAINT {quote(current['name'])}"
+            )
+    target = foreign_key.column
+    name = f"{table.name}_{column}_fkey"
+    connection.exec_driver_sql(
+        f"ALTER TABLE {quote(table.name)} ADD CONSTRAINT {quote(name)} FOREIGN KEY ({quote(column)}) "
+        f"REFERENCES {quote(target.table.name)} ({quote(target.name)}) ON DELETE {foreign_key.ondelete}"
+    )
+    for index in table.indexes:
+        if [indexed.name for indexed in index.columns] == [column]:
+            index.create(connection, checkfirst=True)
+
+
+# ====================================
+# SQLITE: RECONSTRUCCIÓN DE TABLAS
+# ====================================
+
+def _missing_autoincrement(inspector):
+    """Tablas que el modelo declara con AUTOINCREMENT y en la base no lo tienen"""
+    existing_tables = set(inspector.get_table_names())
+    tables = [
+        table for table in db.metadata.sorted_tables
+        if table.name in existing_tables and table.dialect_options["sqlite"]["autoincrement"]
+    ]
+    with db.engine.connect() as connection:
+        return [
+            table for table in tables
+            if "AUTOINCREMENT" not in connection.exec_driver_sql(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table.name,)
+            ).scalar().upper()
+        ]
+
+
+def sqlite_rebuilds(inspector):
+    """SQLite: una reconstrucción por tabla, con todos sus motivos (FKs, AUTOINCREMENT)"""
+    if db.engine.dialect.name != "sqlite":
+        return []
+    reasons = {}
+    for mismatch in _ondelete_mismatches(inspector):
+        reasons.setdefault(mismatch[0], []).append(_describe_ondelete(*mismatch))
+    for table in _missing_autoincrement(inspector):
+        reasons.setdefault(table, []).append(f"{table.name}: AUTOINCREMENT")
+    return [
+        (f"{'; '.join(descriptions)}: reconstruir tabla", partial(rebuild_sqlite_table, table))
+        for table, descriptions in reasons.items()
+    ]
+
+
+def rebuild_sqlite_table(table, connection):
+    """
+    SQLite: renombra la tabla, la crea de nuevo desde el modelo (FKs,
+    índices, AUTOINCREMENT), copia las columnas en común y borra la vieja.
+    Requiere foreign_keys=OFF y legacy_alter_table=ON (ver main)
+    """
+    old = f"{table.name}__old"
+    connection.exec_driver_sql(f"ALTER TABLE {quote(table.name)} RENAME TO {quote(old)}")
+    # Los índices se quedan con la tabla renombrada y sus nombres chocarían
+    indexes = connection.exec_driver_sql(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (old,)
+    ).fetchall()
+    for (index,) in indexes:
+        connection.exec_driver_sql(f"DROP INDEX {quote(index)}")
+    table.create(connection)
+
+    old_columns = {row[1] for row in connection.exec_driver_sql(f"PRAGMA table_info({quote(old)})")}
+    columns = ", ".join(quote(column.name) for column in table.columns if column.name in old_columns)
+    connection.exec_driver_sql(
+        f"INSERT INTO {quote(table.name)} ({columns}) SELECT {columns} FROM {quote(old)}"
+    )
+    connection.exec_driver_sql(f"DROP TABLE {quote(old)}")
+    if table.dialect_options["sqlite"]["autoincrement"]:
+        _seed_sqlite_sequence(table, connection)
+
+
+def _seed_sqlite_sequence(table, connection):
+    """Arranca la secuencia después del id más alto de la tabla y de su archivo"""
+    highest = connection.exec_driver_sql(f"SELECT MAX(id) FROM {quote(table.name)}").scalar() or 0
+    archive = f"{table.name}_archive"
+    if connection.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (archive,)).scalar():
+        highest = max(highest, connection.exec_driver_sql(f"SELECT MAX(id) FROM {quote(archive)}").scalar() or 0)
+        repeated = connection.exec_driver_sql(
+            f"SELECT COUNT(*) FROM {quote(table.name)} WHERE id IN (SELECT id FROM {quote(archive)})"
+        ).scalar()
+        if repeated:
+            print(f"⚠️ {table.name}: {repeated} filas repiten el id de una archivada (se conservan)")
+    connection.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = ?", (table.name,))
+    connection.exec_driver_sql("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table.name, highest))
+
+
+# ====================================
+# EJECUCIÓN
+# ====================================
+
+STEPS = (missing_columns, wrong_ondelete, sqlite_rebuilds)
+
+
+def pending_actions():
+    """Todo lo que falta aplicar, en orden"""
+    inspector = inspect(db.engine)
+    return [action for step in STEPS for action in step(inspector)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apply", action="store_true", help="aplicar los cambios (sin esto, solo vista previa)")
+    args = parser.parse_args()
+
+    from app import create_app
+
+    os.environ["BACKGROUND_JOBS_ENABLED"] = "false"
+    app = create_app()
+    with app.app_context():
+        actions = pending_actions()
+        for description, _ in actions:
+            print(f"🛠️  {description}")
+        if not actions:
+            print("✅ El esquema ya está al día")
+            return
+        if not args.apply:
+            print(f"🔎 Vista previa: {len(actions)} cambios pendientes. Usar --apply")
+            return
+
+        sqlite = db.engine.dialect.name == "sqlite"
+        with db.engine.connect() as connection:
+            if sqlite:
+                # Fuera de la transacción: reconstruir tablas sin que SQLite
+                # verifique FKs ni reescriba las referencias de otras tablas
+                connection.exec_driver_sql("PRAGMA foreign_keys=OFF")
+                connection.exec_driver_sql("PRAGMA legacy_alter_table=ON")
+            for _, apply in actions:
+                apply(connection)
+            if sqlite:
+                orphans = Counter(row[0] for row in connection.exec_driver_sql("PRAGMA foreign_key_check"))
+                for table, count in sorted(orphans.items()):
+                    print(f"⚠️ {table}: {count} filas apuntan a filas que ya no existen (se conservan)")
+            connection.commit()
+            if sqlite:
+                connection.exec_driver_sql("PRAGMA legacy_alter_table=OFF")
+                connection.exec_driver_sql("PRAGMA foreign_keys=ON")
+        print(f"✅ {len(actions)} cambios aplicados")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,19 @@
-from datetime import datetime
+import hashlib
+import secrets
+from datetime import datetime, timedelta
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
+from sqlalchemy.orm import validates
 
 db = SQLAlchemy()
 bcrypt = Bcrypt()
 
 
+def normalize_email(email):
+    """Forma canónica del email: sin espacios y en minúsculas (la que se guarda y se busca)"""
+    return email.strip().lower() if isinstance(email, str) else email
+
+
 class User(db.Model):
     """Modelo de Usuario con autenticación"""
     __tablename__ = 'user'
@@ -18,9 +26,14 @@ class User(db.Model):
     phone = db.Column(db.String(20), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    # Relaciones
-    events = db.relationship('Event', backref='user', lazy=True, cascade='all, delete-orphan')
-    bookings = db.relationship('Booking', backref='user', lazy=True, cascade='all, delete-orphan')
+    # Relaciones (ON DELETE CASCADE: la base borra los hijos sin cargarlos)
+    events = db.relationship('Event', backref='user', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    bookings = db.relationship('Booking', backref='user', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+
+    @validates("email")
+    def _normalize_email(self, key, email):
+        # El índice único de email queda sobre la forma normalizada
+        return normalize_email(email)
 
     @property
     def password(self):
@@ -55,6 +68,9 @@ class User(db.Model):
 class Contact(db.Model):
     """Modelo para mensajes de contacto"""
     __tablename__ = 'contact'
+    # Sin AUTOINCREMENT SQLite reutiliza el id más alto borrado, y el archivo
+    # conserva los ids: una fila nueva chocaría con una archivada
+    __table_args__ = {'sqlite_autoincrement': True}
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
@@ -79,6 +95,7 @@ class Contact(db.Model):
 class Event(db.Model):
     """Modelo para eventos creados por usuarios"""
     __tablename__ = 'event'
+    __table_args__ = {'sqlite_autoincrement': True}  # ver Contact
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(150), nullable=False)
@@ -90,7 +107,7 @@ class Event(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relación con usuario
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
 
     def serialize(self):
         return {
@@ -118,25 +135,30 @@ class Costume(db.Model):
     size = db.Column(db.String(20), nullable=True)  # S, M, L, XL
     price_per_day = db.Column(db.Float, nullable=False)
     image_url = db.Column(db.String(300), nullable=True)
+    image_asset_id = db.Column(db.Integer, db.ForeignKey('media_asset.id'), nullable=True, index=True)
+    image_variants = db.Column(db.JSON, nullable=True)  # {"thumb": url, "card": url, "full": url}
     available = db.Column(db.Boolean, default=True)
     stock_quantity = db.Column(db.Integer, default=1)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    def serialize(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "description": self.description,
-            "category": self.category,
-            "size": self.size,
-            "price_per_day": self.price_per_day,
-            "image_url": self.image_url,
-            "available": self.available,
-            "stock_quantity": self.stock_quantity,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None
+    def serialize(self, fields=None):
+        """Serializa el disfraz; `fields` limita las claves (sparse fieldsets)"""
+        getters = {
+            "id": lambda: self.id,
+            "name": lambda: self.name,
+            "description": lambda: self.description,
+            "category": lambda: self.category,
+            "size": lambda: self.size,
+            "price_per_day": lambda: self.price_per_day,
+            "image_url": lambda: self.image_url,
+            "image_variants": lambda: self.image_variants,
+            "available": lambda: self.available,
+            "stock_quantity": lambda: self.stock_quantity,
+            "created_at": lambda: self.created_at.isoformat() if self.created_at else None,
+            "updated_at": lambda: self.updated_at.isoformat() if self.updated_at else None
         }
+        return {key: getters[key]() for key in (fields or getters)}
 
 
 class AnimationPackage(db.Model):
@@ -151,38 +173,44 @@ class AnimationPackage(db.Model):
     includes = db.Column(db.Text, nullable=True)  # servicios incluidos (JSON o texto)
     max_children = db.Column(db.Integer, nullable=True)
     image_url = db.Column(db.String(300), nullable=True)
+    image_asset_id = db.Column(db.Integer, db.ForeignKey('media_asset.id'), nullable=True, index=True)
+    image_variants = db.Column(db.JSON, nullable=True)  # {"thumb": url, "card": url, "full": url}
     available = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    def serialize(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "description": self.description,
-            "duration_hours": self.duration_hours,
-            "price": self.price,
-            "includes": self.includes,
-            "max_children": self.max_children,
-            "image_url": self.image_url,
-            "available": self.available,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None
+    def serialize(self, fields=None):
+        """Serializa el paquete; `fields` limita las claves (sparse fieldsets)"""
+        getters = {
+            "id": lambda: self.id,
+            "name": lambda: self.name,
+            "description": lambda: self.description,
+            "duration_hours": lambda: self.duration_hours,
+            "price": lambda: self.price,
+            "includes": lambda: self.includes,
+            "max_children": lambda: self.max_children,
+            "image_url": lambda: self.image_url,
+            "image_variants": lambda: self.image_variants,
+            "available": lambda: self.available,
+            "created_at": lambda: self.created_at.isoformat() if self.created_at else None,
+            "updated_at": lambda: self.updated_at.isoformat() if self.updated_at else None
         }
+        return {key: getters[key]() for key in (fields or getters)}
 
 
 class Booking(db.Model):
     """Modelo para reservas de servicios"""
     __tablename__ = 'booking'
+    __table_args__ = {'sqlite_autoincrement': True}  # ver Contact
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
     
     # Tipo de reserva
     booking_type = db.Column(db.String(20), nullable=False)  # costume, package, both
     
     # Información del evento
-    event_date = db.Column(db.Date, nullable=False)
+    event_date = db.Column(db.Date, nullable=False, index=True)
     event_time = db.Column(db.String(20), nullable=True)
     event_location = db.Column(db.String(300), nullable=True)
     event_address = db.Column(db.Text, nullable=True)
@@ -208,48 +236,322 @@ class Booking(db.Model):
     costume = db.relationship('Costume', backref='bookings')
     package = db.relationship('AnimationPackage', backref='bookings')
 
-    def serialize(self):
-        return {
-            "id": self.id,
-            "user_id": self.user_id,
-            "user_name": self.user.name if self.user else None,
-            "user_email": self.user.email if self.user else None,
-            "booking_type": self.booking_type,
-            "event_date": self.event_date.isoformat() if self.event_date else None,
-            "event_time": self.event_time,
-            "event_location": self.event_location,
-            "event_address": self.event_address,
-            "num_children": self.num_children,
-            "costume": self.costume.serialize() if self.costume else None,
-            "package": self.package.serialize() if self.package else None,
-            "special_requests": self.special_requests,
-            "total_price": self.total_price,
-            "status": self.status,
-            "payment_status": self.payment_status,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None
+    def serialize(self, fields=None):
+        """Serializa la reserva; `fields` limita las claves (sparse fieldsets)"""
+        getters = {
+            "id": lambda: self.id,
+            "user_id": lambda: self.user_id,
+            "user_name": lambda: self.user.name if self.user else None,
+            "user_email": lambda: self.user.email if self.user else None,
+            "booking_type": lambda: self.booking_type,
+            "event_date": lambda: self.event_date.isoformat() if self.event_date else None,
+            "event_time": lambda: self.event_time,
+            "event_location": lambda: self.event_location,
+            "event_address": lambda: self.event_address,
+            "num_children": lambda: self.num_children,
+            "costume": lambda: self.costume.serialize() if self.costume else None,
+            "package": lambda: self.package.serialize() if self.package else None,
+            "special_requests": lambda: self.special_requests,
+            "total_price": lambda: self.total_price,
+            "status": lambda: self.status,
+            "payment_status": lambda: self.payment_status,
+            "created_at": lambda: self.created_at.isoformat() if self.created_at else None,
+            "updated_at": lambda: self.updated_at.isoformat() if self.updated_at else None
         }
+        return {key: getters[key]() for key in (fields or getters)}
 
 
 class PasswordReset(db.Model):
     """Modelo para tokens de recuperación de contraseña"""
     __tablename__ = 'password_reset'
     
+    TOKEN_TTL = timedelta(hours=1)
+    COMPACT_BATCH_SIZE = 500
+    
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    token = db.Column(db.String(100), unique=True, nullable=False)
-    expires_at = db.Column(db.DateTime, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    # Se guarda el SHA-256 del token (la columna conserva el nombre "token")
+    token_hash = db.Column('token', db.String(100), unique=True, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
     used = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    user = db.relationship('User', backref='password_resets')
+    user = db.relationship('User', backref=db.backref('password_resets', passive_deletes=True))
+
+    @staticmethod
+    def hash_token(token):
+        """Digest SHA-256 (hex) del token enviado por email"""
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def issue(cls, user_id):
+        """
+        Crea un token nuevo e invalida los pendientes del usuario.
+        No hace commit. Devuelve el token en claro (solo para el email).
+        """
+        cls.query.filter_by(user_id=user_id, used=False).update(
+            {"used": True}, synchronize_session=False
+        )
+        token = secrets.token_urlsafe(32)
+        db.session.add(cls(
+            user_id=user_id,
+            token_hash=cls.hash_token(token),
+            expires_at=datetime.utcnow() + cls.TOKEN_TTL
+        ))
+        return token
+
+    @classmethod
+    def find_valid(cls, token):
+        """Busca un token vigente con un solo probe al índice único"""
+        reset = cls.query.filter_by(token_hash=cls.hash_token(token)).first()
+        if not reset or reset.used or reset.expires_at < datetime.utcnow():
+            return None
+        return reset
+
+    @classmethod
+    def compact(cls, batch_size=None, max_batches=20):
+        """Elimina filas expiradas o usadas en lotes acotados. Devuelve cuántas borró"""
+        batch_size = batch_size or cls.COMPACT_BATCH_SIZE
+        deleted = 0
+        for _ in range(max_batches):
+            ids = [row.id for row in db.session.query(cls.id).filter(
+                db.or_(cls.used.is_(True), cls.expires_at < datetime.utcnow())
+            ).limit(batch_size)]
+            if not ids:
+                break
+            cls.query.filter(cls.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+            deleted += len(ids)
+            if len(ids) < batch_size:
+                break
+        return deleted
 
     def serialize(self):
         return {
             "id": self.id,
             "user_id": self.user_id,
-            "token": self.token,
             "expires_at": self.expires_at.isoformat(),
             "used": self.used,
             "created_at": self.created_at.isoformat()
-        }
\ No newline at end of file
+        }
+
+class EmailCampaign(db.Model):
+    """Campaña de emails masivos con progreso persistente (reanudable)"""
+    __tablename__ = 'email_campaign'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # booking_reminder, announcement
+    subject = db.Column(db.String(200), nullable=False)
+    message = db.Column(db.Text, nullable=True)
+    target_date = db.Column(db.Date, nullable=True)  # fecha de eventos (recordatorios)
+    status = db.Column(db.String(20), default="pending")  # pending, running, completed, failed
+    cursor = db.Column(db.Integer, default=0)  # último ID de destinatario ya enviado
+    sent_count = db.Column(db.Integer, default=0)
+    batch_count = db.Column(db.Integer, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    completed_at = db.Column(db.DateTime, nullable=True)
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "subject": self.subject,
+            "message": self.message,
+            "target_date": self.target_date.isoformat() if self.target_date else None,
+            "status": self.status,
+            "cursor": self.cursor,
+            "sent_count": self.sent_count,
+            "batch_count": self.batch_count,
+            "last_error": self.last_error,
+            "created_by": self.created_by,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "completed_at": self.completed_at.isoformat() if self.completed_at else None
+        }
+
+
+class ScheduledJob(db.Model):
+    """Trabajo programado ligado a una reserva (recordatorios, cobros, seguimiento)"""
+    __tablename__ = 'scheduled_job'
+    __table_args__ = (
+        db.UniqueConstraint('booking_id', 'kind', name='uq_scheduled_job_booking_kind'),
+        db.Index('ix_scheduled_job_status_run_at', 'status', 'run_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)  # reminder_24h, payment_nudge, follow_up
+    booking_id = db.Column(db.Integer, db.ForeignKey('booking.id', ondelete='CASCADE'), nullable=False, index=True)
+    run_at = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(20), default="pending")  # pending, running, done, failed
+    attempts = db.Column(db.Integer, default=0)
+    locked_by = db.Column(db.String(100), nullable=True)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "booking_id": self.booking_id,
+            "run_at": self.run_at.isoformat() if self.run_at else None,
+            "status": self.status,
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None
+        }
+
+
+class JobLease(db.Model):
+    """Próxima ejecución de un trabajo periódico, compartida por todos los workers"""
+    __tablename__ = 'job_lease'
+
+    name = db.Column(db.String(60), primary_key=True)
+    next_run_at = db.Column(db.DateTime, nullable=False)
+    locked_by = db.Column(db.String(100), nullable=True)  # último worker que lo reclamó
+
+
+class IdempotencyKey(db.Model):
+    """Respuesta guardada para un Idempotency-Key (reintentos de POST)"""
+    __tablename__ = 'idempotency_key'
+    __table_args__ = (
+        db.UniqueConstraint('scope', 'key', name='uq_idempotency_scope_key'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(120), nullable=False)  # endpoint + usuario
+    key = db.Column(db.String(255), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.String(20), default="in_progress")  # in_progress, completed
+    response_status = db.Column(db.Integer, nullable=True)
+    response_body = db.Column(db.Text, nullable=True)
+    locked_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class BookingDailyRollup(db.Model):
+    """Agregado diario de reservas por dimensión (all, package, costume, category)"""
+    __tablename__ = 'booking_daily_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'dimension', 'dimension_key', name='uq_rollup_day_dimension'),
+        db.Index('ix_rollup_dimension_day', 'dimension', 'day'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    dimension = db.Column(db.String(20), nullable=False)
+    dimension_key = db.Column(db.String(120), nullable=False, default="")
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)  # disfraces reservados
+
+
+class MediaAsset(db.Model):
+    """Imagen subida por el admin, direccionada por su hash SHA-256"""
+    __tablename__ = 'media_asset'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    content_type = db.Column(db.String(50), nullable=False)
+    size_bytes = db.Column(db.Integer, nullable=False)
+    width = db.Column(db.Integer, nullable=True)
+    height = db.Column(db.Integer, nullable=True)
+    status = db.Column(db.String(20), default="pending", index=True)  # pending, processing, ready, failed
+    variants = db.Column(db.JSON, nullable=True)  # nombre de variante -> URL
+    last_error = db.Column(db.Text, nullable=True)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "sha256": self.sha256,
+            "content_type": self.content_type,
+            "size_bytes": self.size_bytes,
+            "width": self.width,
+            "height": self.height,
+            "status": self.status,
+            "variants": self.variants,
+            "last_error": self.last_error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None
+        }
+
+
+class ChangeLog(db.Model):
+    """Registro append-only de cambios en reservas y eventos (cursor = id)"""
+    __tablename__ = 'change_log'
+    __table_args__ = (
+        db.Index('ix_change_log_user_cursor', 'user_id', 'id'),
+    )
+    
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    entity = db.Column(db.String(20), nullable=False)  # booking, event
+    entity_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)  # dueño de la fila (sin FK: sobrevive al borrado)
+    action = db.Column(db.String(10), nullable=False)  # upsert, delete
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class CostumeStockDay(db.Model):
+    """Unidades reservadas de un disfraz para una fecha de evento"""
+    __tablename__ = 'costume_stock_day'
+    __table_args__ = (
+        db.UniqueConstraint('costume_id', 'day', name='uq_costume_stock_day'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    costume_id = db.Column(db.Integer, db.ForeignKey('costume.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    reserved = db.Column(db.Integer, nullable=False, default=0)
+
+
+# ====================================
+# ARCHIVO (filas frías fuera de las tablas calientes)
+# ====================================
+
+def _archive_table(model, indexed=()):
+    """Copia de las columnas de `model` en <tabla>_archive, sin FKs ni autoincremento (conserva el id)"""
+    columns = [
+        db.Column(column.name, column.type, primary_key=column.primary_key,
+                  autoincrement=False, nullable=column.nullable, index=column.name in indexed)
+        for column in model.__table__.columns
+    ]
+    columns.append(db.Column("archived_at", db.DateTime, nullable=False, index=True))
+    return db.Table(f"{model.__tablename__}_archive", db.metadata, *columns)
+
+
+class BookingArchive(db.Model):
+    """Reservas archivadas (solo lectura, ?include_archived=true)"""
+    __table__ = _archive_table(Booking, indexed=("user_id", "event_date"))
+    
+    user = db.relationship('User', primaryjoin='foreign(BookingArchive.user_id) == User.id', viewonly=True)
+    costume = db.relationship('Costume', primaryjoin='foreign(BookingArchive.costume_id) == Costume.id', viewonly=True)
+    package = db.relationship(
+        'AnimationPackage', primaryjoin='foreign(BookingArchive.package_id) == AnimationPackage.id', viewonly=True
+    )
+    
+    serialize = Booking.serialize
+
+
+class EventArchive(db.Model):
+    """Eventos archivados (solo lectura, ?include_archived=true)"""
+    __table__ = _archive_table(Event, indexed=("user_id",))
+    
+    user = db.relationship('User', primaryjoin='foreign(EventArchive.user_id) == User.id', viewonly=True)
+    
+    serialize = Event.serialize
+
+
+class ContactArchive(db.Model):
+    """Mensajes de contacto archivados (solo lectura, ?include_archived=true)"""
+    __table__ = _archive_table(Contact, indexed=("created_at",))
+    
+    serialize = Contact.serialize
@@ -0,0 +1,261 @@
+"""
+Capa compartida para llamadas HTTP salientes (SendGrid, Google Calendar)
+
+- Sesiones requests con keep-alive y pool de conexiones por proveedor
+- Timeouts de conexión/lectura por proveedor (<PROVEEDOR>_CONNECT_TIMEOUT / _READ_TIMEOUT)
+- Reintentos acotados con backoff exponencial y jitter. Los métodos no
+  idempotentes (POST, PATCH) solo se reintentan cuando el proveedor seguro
+  no recibió la llamada (falla al conectar) o la rechazó con 429; un 5xx o
+  un timeout de lectura pudo haberse procesado (p. ej. un email enviado) y
+  se devuelve tal cual. `idempotent=True` habilita reintentos completos
+- Circuit breaker: mientras el proveedor falla, se responde de inmediato
+  sin esperar timeouts; el estado se expone en /api/metrics
+
+Para pruebas, cada proveedor acepta una URL base propia (por ejemplo
+SENDGRID_API_HOST) que puede apuntar a un stub local que inyecte fallas.
+
+Los handlers no esperan a los proveedores: outbound_dispatcher ejecuta la
+llamada en un pool acotado después de responder (OUTBOUND_ASYNC=false la
+vuelve a ejecutar dentro del request).
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from metrics import metrics
+from models import db
+
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+UNPROCESSED_STATUSES = {429}  # el proveedor rechazó la llamada sin procesarla
+
+
+class OutboundError(RuntimeError):
+    """La llamada saliente falló después de los reintentos"""
+
+
+class CircuitOpenError(OutboundError):
+    """El circuito del proveedor está abierto: no se intenta la llamada"""
+
+
+class CircuitBreaker:
+    """Circuit breaker clásico: closed -> open -> half_open -> closed"""
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._total_failures = 0
+        self._short_circuited = 0
+
+    def allow(self):
+        """¿Se puede intentar la llamada ahora?"""
+        with self._lock:
+            if self._state == "open":
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    self._short_circuited += 1
+                    return False
+                self._state = "half_open"
+                self._trial_in_flight = False
+            if self._state == "half_open":
+                if self._trial_in_flight:
+                    self._short_circuited += 1
+                    return False
+                self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = "closed"
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._total_failures += 1
+            self._trial_in_flight = False
+            if self._state == "half_open" or self._failures >= self.failure_threshold:
+                if self._state != "open":
+                    print(f"⚠️ Circuito '{self.name}' abierto tras {self._failures} fallas")
+                self._state = "open"
+                self._opened_at = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "total_failures": self._total_failures,
+                "short_circuited": self._short_circuited,
+                "open_for_seconds": round(time.monotonic() - self._opened_at, 1) if self._state == "open" else 0,
+            }
+
+
+class OutboundClient:
+    """Cliente HTTP de un proveedor con timeouts, reintentos y circuit breaker"""
+
+    def __init__(self, name, base_url, session=None, headers=None):
+        prefix = name.upper()
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (
+            float(os.environ.get(f"{prefix}_CONNECT_TIMEOUT", "3")),
+            float(os.environ.get(f"{prefix}_READ_TIMEOUT", "10")),
+        )
+        self.retries = int(os.environ.get(f"{prefix}_RETRIES", "2"))
+        self.backoff = float(os.environ.get(f"{prefix}_BACKOFF", "0.2"))
+        self.breaker = CircuitBreaker(
+            name,
+            failure_threshold=int(os.environ.get(f"{prefix}_BREAKER_THRESHOLD", "5")),
+            reset_timeout=float(os.environ.get(f"{prefix}_BREAKER_RESET", "30")),
+        )
+
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=int(os.environ.get(f"{prefix}_POOL_SIZE", "10")))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if headers:
+            self.session.headers.update(headers)
+
+    def request(self, method, path, idempotent=None, **kwargs):
+        """
+        Hace la llamada con reintentos. Devuelve la respuesta HTTP
+        (también 4xx/5xx finales) o lanza OutboundError/CircuitOpenError.
+
+        `idempotent` (por defecto según el método) decide si se reintenta
+        ante 5xx y timeouts de lectura, que pueden haberse procesado.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Proveedor '{self.name}' no disponible (circuito abierto)")
+
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        url = f"{self.base_url}{path}"
+        last_error = None
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            except requests.exceptions.ConnectTimeout as error:
+                last_error = error
+            except requests.exceptions.Timeout as error:
+                # Expiró leyendo: el proveedor pudo haberla procesado
+                last_error = error
+                if not idempotent:
+                    break
+            except requests.exceptions.ConnectionError as error:
+                # Conexión cortada después de enviar: mismo caso que el timeout de lectura
+                last_error = error
+                if not idempotent and not self._not_sent(error):
+                    break
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    return response
+                last_error = None
+                retryable = idempotent or response.status_code in UNPROCESSED_STATUSES
+                if attempt == self.retries or not retryable:
+                    self.breaker.record_failure()
+                    if not retryable:
+                        metrics.incr(f"outbound.{self.name}.not_retried")
+                    return response
+
+            if attempt < self.retries:
+                time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+        self.breaker.record_failure()
+        raise OutboundError(f"{self.name}: {last_error or 'respuesta no exitosa'}")
+
+    @staticmethod
+    def _not_sent(error):
+        """¿La conexión falló antes de enviar el request (DNS, rechazada, timeout al conectar)?"""
+        reason = getattr(error.args[0], "reason", None) if error.args else None
+        return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+# Registro de clientes por proveedor (para exponer el estado de los breakers)
+_clients = {}
+
+
+def register_client(client):
+    _clients[client.name] = client
+    return client
+
+
+def breaker_states():
+    """Estado de los circuit breakers de todos los proveedores registrados"""
+    return {name: client.breaker.snapshot() for name, client in _clients.items()}
+
+
+metrics.register_gauge("circuit_breakers", breaker_states)
+
+
+class OutboundDispatcher:
+    """Ejecuta tareas salientes (emails, Google Calendar) fuera del request"""
+
+    def __init__(self):
+        self.enabled = os.environ.get("OUTBOUND_ASYNC", "true").lower() == "true"
+        self.max_pending = int(os.environ.get("OUTBOUND_MAX_PENDING", "200"))
+        self._pool = ThreadPoolExecutor(
+            max_workers=int(os.environ.get("OUTBOUND_WORKERS", "4")), thread_name_prefix="outbound"
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def submit(self, name, fn, *args, **kwargs):
+        """
+        Encola fn(*args, **kwargs) dentro del contexto de la app. Pasar ids y
+        valores simples, no objetos del ORM. Con la cola llena (o en modo
+        síncrono) se ejecuta en el request como antes.
+        """
+        app = current_app._get_current_object()
+        with self._lock:
+            queued = self.enabled and self._pending < self.max_pending
+            if queued:
+                self._pending += 1
+        if not queued:
+            self._run(app, name, fn, args, kwargs)
+            return False
+        metrics.incr("outbound.tasks_queued")
+        self._pool.submit(self._run_queued, app, name, fn, args, kwargs)
+        return True
+
+    def _run_queued(self, app, name, fn, args, kwargs):
+        try:
+            self._run(app, name, fn, args, kwargs)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _run(self, app, name, fn, args, kwargs):
+        with app.app_context():
+            try:
+                fn(*args, **kwargs)
+            except Exception as error:
+                metrics.incr("outbound.tasks_failed")
+                print(f"⚠️ Tarea saliente '{name}' falló: {error}")
+                db.session.rollback()
+            finally:
+                db.session.remove()
+
+
+# Instancia global del despachador
+outbound_dispatcher = OutboundDispatcher()
+
+metrics.register_gauge("outbound.pending_tasks", lambda: outbound_dispatcher.pending)
@@ -0,0 +1,136 @@
+"""
+Motor de cotizaciones
+Calcula el precio de una reserva en el servidor a partir del catálogo,
+usando una tabla de precios en memoria que solo se reconstruye cuando
+cambia la versión del catálogo.
+"""
+import threading
+from sqlalchemy import func
+from models import db, Costume, AnimationPackage
+
+
+class QuoteError(ValueError):
+    """Combinación de items/días/niños que no se puede cotizar"""
+
+
+class QuoteService:
+    """Cotizador con tabla de precios cacheada por versión de catálogo"""
+
+    MAX_RENTAL_DAYS = 30
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._costumes = {}
+        self._packages = {}
+
+    def catalog_version(self):
+        """Huella barata del catálogo: (filas, último updated_at) por tabla"""
+        costume_row = db.session.query(func.count(Costume.id), func.max(Costume.updated_at)).one()
+        package_row = db.session.query(
+            func.count(AnimationPackage.id), func.max(AnimationPackage.updated_at)
+        ).one()
+        return (
+            f"c{costume_row[0]}-{costume_row[1].isoformat() if costume_row[1] else 0}"
+            f":p{package_row[0]}-{package_row[1].isoformat() if package_row[1] else 0}"
+        )
+
+    def _price_table(self):
+        """Devuelve (versión, disfraces, paquetes), reconstruyendo solo si cambió el catálogo"""
+        version = self.catalog_version()
+        with self._lock:
+            if version != self._version:
+                self._costumes = {
+                    row.id: {"name": row.name, "price_per_day": row.price_per_day, "available": row.available}
+                    for row in db.session.query(
+                        Costume.id, Costume.name, Costume.price_per_day, Costume.available
+                    )
+                }
+                self._packages = {
+                    row.id: {
+                        "name": row.name,
+                        "price": row.price,
+                        "max_children": row.max_children,
+                        "available": row.available,
+                    }
+                    for row in db.session.query(
+                        AnimationPackage.id, AnimationPackage.name, AnimationPackage.price,
+                        AnimationPackage.max_children, AnimationPackage.available
+                    )
+                }
+                self._version = version
+            return self._version, self._costumes, self._packages
+
+    def quote(self, costume_id=None, package_id=None, rental_days=1, num_children=None):
+        """
+        Cotiza una combinación de disfraz y/o paquete
+
+        Args:
+            costume_id (int): ID del disfraz (opcional)
+            package_id (int): ID del paquete (opcional)
+            rental_days (int): Días de arriendo del disfraz
+            num_children (int): Cantidad de niños (se valida contra max_children)
+
+        Returns:
+            dict: detalle por item y total
+        Raises:
+            QuoteError: si la combinación no es válida
+        """
+        if not costume_id and not package_id:
+            raise QuoteError("Debes seleccionar un disfraz o un paquete")
+
+        try:
+            costume_id = int(costume_id) if costume_id else None
+            package_id = int(package_id) if package_id else None
+            rental_days = int(rental_days or 1)
+            num_children = int(num_children) if num_children not in (None, "") else None
+        except (TypeError, ValueError):
+            raise QuoteError("IDs, días de arriendo y cantidad de niños deben ser números enteros")
+
+        if not 1 <= rental_days <= self.MAX_RENTAL_DAYS:
+            raise QuoteError(f"Los días de arriendo deben estar entre 1 y {self.MAX_RENTAL_DAYS}")
+        if num_children is not None and num_children < 1:
+            raise QuoteError("La cantidad de niños debe ser mayor a 0")
+
+        version, costumes, packages = self._price_table()
+        items = []
+
+        if costume_id:
+            costume = costumes.get(costume_id)
+            if not costume or not costume["available"]:
+                raise QuoteError("Disfraz no disponible")
+            items.append({
+                "type": "costume",
+                "id": costume_id,
+                "name": costume["name"],
+                "unit_price": costume["price_per_day"],
+                "quantity": rental_days,
+                "subtotal": costume["price_per_day"] * rental_days,
+            })
+
+        if package_id:
+            package = packages.get(package_id)
+            if not package or not package["available"]:
+                raise QuoteError("Paquete no disponible")
+            if num_children and package["max_children"] and num_children > package["max_children"]:
+                raise QuoteError(f"El paquete admite máximo {package['max_children']} niños")
+            items.append({
+                "type": "package",
+                "id": package_id,
+                "name": package["name"],
+                "unit_price": package["price"],
+                "quantity": 1,
+                "subtotal": package["price"],
+            })
+
+        return {
+            "items": items,
+            "rental_days": rental_days,
+            "num_children": num_children,
+            "total_price": sum(item["subtotal"] for item in items),
+            "catalog_version": version,
+        }
+
+
+# Instancia global del servicio
+quote_service = QuoteService()
@@ -0,0 +1,172 @@
+"""
+Rate limiting para endpoints públicos y costosos
+(login, signup, forgot-password, contacto).
+
+Ventana deslizante por IP y por email. Backend en memoria para un solo
+worker y backend Redis (RATE_LIMIT_STORAGE_URL) compartido entre workers
+y nodos; en local sirve cualquier redis-server.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from functools import wraps
+from flask import request, jsonify
+
+
+# Límites por endpoint: (scope, máximo de intentos, ventana en segundos)
+RATE_LIMITS = {
+    "login": [("ip", 20, 60), ("email", 5, 60)],
+    "signup": [("ip", 5, 3600)],
+    "forgot_password": [("ip", 5, 900), ("email", 3, 3600)],
+    "contact": [("ip", 5, 600), ("email", 3, 600)],
+}
+
+
+class MemoryBackend:
+    """Ventana deslizante en memoria (un proceso), con LRU acotado a MAX_KEYS"""
+
+    MAX_KEYS = 10000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hits = OrderedDict()  # clave -> (ventana, deque de instantes), la más antigua primero
+
+    def hit(self, key, limit, window):
+        """Registra un intento. Devuelve (permitido, segundos para reintentar)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._hits.get(key)
+            if entry is None:
+                if len(self._hits) >= self.MAX_KEYS:
+                    self._prune(now)
+                entry = self._hits[key] = (window, deque())
+            else:
+                self._hits.move_to_end(key)
+            hits = entry[1]
+            while hits and hits[0] <= now - window:
+                hits.popleft()
+            if len(hits) >= limit:
+                return False, hits[0] + window - now
+            hits.append(now)
+            return True, 0
+
+    def _prune(self, now):
+        """Elimina claves vencidas (cada una según su propia ventana); si no alcanza, las menos usadas"""
+        for key in [k for k, (window, hits) in self._hits.items() if not hits or hits[-1] <= now - window]:
+            del self._hits[key]
+        # Todas activas (p. ej. rotando emails): descartar por LRU en vez de crecer sin límite
+        while len(self._hits) >= self.MAX_KEYS:
+            self._hits.popitem(last=False)
+
+    def reset(self):
+        with self._lock:
+            self._hits.clear()
+
+
+class RedisBackend:
+    """Ventana deslizante en Redis (sorted set + script Lua atómico)"""
+
+    SCRIPT = """
+    local key = KEYS[1]
+    local now = tonumber(ARGV[1])
+    local window = tonumber(ARGV[2])
+    local limit = tonumber(ARGV[3])
+    redis.call('ZREMRANGEBYSCORE', key, 0, now - window)
+    if redis.call('ZCARD', key) < limit then
+        redis.call('ZADD', key, now, ARGV[4])
+        redis.call('PEXPIRE', key, window)
+        return 0
+    end
+    local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+    return tonumber(oldest[2]) + window - now
+    """
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.client.ping()  # falla aquí (y se usa memoria) si el servidor no responde
+        self._script = self.client.register_script(self.SCRIPT)
+
+    def hit(self, key, limit, window):
+        now_ms = int(time.time() * 1000)
+        retry_ms = self._script(
+            keys=[f"ratelimit:{key}"],
+            args=[now_ms, int(window * 1000), limit, f"{now_ms}-{uuid.uuid4().hex[:8]}"],
+        )
+        retry_ms = int(retry_ms)
+        return retry_ms == 0, retry_ms / 1000
+
+    def reset(self):
+        for key in self.client.scan_iter("ratelimit:*"):
+            self.client.delete(key)
+
+
+class RateLimiter:
+    """Aplica RATE_LIMITS con el backend configurado"""
+
+    def __init__(self):
+        self.enabled = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() == "true"
+        self.backend = self._build_backend(os.environ.get("RATE_LIMIT_STORAGE_URL"))
+
+    def _build_backend(self, storage_url):
+        if storage_url:
+            try:
+                return RedisBackend(storage_url)
+            except Exception as error:
+                print(f"⚠️ Rate limit: Redis no disponible ({error}), usando memoria")
+        return MemoryBackend()
+
+    def check(self, name, email=None):
+        """
+        Registra el intento en cada límite del endpoint
+
+        Returns:
+            float: 0 si se permite, o segundos hasta poder reintentar
+        """
+        if not self.enabled:
+            return 0
+
+        identities = {"ip": request.remote_addr or "unknown", "email": email}
+        retry_after = 0
+        for scope, limit, window in RATE_LIMITS.get(name, []):
+            identity = identities.get(scope)
+            if not identity:
+                continue
+            try:
+                allowed, retry = self.backend.hit(f"{name}:{scope}:{identity}", limit, window)
+            except Exception as error:
+                # Si el backend compartido falla, no bloquear el login de todos
+                print(f"⚠️ Rate limit no disponible: {error}")
+                return 0
+            if not allowed:
+                retry_after = max(retry_after, retry)
+        return retry_after
+
+    def limit(self, name):
+        """Decorador: responde 429 antes de tocar bcrypt, la BD o SendGrid"""
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                body = request.get_json(silent=True)
+                email = body.get("email") if isinstance(body, dict) else None
+                email = email.strip().lower() if isinstance(email, str) and email.strip() else None
+
+                retry_after = self.check(name, email)
+                if retry_after:
+                    seconds = max(1, int(retry_after + 0.999))
+                    response = jsonify({
+                        "msg": "Demasiados intentos. Intenta nuevamente más tarde.",
+                        "retry_after": seconds,
+                    })
+                    response.status_code = 429
+                    response.headers["Retry-After"] = str(seconds)
+                    return response
+                return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+
+# Instancia global del servicio
+rate_limiter = RateLimiter()
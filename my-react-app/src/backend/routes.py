@@ -1,28 +1,127 @@
-from flask import Blueprint, request, jsonify, current_app
-from models import db, User, Event, Contact, Costume, AnimationPackage, Booking, PasswordReset
+from flask import (
+    Blueprint, Response, abort, request, jsonify, current_app, send_from_directory, stream_with_context, url_for
+)
+from models import (
+    db, User, Event, Contact, Costume, AnimationPackage, Booking, PasswordReset, EmailCampaign, MediaAsset,
+    CostumeStockDay, BookingArchive, EventArchive, ContactArchive, normalize_email
+)
+from sqlalchemy.exc import IntegrityError
 from flask_jwt_extended import (
     create_access_token,
     jwt_required,
-    get_jwt_identity
+    get_jwt_identity,
+    verify_jwt_in_request
 )
-from datetime import datetime, timedelta
-import secrets
 from email_service import email_service
 from google_calendar_service import google_calendar_service
+from utils import (
+    FieldsError, parse_fields, apply_fields, build_event_datetimes,
+    compact_requested, compact_fields, apply_compact, compact_payload
+)
+from quote_service import quote_service, QuoteError
+from rate_limiter import rate_limiter
+from metrics import metrics
+from campaign_service import campaign_service, CampaignError
+from scheduler_service import reminder_scheduler
+from idempotency import idempotency_service
+from calendar_service import booking_calendar, CalendarError
+from analytics_service import booking_analytics, AnalyticsError
+from media_service import media_service, MediaError
+from compression import compressor
+from outbound import outbound_dispatcher
+from batch import batch_dispatcher, BatchError
+from event_stream import event_broker, StreamAuthError
+from change_feed import change_feed, ChangeFeedError, CursorExpiredError
+from inventory_service import costume_inventory, StockError
+from archive_service import archive_service
+from account_service import account_service
+from ics_feed import ics_feed, FeedTokenError
+from cache import data_cache
+from schemas import (
+    SchemaError, parse_body, assigned_fields, SignupBody, LoginBody, ProfileBody, ForgotPasswordBody,
+    ResetPasswordBody, EventBody, EventUpdateBody, ContactBody, ContactUpdateBody, CostumeBody,
+    CostumeUpdateBody, PackageBody, PackageUpdateBody, QuoteBody, BookingBody, BookingUpdateBody,
+    CampaignBody, PurgeBody
+)
 
 api = Blueprint("api", __name__)
 
 
-def build_event_datetimes(date_str, time_str=None, duration_hours=2):
-    """Construye datetime inicio/fin para Google Calendar."""
-    base_date = datetime.strptime(date_str, "%Y-%m-%d").date()
-    if time_str:
-        base_time = datetime.strptime(time_str, "%H:%M").time()
-    else:
-        base_time = datetime.strptime("12:00", "%H:%M").time()
-    start_dt = datetime.combine(base_date, base_time)
-    end_dt = start_dt + timedelta(hours=max(1, int(duration_hours or 1)))
-    return start_dt, end_dt
+@api.errorhandler(SchemaError)
+def handle_schema_error(error):
+    """Body JSON ausente o mal formado (400) o fuera del esquema (422)"""
+    payload = {"msg": str(error)}
+    if error.field:
+        payload["field"] = error.field
+    return jsonify(payload), error.status
+
+
+@api.errorhandler(FieldsError)
+def handle_fields_error(error):
+    """Respuesta uniforme para ?fields= inválido"""
+    return jsonify({"msg": str(error)}), 400
+
+
+@api.errorhandler(QuoteError)
+def handle_quote_error(error):
+    """Respuesta uniforme para cotizaciones inválidas"""
+    return jsonify({"msg": str(error)}), 400
+
+
+@api.errorhandler(CalendarError)
+def handle_calendar_error(error):
+    """Respuesta uniforme para parámetros de calendario inválidos"""
+    return jsonify({"msg": str(error)}), 400
+
+
+@api.errorhandler(AnalyticsError)
+def handle_analytics_error(error):
+    """Respuesta uniforme para parámetros de analítica inválidos"""
+    return jsonify({"msg": str(error)}), 400
+
+
+@api.errorhandler(MediaError)
+def handle_media_error(error):
+    """Respuesta uniforme para imágenes inválidas"""
+    return jsonify({"msg": str(error)}), 400
+
+
+@api.errorhandler(BatchError)
+def handle_batch_error(error):
+    """Respuesta uniforme para batches inválidos"""
+    return jsonify({"msg": str(error)}), 400
+
+
+@api.errorhandler(StreamAuthError)
+def handle_stream_auth_error(error):
+    """Ticket de stream inválido"""
+    return jsonify({"msg": str(error)}), 401
+
+
+@api.errorhandler(ChangeFeedError)
+def handle_change_feed_error(error):
+    """Cursor inválido (400) o anterior a la retención (410)"""
+    status = 410 if isinstance(error, CursorExpiredError) else 400
+    return jsonify({"msg": str(error)}), status
+
+
+@api.errorhandler(StockError)
+def handle_stock_error(error):
+    """Sin unidades del disfraz: se descarta la reserva a medio escribir"""
+    db.session.rollback()
+    return jsonify({"msg": str(error)}), 409
+
+
+@api.errorhandler(FeedTokenError)
+def handle_feed_token_error(error):
+    """Token de feed inválido o revocado: no revelar si existió"""
+    return jsonify({"msg": str(error)}), 404
+
+
+@api.errorhandler(CampaignError)
+def handle_campaign_error(error):
+    """Respuesta uniforme para campañas inválidas"""
+    return jsonify({"msg": str(error)}), 400
 
 
 # ====================================
@@ -37,9 +136,11 @@ def admin_required(fn):
     @jwt_required()
     def wrapper(*args, **kwargs):
         user_id = int(get_jwt_identity())
-        user = User.query.get_or_404(user_id)
+        role = _cached_user(user_id, "role", lambda user: user.role)
+        if role is None:
+            abort(404)
         
-        if not user.is_admin:
+        if role != "admin":
             return jsonify({"msg": "Acceso denegado. Solo administradores."}), 403
         
         return fn(*args, **kwargs)
@@ -47,38 +148,43 @@ def admin_required(fn):
     return wrapper
 
 
+def _cached_user(user_id, name, serialize):
+    """Dato derivado del usuario, cacheado hasta que se invalide "user:<id>" o "users" (None si no existe)"""
+    def load():
+        user = db.session.get(User, user_id)
+        return serialize(user) if user else None
+    return data_cache.get_or_set(f"user:{user_id}:{name}", load, tags=[f"user:{user_id}", "users"])
+
+
 # ====================================
 # AUTENTICACIÓN
 # ====================================
 
 @api.route("/signup", methods=["POST"])
+@rate_limiter.limit("signup")
 def signup():
     """Registro de nuevos usuarios"""
+    body = parse_body(SignupBody)
     try:
-        body = request.get_json()
-
-        # Validaciones
-        if not body or not body.get("name") or not body.get("email") or not body.get("password"):
-            return jsonify({"msg": "Nombre, email y contraseña son requeridos"}), 400
-
-        # Verificar si el usuario ya existe
-        existing_user = User.query.filter_by(email=body["email"]).first()
-        if existing_user:
-            return jsonify({"msg": "El email ya está registrado"}), 409
-
-        # Crear usuario
+        # Crear usuario (el email se normaliza al asignarlo)
         user = User(
-            name=body["name"],
-            email=body["email"],
-            phone=body.get("phone", ""),
-            role=body.get("role", "parent")  # Por defecto parent
+            name=body.name,
+            email=body.email,
+            phone=body.phone,
+            role="parent"  # El registro público nunca crea admins
         )
         
         # El setter de password automáticamente hace el hash
-        user.password = body["password"]
+        user.password = body.password
 
         db.session.add(user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # El índice único de email decide (sin SELECT previo que compita con otro signup)
+            db.session.rollback()
+            return jsonify({"msg": "El email ya está registrado"}), 409
+        data_cache.invalidate("stats")
 
         return jsonify({
             "msg": "Usuario creado exitosamente",
@@ -92,16 +198,13 @@ def signup():
 
 
 @api.route('/login', methods=['POST'])
+@rate_limiter.limit("login")
 def login():
     """Login de usuarios"""
+    body = parse_body(LoginBody)
     try:
-        body = request.get_json()
-        
-        email = body.get('email')
-        password = body.get('password')
-
-        if not email or not password:
-            return jsonify({"msg": "Email y contraseña requeridos"}), 400
+        email = normalize_email(body.email)
+        password = body.password
 
         # Buscar usuario
         user = User.query.filter_by(email=email).first()
@@ -130,10 +233,11 @@ def login():
 @jwt_required()
 def profile():
     """Obtener perfil del usuario autenticado"""
-    user_id = int(get_jwt_identity())
-    user = User.query.get_or_404(user_id)
+    data = _cached_user(int(get_jwt_identity()), "profile", lambda user: user.serialize())
+    if data is None:
+        abort(404)
 
-    return jsonify(user.serialize()), 200
+    return jsonify(data), 200
 
 
 @api.route("/profile", methods=["PUT"])
@@ -142,19 +246,20 @@ def update_profile():
     """Actualizar perfil del usuario"""
     user_id = int(get_jwt_identity())
     user = User.query.get_or_404(user_id)
-    body = request.get_json()
+    body = parse_body(ProfileBody)
 
     # Actualizar campos permitidos
-    if body.get("name"):
-        user.name = body["name"]
-    if body.get("phone"):
-        user.phone = body["phone"]
+    if body.name:
+        user.name = body.name
+    if body.phone:
+        user.phone = body.phone
     
     # Cambiar contraseña si se proporciona
-    if body.get("new_password"):
-        user.password = body["new_password"]
+    if body.new_password:
+        user.password = body.new_password
 
     db.session.commit()
+    data_cache.invalidate(f"user:{user_id}")
 
     return jsonify({
         "msg": "Perfil actualizado",
@@ -163,13 +268,10 @@ def update_profile():
 
 
 @api.route("/forgot-password", methods=["POST"])
+@rate_limiter.limit("forgot_password")
 def forgot_password():
     """Solicitar recuperación de contraseña"""
-    body = request.get_json()
-    email = body.get("email")
-    
-    if not email:
-        return jsonify({"msg": "Email requerido"}), 400
+    email = normalize_email(parse_body(ForgotPasswordBody).email)
     
     user = User.query.filter_by(email=email).first()
     
@@ -177,37 +279,23 @@ def forgot_password():
         # Por seguridad, no revelar si el email existe
         return jsonify({"msg": "Si el email existe, recibirás un correo de recuperación"}), 200
     
-    # Generar token único
-    token = secrets.token_urlsafe(32)
-    expires_at = datetime.utcnow() + timedelta(hours=1)
-    
-    # Guardar token
-    reset = PasswordReset(
-        user_id=user.id,
-        token=token,
-        expires_at=expires_at
-    )
-    db.session.add(reset)
+    # Generar token único (se guarda solo su hash) e invalidar los anteriores
+    token = PasswordReset.issue(user.id)
     db.session.commit()
 
-    # Intentar enviar correo de recuperación (no romper flujo si falla)
-    email_sent = False
-    try:
-        email_sent = email_service.send_password_reset(user.email, token)
-    except Exception as e:
-        print(f"⚠️ Error enviando email de recuperación: {str(e)}")
+    # Enviar correo de recuperación después de responder (no romper flujo si falla);
+    # así el tiempo de respuesta tampoco revela si el email existe
+    outbound_dispatcher.submit("password_reset_email", email_service.send_password_reset, user.email, token)
 
     payload = {
         "msg": "Si el email existe, recibirás un correo de recuperación"
     }
 
-    # Ayuda de desarrollo para probar UX cuando SendGrid no entrega correo.
-    if (not email_sent) and current_app.config.get("DEBUG"):
+    # Ayuda de desarrollo para probar UX cuando SendGrid no está configurado.
+    if current_app.config.get("DEBUG") and not email_service.client:
         frontend_url = current_app.config.get("FRONTEND_URL", "http://localhost:5173")
         payload["dev_reset_url"] = f"{frontend_url}/reset-password?token={token}"
         payload["email_sent"] = False
-    elif current_app.config.get("DEBUG"):
-        payload["email_sent"] = True
 
     return jsonify(payload), 200
 
@@ -215,22 +303,17 @@ def forgot_password():
 @api.route("/reset-password", methods=["POST"])
 def reset_password():
     """Restablecer contraseña con token"""
-    body = request.get_json()
-    token = body.get("token")
-    new_password = body.get("new_password")
-    
-    if not token or not new_password:
-        return jsonify({"msg": "Token y nueva contraseña requeridos"}), 400
+    body = parse_body(ResetPasswordBody)
     
     # Buscar token válido
-    reset = PasswordReset.query.filter_by(token=token, used=False).first()
+    reset = PasswordReset.find_valid(body.token)
     
-    if not reset or reset.expires_at < datetime.utcnow():
+    if not reset:
         return jsonify({"msg": "Token inválido o expirado"}), 400
     
     # Actualizar contraseña
     user = User.query.get(reset.user_id)
-    user.password = new_password
+    user.password = body.new_password
     
     # Marcar token como usado
     reset.used = True
@@ -261,7 +344,11 @@ def get_events():
         else:
             events = Event.query.filter_by(user_id=user_id).all()
         
-        return jsonify([e.serialize() for e in events]), 200
+        result = [e.serialize() for e in events]
+        if archive_service.requested():
+            scope = [] if user.is_admin else [EventArchive.user_id == user_id]
+            result.extend(archive_service.serialize(archive_service.archived(Event, *scope)))
+        return jsonify(result), 200
         
     except Exception as e:
         print(f"❌ ERROR: {str(e)}")
@@ -270,44 +357,47 @@ def get_events():
         return jsonify({"msg": str(e)}), 500
 
 
+def _sync_event_to_calendar(event_id, user_id):
+    """Crea el evento de Google Calendar de un evento de usuario (tarea saliente)"""
+    event = db.session.get(Event, event_id)
+    user = db.session.get(User, user_id)
+    start_dt, end_dt = build_event_datetimes(event.date, event.time, duration_hours=2)
+    description = event.description or ""
+    if user:
+        description += f"\n\nUsuario: {user.name} ({user.email})"
+    google_calendar_service.create_event(
+        summary=f"Evento DiverKids: {event.title}",
+        description=description.strip(),
+        start_dt=start_dt,
+        end_dt=end_dt,
+        location=event.location or "",
+    )
+
+
 @api.route("/events", methods=["POST"])
 @jwt_required()
 def create_event():
     """Crear nuevo evento"""
     user_id = int(get_jwt_identity())
-    body = request.get_json()
-
-    if not body.get("title") or not body.get("date"):
-        return jsonify({"msg": "Título y fecha son requeridos"}), 400
+    body = parse_body(EventBody)
 
     event = Event(
-        title=body["title"],
-        date=body["date"],
-        time=body.get("time"),
-        location=body.get("location"),
-        description=body.get("description", ""),
+        title=body.title,
+        date=body.date,
+        time=body.time,
+        location=body.location,
+        description=body.description,
         user_id=user_id
     )
 
     db.session.add(event)
+    db.session.flush()
+    change_feed.record("event", event)
     db.session.commit()
 
-    # Sincronizar opcionalmente con Google Calendar
-    try:
-        user = User.query.get(user_id)
-        start_dt, end_dt = build_event_datetimes(event.date, event.time, duration_hours=2)
-        description = event.description or ""
-        if user:
-            description += f"\n\nUsuario: {user.name} ({user.email})"
-        google_calendar_service.create_event(
-            summary=f"Evento DiverKids: {event.title}",
-            description=description.strip(),
-            start_dt=start_dt,
-            end_dt=end_dt,
-            location=event.location or "",
-        )
-    except Exception as error:
-        print(f"⚠️ No se pudo sincronizar evento con Google Calendar: {error}")
+    # Sincronizar opcionalmente con Google Calendar (después de responder)
+    if google_calendar_service.enabled:
+        outbound_dispatcher.submit("event_calendar_sync", _sync_event_to_calendar, event.id, user_id)
 
     return jsonify(event.serialize()), 201
 
@@ -339,15 +429,10 @@ def update_event(id):
     if event.user_id != user_id and not user.is_admin:
         return jsonify({"msg": "No autorizado"}), 403
     
-    body = request.get_json()
-
-    event.title = body.get("title", event.title)
-    event.date = body.get("date", event.date)
-    event.time = body.get("time", event.time)
-    event.location = body.get("location", event.location)
-    event.description = body.get("description", event.description)
-    event.status = body.get("status", event.status)
+    for name, value in assigned_fields(parse_body(EventUpdateBody)).items():
+        setattr(event, name, value)
 
+    change_feed.record("event", event)
     db.session.commit()
     return jsonify(event.serialize()), 200
 
@@ -364,6 +449,7 @@ def delete_event(id):
     if event.user_id != user_id and not user.is_admin:
         return jsonify({"msg": "No autorizado"}), 403
     
+    change_feed.record("event", event, action="delete")
     db.session.delete(event)
     db.session.commit()
     return jsonify({"msg": "Evento eliminado"}), 200
@@ -373,62 +459,37 @@ def delete_event(id):
 # CONTACT (Mensajes de contacto)
 # ====================================
 
+def _send_contact_notification(contact_id):
+    """Notifica por email un mensaje de contacto (tarea saliente)"""
+    contact = db.session.get(Contact, contact_id)
+    if email_service.send_contact_notification(contact, to_email="diverkidsinfo@gmail.com"):
+        print(f"✅ Email enviado correctamente a diverkidsinfo@gmail.com")
+    else:
+        print(f"⚠️ No se pudo enviar el email")
+
+
 @api.route("/contact", methods=["POST"])
+@rate_limiter.limit("contact")
+@idempotency_service.idempotent("contact")
 def create_contact():
     """Crear mensaje de contacto (público)"""
-    body = request.get_json()
-
-    if not body or not body.get("name") or not body.get("email") or not body.get("message"):
-        return jsonify({"msg": "Todos los campos son requeridos"}), 400
+    body = parse_body(ContactBody)
 
     # Guardar en base de datos
     contact = Contact(
-        name=body["name"],
-        email=body["email"],
-        phone=body.get("phone"),
-        message=body["message"]
+        name=body.name,
+        email=body.email,
+        phone=body.phone,
+        message=body.message
     )
 
     db.session.add(contact)
     db.session.commit()
+    data_cache.invalidate("stats")
     
-    # ✅ Enviar notificación por email usando SendGrid
-    try:
-        html_content = f"""
-        <div style="font-family: Arial, sans-serif; padding: 20px; background-color: #f4f4f4;">
-            <div style="max-width: 600px; margin: 0 auto; background-color: white; padding: 30px; border-radius: 10px;">
-                <h2 style="color: #6B46C1;">📩 Nuevo mensaje de contacto - DiverKids</h2>
-                <hr style="border: 1px solid #eee; margin: 20px 0;">
-                <p><strong>Nombre:</strong> {body['name']}</p>
-                <p><strong>Email:</strong> {body['email']}</p>
-                <p><strong>Teléfono:</strong> {body.get('phone', 'No proporcionado')}</p>
-                <p><strong>Mensaje:</strong></p>
-                <div style="background-color: #f9f9f9; padding: 15px; border-left: 4px solid #6B46C1; margin: 15px 0;">
-                    {body['message']}
-                </div>
-                <hr style="border: 1px solid #eee; margin: 20px 0;">
-                <p style="color: #666; font-size: 12px;">
-                    Este mensaje fue enviado desde el formulario de contacto de DiverKids.<br>
-                    Fecha: {contact.created_at.strftime('%d/%m/%Y %H:%M')}
-                </p>
-            </div>
-        </div>
-        """
-        
-        result = email_service.send_email(
-            to_email="diverkidsinfo@gmail.com",
-            subject=f"🔔 Nuevo mensaje de {body['name']} - DiverKids",
-            html_content=html_content
-        )
-        
-        if result:
-            print(f"✅ Email enviado correctamente a diverkidsinfo@gmail.com")
-        else:
-            print(f"⚠️ No se pudo enviar el email")
-        
-    except Exception as e:
-        print(f"❌ Error al enviar email: {str(e)}")
-        # No detener el proceso si falla el email, el mensaje ya se guardó en DB
+    # ✅ Enviar notificación por email usando SendGrid (después de responder;
+    # si falla, el mensaje ya quedó guardado en la BD)
+    outbound_dispatcher.submit("contact_notification", _send_contact_notification, contact.id)
 
     return jsonify({
         "msg": "Mensaje enviado exitosamente. Te contactaremos pronto.",
@@ -441,7 +502,11 @@ def create_contact():
 def get_contacts():
     """Obtener todos los mensajes de contacto (solo admin)"""
     contacts = Contact.query.order_by(Contact.created_at.desc()).all()
-    return jsonify([c.serialize() for c in contacts]), 200
+    result = [c.serialize() for c in contacts]
+    if archive_service.requested():
+        archived = archive_service.archived(Contact, order_by=ContactArchive.created_at.desc())
+        result.extend(archive_service.serialize(archived))
+    return jsonify(result), 200
 
 
 @api.route("/contact/<int:id>", methods=["PUT"])
@@ -449,10 +514,12 @@ def get_contacts():
 def update_contact(id):
     """Actualizar estado del mensaje (solo admin)"""
     contact = Contact.query.get_or_404(id)
-    body = request.get_json()
+    body = parse_body(ContactUpdateBody)
     
-    contact.status = body.get("status", contact.status)
+    if body.status:
+        contact.status = body.status
     db.session.commit()
+    data_cache.invalidate("stats")
     
     return jsonify(contact.serialize()), 200
 
@@ -464,6 +531,7 @@ def delete_contact(id):
     contact = Contact.query.get_or_404(id)
     db.session.delete(contact)
     db.session.commit()
+    data_cache.invalidate("stats")
 
     return jsonify({"msg": "Mensaje eliminado"}), 200
 
@@ -473,52 +541,63 @@ def delete_contact(id):
 # ====================================
 
 @api.route("/costumes", methods=["GET"])
+@compressor.cached
 def get_costumes():
     """Obtener catálogo de disfraces (público)"""
     # Filtros opcionales
     category = request.args.get('category')
-    available = request.args.get('available')
+    available = request.args.get('available') == 'true'
+    fields = parse_fields("costume")
     
-    query = Costume.query
+    def load():
+        query = apply_fields(Costume.query, "costume", fields)
+        if category:
+            query = query.filter_by(category=category)
+        if available:
+            query = query.filter_by(available=True)
+        return [c.serialize(fields) for c in query.all()]
     
-    if category:
-        query = query.filter_by(category=category)
-    if available == 'true':
-        query = query.filter_by(available=True)
-    
-    costumes = query.all()
-    return jsonify([c.serialize() for c in costumes]), 200
+    key = f"costumes:{category or ''}:{available}:{','.join(fields or [])}"
+    return jsonify(data_cache.get_or_set(key, load, tags=["catalog"])), 200
 
 
 @api.route("/costumes/<int:id>", methods=["GET"])
+@compressor.cached
 def get_costume(id):
     """Obtener detalle de un disfraz"""
-    costume = Costume.query.get_or_404(id)
-    return jsonify(costume.serialize()), 200
+    fields = parse_fields("costume")
+
+    def load():
+        costume = apply_fields(Costume.query, "costume", fields).filter_by(id=id).first()
+        return costume.serialize(fields) if costume else None
+
+    key = f"costume:{id}:{','.join(fields or [])}"
+    data = data_cache.get_or_set(key, load, tags=["catalog", f"costume:{id}"])
+    if data is None:
+        abort(404)
+    return jsonify(data), 200
 
 
 @api.route("/costumes", methods=["POST"])
 @admin_required
 def create_costume():
     """Crear nuevo disfraz (solo admin)"""
-    body = request.get_json()
-
-    if not body.get("name") or not body.get("price_per_day"):
-        return jsonify({"msg": "Nombre y precio son requeridos"}), 400
+    body = parse_body(CostumeBody)
 
     costume = Costume(
-        name=body["name"],
-        description=body.get("description"),
-        category=body.get("category"),
-        size=body.get("size"),
-        price_per_day=body["price_per_day"],
-        image_url=body.get("image_url"),
-        available=body.get("available", True),
-        stock_quantity=body.get("stock_quantity", 1)
+        name=body.name,
+        description=body.description,
+        category=body.category,
+        size=body.size,
+        price_per_day=body.price_per_day,
+        image_url=body.image_url,
+        available=body.available,
+        stock_quantity=body.stock_quantity
     )
 
     db.session.add(costume)
     db.session.commit()
+    data_cache.invalidate("catalog")
 
     return jsonify(costume.serialize()), 201
 
@@ -528,18 +607,20 @@ def create_costume():
 def update_costume(id):
     """Actualizar disfraz (solo admin)"""
     costume = Costume.query.get_or_404(id)
-    body = request.get_json()
-
-    costume.name = body.get("name", costume.name)
-    costume.description = body.get("description", costume.description)
-    costume.category = body.get("category", costume.category)
-    costume.size = body.get("size", costume.size)
-    costume.price_per_day = body.get("price_per_day", costume.price_per_day)
-    costume.image_url = body.get("image_url", costume.image_url)
-    costume.available = body.get("available", costume.available)
-    costume.stock_quantity = body.get("stock_quantity", costume.stock_quantity)
+    changes = assigned_fields(parse_body(CostumeUpdateBody))
+
+    if changes.get("image_url", costume.image_url) != costume.image_url:
+        # URL externa manual: deja de seguir la imagen subida
+        costume.image_asset_id = None
+        costume.image_variants = None
+    if "category" in changes:
+        # Los rollups guardan la categoría al escribir la reserva
+        booking_analytics.recategorize(id, costume.category, changes["category"])
+    for name, value in changes.items():
+        setattr(costume, name, value)
 
     db.session.commit()
+    data_cache.invalidate("catalog", f"costume:{id}")
     return jsonify(costume.serialize()), 200
 
 
@@ -548,8 +629,10 @@ def update_costume(id):
 def delete_costume(id):
     """Eliminar disfraz (solo admin)"""
     costume = Costume.query.get_or_404(id)
+    CostumeStockDay.query.filter_by(costume_id=id).delete(synchronize_session=False)
     db.session.delete(costume)
     db.session.commit()
+    data_cache.invalidate("catalog", f"costume:{id}")
     return jsonify({"msg": "Disfraz eliminado"}), 200
 
 
@@ -558,48 +641,59 @@ def delete_costume(id):
 # ====================================
 
 @api.route("/packages", methods=["GET"])
+@compressor.cached
 def get_packages():
     """Obtener paquetes de animación (público)"""
-    available = request.args.get('available')
-    
-    query = AnimationPackage.query
+    available = request.args.get('available') == 'true'
+    fields = parse_fields("package")
     
-    if available == 'true':
-        query = query.filter_by(available=True)
+    def load():
+        query = apply_fields(AnimationPackage.query, "package", fields)
+        if available:
+            query = query.filter_by(available=True)
+        return [p.serialize(fields) for p in query.all()]
     
-    packages = query.all()
-    return jsonify([p.serialize() for p in packages]), 200
+    key = f"packages:{available}:{','.join(fields or [])}"
+    return jsonify(data_cache.get_or_set(key, load, tags=["catalog"])), 200
 
 
 @api.route("/packages/<int:id>", methods=["GET"])
+@compressor.cached
 def get_package(id):
     """Obtener detalle de un paquete"""
-    package = AnimationPackage.query.get_or_404(id)
-    return jsonify(package.serialize()), 200
+    fields = parse_fields("package")
+
+    def load():
+        package = apply_fields(AnimationPackage.query, "package", fields).filter_by(id=id).first()
+        return package.serialize(fields) if package else None
+
+    key = f"package:{id}:{','.join(fields or [])}"
+    data = data_cache.get_or_set(key, load, tags=["catalog", f"package:{id}"])
+    if data is None:
+        abort(404)
+    return jsonify(data), 200
 
 
 @api.route("/packages", methods=["POST"])
 @admin_required
 def create_package():
     """Crear paquete de animación (solo admin)"""
-    body = request.get_json()
-
-    if not body.get("name") or not body.get("price"):
-        return jsonify({"msg": "Nombre y precio son requeridos"}), 400
+    body = parse_body(PackageBody)
 
     package = AnimationPackage(
-        name=body["name"],
-        description=body.get("description"),
-        duration_hours=body.get("duration_hours", 2),
-        price=body["price"],
-        includes=body.get("includes"),
-        max_children=body.get("max_children"),
-        image_url=body.get("image_url"),
-        available=body.get("available", True)
+        name=body.name,
+        description=body.description,
+        duration_hours=body.duration_hours,
+        price=body.price,
+        includes=body.includes,
+        max_children=body.max_children,
+        image_url=body.image_url,
+        available=body.available
     )
 
     db.session.add(package)
     db.session.commit()
+    data_cache.invalidate("catalog")
 
     return jsonify(package.serialize()), 201
 
@@ -609,18 +703,17 @@ def create_package():
 def update_package(id):
     """Actualizar paquete (solo admin)"""
     package = AnimationPackage.query.get_or_404(id)
-    body = request.get_json()
+    changes = assigned_fields(parse_body(PackageUpdateBody))
 
-    package.name = body.get("name", package.name)
-    package.description = body.get("description", package.description)
-    package.duration_hours = body.get("duration_hours", package.duration_hours)
-    package.price = body.get("price", package.price)
-    package.includes = body.get("includes", package.includes)
-    package.max_children = body.get("max_children", package.max_children)
-    package.image_url = body.get("image_url", package.image_url)
-    package.available = body.get("available", package.available)
+    if changes.get("image_url", package.image_url) != package.image_url:
+        # URL externa manual: deja de seguir la imagen subida
+        package.image_asset_id = None
+        package.image_variants = None
+    for name, value in changes.items():
+        setattr(package, name, value)
 
     db.session.commit()
+    data_cache.invalidate("catalog", f"package:{id}")
     return jsonify(package.serialize()), 200
 
 
@@ -631,9 +724,27 @@ def delete_package(id):
     package = AnimationPackage.query.get_or_404(id)
     db.session.delete(package)
     db.session.commit()
+    data_cache.invalidate("catalog", f"package:{id}")
     return jsonify({"msg": "Paquete eliminado"}), 200
 
 
+# ====================================
+# COTIZACIONES
+# ====================================
+
+@api.route("/quote", methods=["POST"])
+def create_quote():
+    """Cotizar disfraz/paquete en el servidor (público)"""
+    body = parse_body(QuoteBody)
+    quote = quote_service.quote(
+        costume_id=body.costume_id,
+        package_id=body.package_id,
+        rental_days=body.rental_days,
+        num_children=body.num_children,
+    )
+    return jsonify(quote), 200
+
+
 # ====================================
 # BOOKINGS (Reservas)
 # ====================================
@@ -644,103 +755,166 @@ def get_bookings():
     """Obtener reservas del usuario autenticado"""
     user_id = int(get_jwt_identity())
     user = User.query.get(user_id)
+    fields = parse_fields("booking")
+    compact = compact_requested()
+    if compact:
+        columns, kinds = compact_fields(fields)
+        query = apply_compact(Booking.query, columns)
+    else:
+        query = apply_fields(Booking.query, "booking", fields)
     
     # Si es admin, ver todas las reservas
     if user.is_admin:
-        bookings = Booking.query.order_by(Booking.event_date.desc()).all()
+        bookings = query.order_by(Booking.event_date.desc()).all()
     else:
-        bookings = Booking.query.filter_by(user_id=user_id).order_by(Booking.event_date.desc()).all()
+        bookings = query.filter_by(user_id=user_id).order_by(Booking.event_date.desc()).all()
     
-    return jsonify([b.serialize() for b in bookings]), 200
+    archived = []
+    if archive_service.requested():
+        # Las archivadas son anteriores al corte: van después de las calientes
+        scope = [] if user.is_admin else [BookingArchive.user_id == user_id]
+        archived = archive_service.archived(Booking, *scope, order_by=BookingArchive.event_date.desc())
+
+    if compact:
+        return jsonify(compact_payload(bookings, columns, kinds, archived)), 200
+    result = [b.serialize(fields) for b in bookings]
+    result.extend(archive_service.serialize(archived, fields))
+    return jsonify(result), 200
+
+
+@api.route("/bookings/calendar", methods=["GET"])
+@admin_required
+def get_bookings_calendar():
+    """Resumen por día de un mes: conteos por estado/tipo y revenue (solo admin)"""
+    year, month = booking_calendar.parse_month(request.args.get("month"))
+    return jsonify(booking_calendar.month_summary(year, month)), 200
+
+
+@api.route("/calendar/feeds", methods=["GET"])
+@jwt_required()
+def get_calendar_feeds():
+    """URLs .ics para suscribirse desde cualquier calendario (admin: también la agenda completa)"""
+    user = User.query.get_or_404(int(get_jwt_identity()))
+    secret_key = current_app.config["SECRET_KEY"]
+    scopes = ("user", "all") if user.is_admin else ("user",)
+    return jsonify({
+        scope: url_for("api.calendar_feed", token=ics_feed.issue_token(secret_key, user, scope), _external=True)
+        for scope in scopes
+    }), 200
+
+
+@api.route("/calendar/feeds/<token>.ics", methods=["GET"])
+def calendar_feed(token):
+    """Feed iCalendar firmado (sin Authorization: el token va en la URL)"""
+    user, scope = ics_feed.verify_token(current_app.config["SECRET_KEY"], token)
+    etag = ics_feed.etag(user, scope)
+    headers = {"ETag": f'"{etag}"', "Cache-Control": f"private, max-age={ics_feed.max_age}"}
+    if request.if_none_match.contains_weak(etag):
+        return Response(status=304, headers=headers)
+    return Response(
+        stream_with_context(ics_feed.stream(user, scope)),
+        mimetype="text/calendar", headers={**headers, "Content-Disposition": 'inline; filename="diverkids.ics"'},
+    )
+
+
+def _sync_booking_to_calendar(booking_id):
+    """Crea el evento de Google Calendar de una reserva (tarea saliente)"""
+    booking = db.session.get(Booking, booking_id)
+    user = booking.user
+    selected_costume = booking.costume
+    selected_package = booking.package
+
+    if booking.booking_type == "both":
+        summary = f"Reserva DiverKids: {selected_package.name if selected_package else 'Paquete'} + {selected_costume.name if selected_costume else 'Disfraz'}"
+    elif booking.booking_type == "package":
+        summary = f"Reserva DiverKids: {selected_package.name if selected_package else 'Paquete de Animación'}"
+    else:
+        summary = f"Reserva DiverKids: {selected_costume.name if selected_costume else 'Disfraz'}"
+    if not summary.strip():
+        summary = f"Reserva DiverKids #{booking.id}"
+
+    duration = selected_package.duration_hours if selected_package and selected_package.duration_hours else 2
+    start_dt, end_dt = build_event_datetimes(
+        booking.event_date.isoformat(),
+        booking.event_time,
+        duration_hours=duration,
+    )
+
+    location_parts = [booking.event_location or "", booking.event_address or ""]
+    location = ", ".join([part for part in location_parts if part]).strip()
+
+    description_lines = [
+        f"Reserva ID: {booking.id}",
+        f"Tipo de reserva: {booking.booking_type}",
+        f"Usuario: {user.name if user else 'N/A'} ({user.email if user else 'N/A'})",
+        f"Fecha: {booking.event_date.isoformat()}",
+        f"Hora: {booking.event_time or '12:00'}",
+        f"Niños: {booking.num_children or 'N/A'}",
+        f"Total: ${booking.total_price}",
+    ]
+    if selected_package:
+        description_lines.append(f"Paquete: {selected_package.name}")
+    if selected_costume:
+        description_lines.append(f"Disfraz: {selected_costume.name}")
+    if booking.special_requests:
+        description_lines.append(f"Solicitudes especiales: {booking.special_requests}")
+
+    google_calendar_service.create_event(
+        summary=summary,
+        description="\n".join(description_lines),
+        start_dt=start_dt,
+        end_dt=end_dt,
+        location=location,
+    )
 
 
 @api.route("/bookings", methods=["POST"])
 @jwt_required()
+@idempotency_service.idempotent("bookings")
 def create_booking():
     """Crear nueva reserva"""
     user_id = int(get_jwt_identity())
-    body = request.get_json()
-
-    # Validaciones
-    if not body.get("event_date") or not body.get("booking_type"):
-        return jsonify({"msg": "Fecha y tipo de reserva son requeridos"}), 400
-
-    # Convertir fecha string a objeto date
-    try:
-        event_date = datetime.strptime(body["event_date"], "%Y-%m-%d").date()
-    except:
-        return jsonify({"msg": "Formato de fecha inválido (usar YYYY-MM-DD)"}), 400
-
-    costume_id = int(body.get("costume_id")) if body.get("costume_id") else None
-    package_id = int(body.get("package_id")) if body.get("package_id") else None
+    body = parse_body(BookingBody)
+
+    # El total lo calcula el servidor; se ignora total_price del cliente
+    quote = quote_service.quote(
+        costume_id=body.costume_id,
+        package_id=body.package_id,
+        rental_days=body.rental_days,
+        num_children=body.num_children,
+    )
+    costume_id = next((item["id"] for item in quote["items"] if item["type"] == "costume"), None)
+    package_id = next((item["id"] for item in quote["items"] if item["type"] == "package"), None)
 
     booking = Booking(
         user_id=user_id,
-        booking_type=body["booking_type"],
-        event_date=event_date,
-        event_time=body.get("event_time"),
-        event_location=body.get("event_location"),
-        event_address=body.get("event_address"),
-        num_children=body.get("num_children"),
+        booking_type=body.booking_type,
+        event_date=body.event_date,
+        event_time=body.event_time,
+        event_location=body.event_location,
+        event_address=body.event_address,
+        num_children=body.num_children,
         costume_id=costume_id,
         package_id=package_id,
-        special_requests=body.get("special_requests"),
-        total_price=body.get("total_price", 0)
+        special_requests=body.special_requests,
+        total_price=quote["total_price"]
     )
 
     db.session.add(booking)
+    db.session.flush()
+    reminder_scheduler.schedule_booking(booking)
+    booking_analytics.apply(booking_analytics.contribution(booking))
+    change_feed.record("booking", booking)
+    hold = costume_inventory.hold(booking)
+    if hold:
+        costume_inventory.reserve(*hold)  # último paso: el UPDATE condicional retiene la fila hasta el commit
     db.session.commit()
+    booking_calendar.invalidate(booking.event_date)
+    data_cache.invalidate("stats")
 
-    # Sincronizar opcionalmente con Google Calendar
-    try:
-        user = User.query.get(user_id)
-        selected_costume = Costume.query.get(costume_id) if costume_id else None
-        selected_package = AnimationPackage.query.get(package_id) if package_id else None
-
-        if booking.booking_type == "both":
-            summary = f"Reserva DiverKids: {selected_package.name if selected_package else 'Paquete'} + {selected_costume.name if selected_costume else 'Disfraz'}"
-        elif booking.booking_type == "package":
-            summary = f"Reserva DiverKids: {selected_package.name if selected_package else 'Paquete de Animación'}"
-        else:
-            summary = f"Reserva DiverKids: {selected_costume.name if selected_costume else 'Disfraz'}"
-        if not summary.strip():
-            summary = f"Reserva DiverKids #{booking.id}"
-
-        duration = selected_package.duration_hours if selected_package and selected_package.duration_hours else 2
-        start_dt, end_dt = build_event_datetimes(
-            booking.event_date.isoformat(),
-            booking.event_time,
-            duration_hours=duration,
-        )
-
-        location_parts = [booking.event_location or "", booking.event_address or ""]
-        location = ", ".join([part for part in location_parts if part]).strip()
-
-        description_lines = [
-            f"Reserva ID: {booking.id}",
-            f"Tipo de reserva: {booking.booking_type}",
-            f"Usuario: {user.name if user else 'N/A'} ({user.email if user else 'N/A'})",
-            f"Fecha: {booking.event_date.isoformat()}",
-            f"Hora: {booking.event_time or '12:00'}",
-            f"Niños: {booking.num_children or 'N/A'}",
-            f"Total: ${booking.total_price}",
-        ]
-        if selected_package:
-            description_lines.append(f"Paquete: {selected_package.name}")
-        if selected_costume:
-            description_lines.append(f"Disfraz: {selected_costume.name}")
-        if booking.special_requests:
-            description_lines.append(f"Solicitudes especiales: {booking.special_requests}")
-
-        google_calendar_service.create_event(
-            summary=summary,
-            description="\n".join(description_lines),
-            start_dt=start_dt,
-            end_dt=end_dt,
-            location=location,
-        )
-    except Exception as error:
-        print(f"⚠️ No se pudo sincronizar reserva con Google Calendar: {error}")
+    # Sincronizar opcionalmente con Google Calendar (después de responder)
+    if google_calendar_service.enabled:
+        outbound_dispatcher.submit("booking_calendar_sync", _sync_booking_to_calendar, booking.id)
 
     return jsonify(booking.serialize()), 201
 
@@ -750,14 +924,31 @@ def create_booking():
 def get_booking(id):
     """Obtener detalle de una reserva"""
     user_id = int(get_jwt_identity())
-    booking = Booking.query.get_or_404(id)
+    fields = parse_fields("booking")
+    compact = compact_requested()
+    if compact:
+        columns, kinds = compact_fields(fields)
+        query = apply_compact(Booking.query, columns)
+    else:
+        query = apply_fields(Booking.query, "booking", fields)
+    booking = query.filter_by(id=id).first()
+    archived = booking is None and archive_service.requested()
+    if archived:
+        booking = db.session.get(BookingArchive, id)
+    if booking is None:
+        return jsonify({"msg": "Reserva no encontrada"}), 404
     user = User.query.get(user_id)
     
     # Verificar que el usuario sea dueño o admin
     if booking.user_id != user_id and not user.is_admin:
         return jsonify({"msg": "No autorizado"}), 403
     
-    return jsonify(booking.serialize()), 200
+    if compact:
+        payload = compact_payload([] if archived else [booking], columns, kinds, [booking] if archived else ())
+        return jsonify({"data": payload["data"][0], "included": payload["included"]}), 200
+    if archived:
+        return jsonify(archive_service.serialize([booking], fields)[0]), 200
+    return jsonify(booking.serialize(fields)), 200
 
 
 @api.route("/bookings/<int:id>", methods=["PUT"])
@@ -767,26 +958,43 @@ def update_booking(id):
     user_id = int(get_jwt_identity())
     booking = Booking.query.get_or_404(id)
     user = User.query.get(user_id)
-    body = request.get_json()
+    body = parse_body(BookingUpdateBody)
     
     # Verificar autorización
     if booking.user_id != user_id and not user.is_admin:
         return jsonify({"msg": "No autorizado"}), 403
     
+    schedule_before = (booking.event_date, booking.event_time, booking.status, booking.payment_status)
+    rollup_before = booking_analytics.contribution(booking)
+    hold_before = costume_inventory.hold(booking)
+    
     # Solo admin puede cambiar ciertos campos
     if user.is_admin:
-        booking.status = body.get("status", booking.status)
-        booking.payment_status = body.get("payment_status", booking.payment_status)
+        if body.status:
+            booking.status = body.status
+        if body.payment_status:
+            booking.payment_status = body.payment_status
     
     # Usuario puede actualizar detalles del evento
-    if body.get("event_time"):
-        booking.event_time = body["event_time"]
-    if body.get("event_location"):
-        booking.event_location = body["event_location"]
-    if body.get("special_requests"):
-        booking.special_requests = body["special_requests"]
+    if body.event_date:
+        booking.event_date = body.event_date
+    if body.event_time:
+        booking.event_time = body.event_time
+    if body.event_location:
+        booking.event_location = body.event_location
+    if body.special_requests:
+        booking.special_requests = body.special_requests
+    
+    # Recalcular recordatorios solo de esta reserva si cambió algo relevante
+    if schedule_before != (booking.event_date, booking.event_time, booking.status, booking.payment_status):
+        reminder_scheduler.schedule_booking(booking)
+    booking_analytics.replace(rollup_before, booking)
+    change_feed.record("booking", booking)
+    costume_inventory.transition(hold_before, costume_inventory.hold(booking))
     
     db.session.commit()
+    booking_calendar.invalidate(schedule_before[0], booking.event_date)
+    data_cache.invalidate("stats")
     return jsonify(booking.serialize()), 200
 
 
@@ -802,11 +1010,39 @@ def delete_booking(id):
     if booking.user_id != user_id and not user.is_admin:
         return jsonify({"msg": "No autorizado"}), 403
     
+    event_date = booking.event_date
+    reminder_scheduler.cancel_booking(booking.id)
+    booking_analytics.apply(booking_analytics.contribution(booking), sign=-1)
+    change_feed.record("booking", booking, action="delete")
+    hold = costume_inventory.hold(booking)
+    if hold:
+        costume_inventory.release(*hold)
     db.session.delete(booking)
     db.session.commit()
+    booking_calendar.invalidate(event_date)
+    data_cache.invalidate("stats")
     return jsonify({"msg": "Reserva eliminada"}), 200
 
 
+@api.route("/changes", methods=["GET"])
+@jwt_required()
+def get_changes():
+    """
+    Sincronización incremental de reservas y eventos.
+    Sin since devuelve solo el cursor inicial (pedirlo antes de la carga
+    completa); con since, los cambios posteriores del usuario (admin: todos).
+    """
+    user_id = int(get_jwt_identity())
+    if request.args.get("since") is None:
+        return jsonify({"cursor": change_feed.current_cursor()}), 200
+
+    since = change_feed.parse_cursor(request.args.get("since"))
+    limit = min(request.args.get("limit", change_feed.PAGE_SIZE, type=int), change_feed.PAGE_SIZE)
+    user = User.query.get(user_id)
+    scope = None if user.is_admin else user_id
+    return jsonify(change_feed.changes(since, user_id=scope, limit=max(limit, 1))), 200
+
+
 # ====================================
 # ESTADÍSTICAS (Admin)
 # ====================================
@@ -815,17 +1051,241 @@ def delete_booking(id):
 @admin_required
 def get_stats():
     """Obtener estadísticas generales (solo admin)"""
-    stats = {
-        "total_users": User.query.count(),
-        "total_bookings": Booking.query.count(),
-        "pending_bookings": Booking.query.filter_by(status="pending").count(),
-        "total_costumes": Costume.query.count(),
-        "available_costumes": Costume.query.filter_by(available=True).count(),
-        "total_packages": AnimationPackage.query.count(),
-        "unread_contacts": Contact.query.filter_by(status="pending").count()
-    }
+    def load():
+        return {
+            "total_users": User.query.count(),
+            "total_bookings": Booking.query.count(),
+            "pending_bookings": Booking.query.filter_by(status="pending").count(),
+            "total_costumes": Costume.query.count(),
+            "available_costumes": Costume.query.filter_by(available=True).count(),
+            "total_packages": AnimationPackage.query.count(),
+            "unread_contacts": Contact.query.filter_by(status="pending").count()
+        }
     
-    return jsonify(stats), 200
+    # Las escrituras de reservas, contactos y usuarios invalidan "stats"; el catálogo, "catalog"
+    return jsonify(data_cache.get_or_set("stats", load, tags=["stats", "catalog"])), 200
+
+
+@api.route("/analytics/revenue", methods=["GET"])
+@admin_required
+def get_analytics_revenue():
+    """Serie de revenue/reservas por día, semana o mes desde los rollups (solo admin)"""
+    start, end = booking_analytics.parse_range(request.args.get("from"), request.args.get("to"))
+    return jsonify(booking_analytics.timeseries(
+        start, end,
+        granularity=request.args.get("granularity", "month"),
+        dimension=request.args.get("dimension", "all"),
+        key=request.args.get("key")
+    )), 200
+
+
+@api.route("/analytics/top", methods=["GET"])
+@admin_required
+def get_analytics_top():
+    """Top-N de paquetes, disfraces o categorías (solo admin)"""
+    start, end = booking_analytics.parse_range(request.args.get("from"), request.args.get("to"))
+    limit = min(max(request.args.get("limit", 5, type=int), 1), 50)
+    return jsonify(booking_analytics.top(
+        start, end,
+        dimension=request.args.get("dimension", "package"),
+        metric=request.args.get("metric", "revenue"),
+        limit=limit
+    )), 200
+
+
+@api.route("/analytics/utilisation", methods=["GET"])
+@admin_required
+def get_analytics_utilisation():
+    """Utilización del stock_quantity de cada disfraz en el rango (solo admin)"""
+    start, end = booking_analytics.parse_range(request.args.get("from"), request.args.get("to"), default_days=30)
+    return jsonify(booking_analytics.utilisation(start, end)), 200
+
+
+# ====================================
+# CAMPAÑAS DE EMAIL (Admin)
+# ====================================
+
+@api.route("/campaigns", methods=["GET"])
+@admin_required
+def get_campaigns():
+    """Listar campañas de email (solo admin)"""
+    campaigns = EmailCampaign.query.order_by(EmailCampaign.created_at.desc()).all()
+    return jsonify([c.serialize() for c in campaigns]), 200
+
+
+@api.route("/campaigns", methods=["POST"])
+@admin_required
+def create_campaign():
+    """Crear y lanzar una campaña: booking_reminder o announcement (solo admin)"""
+    body = parse_body(CampaignBody)
+    campaign = campaign_service.create(
+        kind=body.kind,
+        subject=body.subject,
+        message=body.message,
+        target_date=body.target_date,
+        created_by=int(get_jwt_identity())
+    )
+    campaign_service.start(campaign.id)
+    return jsonify(campaign.serialize()), 202
+
+
+@api.route("/campaigns/<int:id>", methods=["GET"])
+@admin_required
+def get_campaign(id):
+    """Ver progreso de una campaña (solo admin)"""
+    campaign = EmailCampaign.query.get_or_404(id)
+    return jsonify(campaign.serialize()), 200
+
+
+@api.route("/campaigns/<int:id>/resume", methods=["POST"])
+@admin_required
+def resume_campaign(id):
+    """Reanudar una campaña fallida o interrumpida desde su cursor (solo admin)"""
+    campaign = EmailCampaign.query.get_or_404(id)
+    campaign_service.start(campaign.id)
+    db.session.refresh(campaign)
+    return jsonify(campaign.serialize()), 202
+
+
+# ====================================
+# IMÁGENES DEL CATÁLOGO
+# ====================================
+
+@api.route("/media", methods=["POST"])
+@admin_required
+def upload_media():
+    """
+    Subir imagen (multipart: file, costume_id y/o package_id opcionales) (solo admin).
+    Las variantes WebP se generan en segundo plano y se escriben en el catálogo.
+    """
+    if not media_service.available:
+        return jsonify({"msg": "Procesamiento de imágenes no disponible en este servidor"}), 503
+
+    costume = package = None
+    if request.form.get("costume_id"):
+        costume = Costume.query.get_or_404(request.form.get("costume_id", type=int))
+    if request.form.get("package_id"):
+        package = AnimationPackage.query.get_or_404(request.form.get("package_id", type=int))
+
+    asset, created = media_service.store_upload(request.files.get("file"), created_by=int(get_jwt_identity()))
+    media_service.attach(asset, costume=costume, package=package)
+    db.session.commit()
+    if costume or package:
+        data_cache.invalidate("catalog")
+
+    if asset.status in ("pending", "failed"):
+        media_service.enqueue(asset.id, retry_failed=True)
+        db.session.refresh(asset)
+
+    return jsonify({**asset.serialize(), "duplicate": not created}), 200 if asset.status == "ready" else 202
+
+
+@api.route("/media/<int:id>", methods=["GET"])
+@admin_required
+def get_media(id):
+    """Estado de una imagen subida y sus variantes (solo admin)"""
+    return jsonify(MediaAsset.query.get_or_404(id).serialize()), 200
+
+
+@api.route("/media/<sha256>/<variant>.webp", methods=["GET"])
+def serve_media(sha256, variant):
+    """Variante WebP de una imagen (pública, cacheable para siempre)"""
+    if not media_service.is_valid_variant(sha256, variant):
+        return jsonify({"msg": "Recurso no encontrado"}), 404
+    response = send_from_directory(
+        media_service.variant_dir(sha256), f"{variant}.webp",
+        mimetype="image/webp", max_age=media_service.CACHE_SECONDS, conditional=True
+    )
+    response.headers["Cache-Control"] = f"public, max-age={media_service.CACHE_SECONDS}, immutable"
+    return response
+
+
+# ====================================
+# CUENTAS INACTIVAS (Admin)
+# ====================================
+
+@api.route("/admin/users/purge", methods=["POST"])
+@admin_required
+def purge_inactive_users():
+    """
+    Elimina o anonimiza cuentas inactivas en lotes (solo admin).
+    Body: {"mode": "delete"|"anonymize", "inactive_days": 730, "dry_run": false}
+    """
+    body = parse_body(PurgeBody)
+    mode, inactive_days = body.mode, body.inactive_days or account_service.default_inactive_days
+    matched = account_service.count_inactive(inactive_days)
+    if body.dry_run:
+        return jsonify({"mode": mode, "inactive_days": inactive_days, "matched": matched, "processed": 0}), 200
+
+    processed = account_service.purge(mode, inactive_days)
+    metrics.incr(f"accounts.{mode}d", processed)
+    return jsonify({
+        "mode": mode, "inactive_days": inactive_days, "matched": matched,
+        "processed": processed, "remaining": max(matched - processed, 0),
+    }), 200
+
+
+# ====================================
+# NOTIFICACIONES EN VIVO (Admin, SSE)
+# ====================================
+
+@api.route("/admin/stream/ticket", methods=["POST"])
+@admin_required
+def create_stream_ticket():
+    """Ticket de 60s para abrir el stream con EventSource (que no envía Authorization)"""
+    ticket = event_broker.issue_ticket(current_app.config["SECRET_KEY"], int(get_jwt_identity()))
+    return jsonify({"ticket": ticket, "expires_in": event_broker.TICKET_MAX_AGE}), 200
+
+
+@api.route("/admin/stream", methods=["GET"])
+def admin_stream():
+    """
+    Stream SSE de booking/contact/event .created/.updated/.deleted (solo admin).
+    Autenticación con Authorization: Bearer o ?ticket=; reanuda desde Last-Event-ID.
+    """
+    ticket = request.args.get("ticket")
+    if ticket:
+        user_id = event_broker.verify_ticket(current_app.config["SECRET_KEY"], ticket)
+    else:
+        verify_jwt_in_request()
+        user_id = int(get_jwt_identity())
+    user = db.session.get(User, user_id)
+    if not user or not user.is_admin:
+        return jsonify({"msg": "Acceso denegado. Solo administradores."}), 403
+
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    return Response(
+        event_broker.subscribe(last_event_id),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ====================================
+# BATCH (varias lecturas en un request)
+# ====================================
+
+@api.route("/batch", methods=["POST"])
+@jwt_required()
+def batch():
+    """
+    Ejecuta varios GET del API en un solo request, p. ej. para el dashboard:
+    {"requests": [{"id": "stats", "method": "GET", "path": "/api/stats"}, ...]}
+    Cada respuesta trae su propio status; el batch responde 200.
+    """
+    items = batch_dispatcher.parse(request.get_json(silent=True))
+    return jsonify({"responses": batch_dispatcher.dispatch(items)}), 200
+
+
+# ====================================
+# MÉTRICAS (Admin)
+# ====================================
+
+@api.route("/metrics", methods=["GET"])
+@admin_required
+def get_metrics():
+    """Métricas internas: tamaños de tablas, contadores (solo admin)"""
+    return jsonify(metrics.snapshot()), 200
 
 
 # ====================================
@@ -836,26 +1296,7 @@ def get_stats():
 def test_email():
     """Endpoint temporal para probar SendGrid"""
     to_email = request.args.get("to_email") or "diverkidsinfo@gmail.com"
-    result = email_service.send_email(
-        to_email=to_email,
-        subject="✅ DiverKids - Prueba de Email",
-        html_content="""
-        <div style="font-family: Arial, sans-serif; padding: 20px; background-color: #f4f4f4;">
-            <div style="max-width: 600px; margin: 0 auto; background-color: white; padding: 30px; border-radius: 10px;">
-                <h1 style="color: #6B46C1;">🎉 ¡SendGrid Funciona!</h1>
-                <p>Este email confirma que SendGrid está configurado correctamente en tu proyecto DiverKids.</p>
-                <p><strong>Características:</strong></p>
-                <ul>
-                    <li>✅ API Key configurada</li>
-                    <li>✅ Sender verificado</li>
-                    <li>✅ Emails funcionando</li>
-                </ul>
-                <hr>
-                <p style="color: #666; font-size: 12px;">Este es un email de prueba generado automáticamente.</p>
-            </div>
-        </div>
-        """
-    )
+    result = email_service.send_template(to_email, "✅ DiverKids - Prueba de Email", "test_email")
     return jsonify({
         "success": result,
         "to_email": to_email,
@@ -0,0 +1,175 @@
+"""
+Planificador persistente de recordatorios basados en la fecha de la reserva
+
+Cada reserva tiene a lo sumo un trabajo por tipo en la tabla scheduled_job
+(recordatorio 24h antes, aviso de pago pendiente, seguimiento post-evento).
+Los trabajos se recalculan solo para la reserva que cambia, nunca recorriendo
+todas las reservas. Varios workers pueden sondear la tabla a la vez: el
+reclamo usa SELECT ... FOR UPDATE SKIP LOCKED (PostgreSQL) más un UPDATE
+condicional con lease, así ningún trabajo se dispara dos veces.
+"""
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+from models import db, Booking, ScheduledJob
+from email_service import email_service
+from utils import build_event_datetimes
+
+
+class ReminderScheduler:
+    """Programa, reclama y ejecuta los trabajos de cada reserva"""
+
+    LEASE = timedelta(minutes=5)
+    MAX_ATTEMPTS = 3
+    RETRY_DELAY = timedelta(minutes=5)
+
+    def __init__(self):
+        self.batch_size = int(os.environ.get("SCHEDULER_BATCH_SIZE", "20"))
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        # La hora de la reserva es hora local del negocio (la misma zona que Google Calendar)
+        self.timezone = ZoneInfo(os.environ.get("GOOGLE_CALENDAR_TIMEZONE", "America/Santiago"))
+
+    def event_start(self, booking):
+        """Inicio del evento en UTC naive, como utcnow() y run_at; hora inválida o vacía = 12:00 local"""
+        try:
+            local = build_event_datetimes(booking.event_date.isoformat(), booking.event_time)[0]
+        except ValueError:
+            local = build_event_datetimes(booking.event_date.isoformat())[0]
+        return local.replace(tzinfo=self.timezone).astimezone(timezone.utc).replace(tzinfo=None)
+
+    def desired_jobs(self, booking, now=None):
+        """Tipo -> run_at que debería tener la reserva (None = no corresponde)"""
+        now = now or datetime.utcnow()
+        if booking.status == "cancelled":
+            return {}
+        start = self.event_start(booking)
+        upcoming = start > now
+        follow_up = start + timedelta(hours=24)
+        return {
+            "reminder_24h": start - timedelta(hours=24) if upcoming else None,
+            "payment_nudge": (
+                max(now + timedelta(hours=1), start - timedelta(hours=72))
+                if upcoming and booking.payment_status == "pending" else None
+            ),
+            # Editar una reserva antigua no debe disparar el seguimiento al instante
+            "follow_up": follow_up if follow_up > now else None,
+        }
+
+    # ------------------------------------
+    # Recalculo incremental (llamado desde las rutas, sin commit)
+    # ------------------------------------
+
+    def schedule_booking(self, booking):
+        """Crea/mueve/elimina los trabajos de UNA reserva. La reserva debe tener id (flush)"""
+        desired = self.desired_jobs(booking)
+        existing = {job.kind: job for job in ScheduledJob.query.filter_by(booking_id=booking.id)}
+
+        for kind in ("reminder_24h", "payment_nudge", "follow_up"):
+            run_at = desired.get(kind)
+            job = existing.get(kind)
+            if run_at is None:
+                if job and job.status in ("pending", "failed"):
+                    db.session.delete(job)
+            elif job is None:
+                db.session.add(ScheduledJob(kind=kind, booking_id=booking.id, run_at=run_at))
+            elif job.run_at != run_at and job.status != "running":
+                job.run_at = run_at
+                job.status = "pending"
+                job.attempts = 0
+                job.last_error = None
+
+    def cancel_booking(self, booking_id):
+        """Elimina todos los trabajos de una reserva (antes de borrarla)"""
+        ScheduledJob.query.filter_by(booking_id=booking_id).delete(synchronize_session=False)
+
+    # ------------------------------------
+    # Reclamo y ejecución (trabajo periódico)
+    # ------------------------------------
+
+    def _due_filter(self, now):
+        return db.or_(
+            db.and_(ScheduledJob.status == "pending", ScheduledJob.run_at <= now),
+            db.and_(ScheduledJob.status == "running", ScheduledJob.locked_until < now)
+        )
+
+    def claim_due(self, limit=None):
+        """Reclama hasta `limit` trabajos vencidos para este worker"""
+        now = datetime.utcnow()
+        due = self._due_filter(now)
+        ids = [row.id for row in db.session.query(ScheduledJob.id).filter(due)
+               .order_by(ScheduledJob.run_at).limit(limit or self.batch_size)
+               .with_for_update(skip_locked=True)]
+        if not ids:
+            db.session.commit()
+            return []
+
+        claim_token = f"{self.worker_id}-{uuid.uuid4().hex[:8]}"
+        ScheduledJob.query.filter(ScheduledJob.id.in_(ids), due).update({
+            "status": "running",
+            "locked_by": claim_token,
+            "locked_until": now + self.LEASE,
+            "attempts": ScheduledJob.attempts + 1,
+        }, synchronize_session=False)
+        db.session.commit()
+        return ScheduledJob.query.filter_by(locked_by=claim_token).order_by(ScheduledJob.run_at).all()
+
+    def run_due(self):
+        """Ejecuta los trabajos vencidos reclamados. Devuelve cuántos procesó"""
+        claimed = self.claim_due()
+        for job in claimed:
+            try:
+                self._execute(job)
+                job.status = "done"
+                job.last_error = None
+            except Exception as error:
+                print(f"⚠️ Trabajo {job.kind} de reserva {job.booking_id} falló: {error}")
+                job.last_error = str(error)
+                if job.attempts >= self.MAX_ATTEMPTS:
+                    job.status = "failed"
+                else:
+                    job.status = "pending"
+                    job.run_at = datetime.utcnow() + self.RETRY_DELAY * job.attempts
+            job.locked_by = None
+            job.locked_until = None
+            db.session.commit()
+        return len(claimed)
+
+    def _execute(self, job):
+        booking = db.session.get(Booking, job.booking_id)
+        if not booking or booking.status == "cancelled" or not booking.user:
+            return
+        user = booking.user
+        details = {
+            "user_name": user.name,
+            "event_date": booking.event_date.strftime("%d/%m/%Y"),
+            "event_time": booking.event_time or "Por confirmar",
+            "event_location": booking.event_location or "Por confirmar",
+        }
+
+        if job.kind == "reminder_24h":
+            sent = email_service.send_template(
+                user.email, "¡Tu fiesta DiverKids es mañana! 🎉", "booking_reminder", **details
+            )
+        elif job.kind == "payment_nudge":
+            if booking.payment_status != "pending":
+                return
+            sent = email_service.send_template(
+                user.email, "Pago pendiente de tu reserva - DiverKids", "payment_reminder",
+                total_price=booking.total_price, **details
+            )
+        elif job.kind == "follow_up":
+            sent = email_service.send_template(
+                user.email, "¡Gracias por celebrar con DiverKids! 🎈", "follow_up",
+                frontend_url=os.environ.get("FRONTEND_URL", "http://localhost:5173"), **details
+            )
+        else:
+            raise ValueError(f"Tipo de trabajo desconocido: {job.kind}")
+
+        if not sent:
+            raise RuntimeError("El email no pudo enviarse")
+
+
+# Instancia global del planificador
+reminder_scheduler = ReminderScheduler()
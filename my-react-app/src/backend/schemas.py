@@ -0,0 +1,258 @@
+"""
+Esquemas de los bodies JSON de escritura (msgspec)
+
+Cada endpoint que recibe JSON declara aquí su struct: tipos, requeridos y
+límites (los largos coinciden con las columnas). Los decoders se compilan
+una sola vez al importar y decodifican los bytes del request directo al
+struct, sin pasar por un dict intermedio, así el input inválido se rechaza
+antes de tocar la base:
+
+- body vacío o JSON mal formado -> 400
+- JSON válido que no cumple el esquema -> 422, con el campo en "field"
+
+Los decoders son laxos (strict=False): aceptan números y booleanos como
+string ("3", "true"), que es como llegan desde los formularios HTML. Los
+campos desconocidos se ignoran (p. ej. total_price, que calcula el servidor).
+
+En los PUT todos los campos valen UNSET por defecto: `assigned_fields`
+devuelve solo los que vinieron en el body.
+"""
+import re
+from datetime import date
+from typing import Annotated, Literal, Optional, Union
+import msgspec
+from msgspec import UNSET, Meta, Struct, UnsetType
+from flask import request
+
+
+class SchemaError(ValueError):
+    """Body JSON ausente, mal formado (400) o fuera del esquema (422)"""
+
+    def __init__(self, message, status=422, field=None):
+        super().__init__(message)
+        self.status = status
+        self.field = field
+
+
+def text(max_length=None, min_length=1):
+    """String con largo acotado (por defecto no vacío)"""
+    return Annotated[str, Meta(min_length=min_length, max_length=max_length)]
+
+
+ISO_DATE = Annotated[str, Meta(pattern=r"^\d{4}-\d{2}-\d{2}$")]  # Event.date es texto
+PositiveInt = Annotated[int, Meta(ge=1)]
+Price = Annotated[float, Meta(gt=0)]
+
+BookingStatus = Literal["pending", "confirmed", "completed", "cancelled"]
+PaymentStatus = Literal["pending", "paid", "refunded"]
+EventStatus = Literal["pending", "confirmed", "cancelled"]
+ContactStatus = Literal["pending", "read", "replied"]
+
+
+# ====================================
+# AUTENTICACIÓN
+# ====================================
+
+class SignupBody(Struct):
+    name: text(100)
+    email: text(120)
+    password: text(128)
+    phone: Optional[text(20, min_length=0)] = ""
+    # Sin `role`: el registro público siempre crea un parent (los admin salen de seed.py)
+
+
+class LoginBody(Struct):
+    email: text(120)
+    password: text(128)
+
+
+class ProfileBody(Struct):
+    name: Union[Optional[text(100, min_length=0)], UnsetType] = UNSET
+    phone: Union[Optional[text(20, min_length=0)], UnsetType] = UNSET
+    new_password: Union[Optional[text(128, min_length=0)], UnsetType] = UNSET
+
+
+class ForgotPasswordBody(Struct):
+    email: text(120)
+
+
+class ResetPasswordBody(Struct):
+    token: text(200)
+    new_password: text(128)
+
+
+# ====================================
+# EVENTOS Y CONTACTO
+# ====================================
+
+class EventBody(Struct):
+    title: text(150)
+    date: ISO_DATE
+    time: Optional[text(20, min_length=0)] = None
+    location: Optional[text(200, min_length=0)] = None
+    description: str = ""
+
+
+class EventUpdateBody(Struct):
+    title: Union[text(150), UnsetType] = UNSET
+    date: Union[ISO_DATE, UnsetType] = UNSET
+    time: Union[Optional[text(20, min_length=0)], UnsetType] = UNSET
+    location: Union[Optional[text(200, min_length=0)], UnsetType] = UNSET
+    description: Union[str, UnsetType] = UNSET
+    status: Union[EventStatus, UnsetType] = UNSET
+
+
+class ContactBody(Struct):
+    name: text(120)
+    email: text(120)
+    message: text()
+    phone: Optional[text(20, min_length=0)] = None
+
+
+class ContactUpdateBody(Struct):
+    status: Union[ContactStatus, UnsetType] = UNSET
+
+
+# ====================================
+# CATÁLOGO
+# ====================================
+
+class CostumeBody(Struct):
+    name: text(120)
+    price_per_day: Price
+    description: Optional[str] = None
+    category: Optional[text(50, min_length=0)] = None
+    size: Optional[text(20, min_length=0)] = None
+    image_url: Optional[text(300, min_length=0)] = None
+    available: bool = True
+    stock_quantity: Annotated[int, Meta(ge=0)] = 1
+
+
+class CostumeUpdateBody(Struct):
+    name: Union[text(120), UnsetType] = UNSET
+    price_per_day: Union[Price, UnsetType] = UNSET
+    description: Union[Optional[str], UnsetType] = UNSET
+    category: Union[Optional[text(50, min_length=0)], UnsetType] = UNSET
+    size: Union[Optional[text(20, min_length=0)], UnsetType] = UNSET
+    image_url: Union[Optional[text(300, min_length=0)], UnsetType] = UNSET
+    available: Union[bool, UnsetType] = UNSET
+    stock_quantity: Union[Annotated[int, Meta(ge=0)], UnsetType] = UNSET
+
+
+class PackageBody(Struct):
+    name: text(120)
+    price: Price
+    description: Optional[str] = None
+    duration_hours: PositiveInt = 2
+    includes: Optional[str] = None
+    max_children: Optional[PositiveInt] = None
+    image_url: Optional[text(300, min_length=0)] = None
+    available: bool = True
+
+
+class PackageUpdateBody(Struct):
+    name: Union[text(120), UnsetType] = UNSET
+    price: Union[Price, UnsetType] = UNSET
+    description: Union[Optional[str], UnsetType] = UNSET
+    duration_hours: Union[PositiveInt, UnsetType] = UNSET
+    includes: Union[Optional[str], UnsetType] = UNSET
+    max_children: Union[Optional[PositiveInt], UnsetType] = UNSET
+    image_url: Union[Optional[text(300, min_length=0)], UnsetType] = UNSET
+    available: Union[bool, UnsetType] = UNSET
+
+
+# ====================================
+# COTIZACIONES Y RESERVAS
+# ====================================
+
+class QuoteBody(Struct):
+    costume_id: Optional[PositiveInt] = None
+    package_id: Optional[PositiveInt] = None
+    rental_days: PositiveInt = 1  # el máximo lo valida quote_service
+    num_children: Optional[PositiveInt] = None
+
+
+class BookingBody(Struct):
+    booking_type: Literal["costume", "package", "both"]
+    event_date: date
+    event_time: Optional[text(20, min_length=0)] = None
+    event_location: Optional[text(300, min_length=0)] = None
+    event_address: Optional[str] = None
+    num_children: Optional[PositiveInt] = None
+    costume_id: Optional[PositiveInt] = None
+    package_id: Optional[PositiveInt] = None
+    rental_days: PositiveInt = 1
+    special_requests: Optional[str] = None
+
+
+class BookingUpdateBody(Struct):
+    status: Union[BookingStatus, UnsetType] = UNSET
+    payment_status: Union[PaymentStatus, UnsetType] = UNSET
+    event_date: Union[date, UnsetType] = UNSET
+    event_time: Union[Optional[text(20, min_length=0)], UnsetType] = UNSET
+    event_location: Union[Optional[text(300, min_length=0)], UnsetType] = UNSET
+    special_requests: Union[Optional[str], UnsetType] = UNSET
+
+
+# ====================================
+# ADMIN
+# ====================================
+
+class CampaignBody(Struct):
+    kind: text(50)  # los tipos válidos los valida campaign_service
+    subject: Optional[text(200, min_length=0)] = None
+    message: Optional[str] = None
+    target_date: Optional[str] = None
+
+
+class PurgeBody(Struct):
+    mode: Literal["delete", "anonymize"]
+    inactive_days: Optional[Annotated[int, Meta(ge=30)]] = None  # None: ACCOUNT_INACTIVE_DAYS
+    dry_run: bool = False
+
+
+# Decoders compilados una vez por esquema
+_DECODERS = {
+    schema: msgspec.json.Decoder(schema, strict=False)
+    for schema in (
+        SignupBody, LoginBody, ProfileBody, ForgotPasswordBody, ResetPasswordBody,
+        EventBody, EventUpdateBody, ContactBody, ContactUpdateBody,
+        CostumeBody, CostumeUpdateBody, PackageBody, PackageUpdateBody,
+        QuoteBody, BookingBody, BookingUpdateBody, CampaignBody, PurgeBody,
+    )
+}
+
+_AT_PATH = re.compile(r" - at `\$\.?([^`]*)`$")
+_MISSING = re.compile(r"missing required field `([^`]+)`")
+
+
+def parse_body(schema):
+    """Decodifica el body del request actual en `schema` o lanza SchemaError"""
+    data = request.get_data(cache=True)
+    if not data.strip():
+        raise SchemaError("Se requiere un body JSON", status=400)
+    try:
+        return _DECODERS[schema].decode(data)
+    except msgspec.ValidationError as error:
+        raise _schema_error(str(error)) from None
+    except msgspec.DecodeError:
+        raise SchemaError("JSON mal formado", status=400) from None
+
+
+def _schema_error(detail):
+    missing = _MISSING.search(detail)
+    if missing:
+        return SchemaError(f"Falta el campo requerido '{missing.group(1)}'", field=missing.group(1))
+    at = _AT_PATH.search(detail)
+    if not at:
+        return SchemaError(f"Body inválido: {detail}")
+    field = at.group(1)
+    return SchemaError(f"Valor inválido en '{field}': {detail[:at.start()]}", field=field)
+
+
+def assigned_fields(body):
+    """{campo: valor} de los campos que vinieron en un body de PUT"""
+    return {
+        name: value for name in body.__struct_fields__
+        if (value := getattr(body, name)) is not UNSET
+    }
@@ -0,0 +1,201 @@
+"""
+Utilidades compartidas por las rutas de la API
+"""
+from datetime import datetime, timedelta
+from flask import request
+from sqlalchemy.orm import load_only, selectinload
+from models import User, Costume, AnimationPackage, Booking
+
+
+class FieldsError(ValueError):
+    """Parámetro ?fields= con campos no permitidos (o ?format= desconocido)"""
+
+
+def build_event_datetimes(date_str, time_str=None, duration_hours=2):
+    """Construye datetime inicio/fin para Google Calendar."""
+    base_date = datetime.strptime(date_str, "%Y-%m-%d").date()
+    if time_str:
+        base_time = datetime.strptime(time_str, "%H:%M").time()
+    else:
+        base_time = datetime.strptime("12:00", "%H:%M").time()
+    start_dt = datetime.combine(base_date, base_time)
+    end_dt = start_dt + timedelta(hours=max(1, int(duration_hours or 1)))
+    return start_dt, end_dt
+
+
+# ====================================
+# SPARSE FIELDSETS (?fields=)
+# ====================================
+
+# Por recurso: modelo, columnas que siempre se cargan y, por cada campo
+# público permitido, las columnas y relaciones que necesita para serializarse.
+SPARSE_FIELDSETS = {
+    "costume": {
+        "model": Costume,
+        "always": ("id",),
+        "fields": {
+            name: ((name,), ()) for name in (
+                "id", "name", "description", "category", "size", "price_per_day",
+                "image_url", "image_variants", "available", "stock_quantity", "created_at", "updated_at"
+            )
+        },
+    },
+    "package": {
+        "model": AnimationPackage,
+        "always": ("id",),
+        "fields": {
+            name: ((name,), ()) for name in (
+                "id", "name", "description", "duration_hours", "price", "includes",
+                "max_children", "image_url", "image_variants", "available", "created_at", "updated_at"
+            )
+        },
+    },
+    "booking": {
+        "model": Booking,
+        "always": ("id", "user_id"),
+        "fields": {
+            **{
+                name: ((name,), ()) for name in (
+                    "id", "user_id", "booking_type", "event_date", "event_time",
+                    "event_location", "event_address", "num_children", "special_requests",
+                    "total_price", "status", "payment_status", "created_at", "updated_at"
+                )
+            },
+            "user_name": (("user_id",), ("user",)),
+            "user_email": (("user_id",), ("user",)),
+            "costume": (("costume_id",), ("costume",)),
+            "package": (("package_id",), ("package",)),
+        },
+    },
+}
+
+
+def parse_fields(resource):
+    """
+    Lee ?fields=a,b,c y lo valida contra la allow-list del recurso.
+
+    Returns:
+        list | None: campos pedidos (sin duplicados, con `id`) o None si no se pidió
+    Raises:
+        FieldsError: si algún campo no está permitido
+    """
+    raw = request.args.get("fields")
+    if raw is None:
+        return None
+
+    allowed = SPARSE_FIELDSETS[resource]["fields"]
+    requested = []
+    for name in raw.split(","):
+        name = name.strip()
+        if name and name not in requested:
+            requested.append(name)
+
+    invalid = [name for name in requested if name not in allowed]
+    if invalid or not requested:
+        raise FieldsError(
+            f"Campos no permitidos en 'fields': {', '.join(invalid) or '(vacío)'}. "
+            f"Permitidos: {', '.join(allowed)}"
+        )
+
+    if "id" not in requested:
+        requested.insert(0, "id")
+    return requested
+
+
+def apply_fields(query, resource, fields):
+    """Traduce los campos pedidos a load_only/selectinload sobre la consulta"""
+    if not fields:
+        return query
+
+    spec = SPARSE_FIELDSETS[resource]
+    model = spec["model"]
+    columns = list(spec["always"])
+    relations = []
+    for name in fields:
+        field_columns, field_relations = spec["fields"][name]
+        columns.extend(c for c in field_columns if c not in columns)
+        relations.extend(r for r in field_relations if r not in relations)
+
+    options = [load_only(*[getattr(model, c) for c in columns])]
+    options.extend(selectinload(getattr(model, r)) for r in relations)
+    return query.options(*options)
+
+
+# ====================================
+# FORMATO COMPACTO (?format=compact)
+# ====================================
+
+# Campo de relación de la reserva -> (columna FK que la reemplaza, tipo en "included")
+COMPACT_RELATIONS = {
+    "costume": ("costume_id", "costumes"),
+    "package": ("package_id", "packages"),
+    "user_name": ("user_id", "users"),
+    "user_email": ("user_id", "users"),
+}
+
+# Tipo en "included" -> (modelo, columna FK en la reserva, columnas a cargar, serializador)
+COMPACT_INCLUDED = {
+    "costumes": (Costume, "costume_id", None, lambda costume: costume.serialize()),
+    "packages": (AnimationPackage, "package_id", None, lambda package: package.serialize()),
+    "users": (User, "user_id", ("id", "name", "email"),
+              lambda user: {"id": user.id, "name": user.name, "email": user.email}),
+}
+
+
+def compact_requested():
+    """True si se pidió ?format=compact; otro valor de format responde 400"""
+    fmt = request.args.get("format")
+    if fmt is None:
+        return False
+    if fmt != "compact":
+        raise FieldsError("Formato no soportado en 'format'. Permitidos: compact")
+    return True
+
+
+def compact_fields(fields):
+    """
+    Traduce ?fields= (o todos los campos) al formato compacto.
+
+    Returns:
+        tuple: (columnas de la reserva, tipos a incluir en "included")
+    """
+    columns, kinds = ["id"], []
+    for name in fields or SPARSE_FIELDSETS["booking"]["fields"]:
+        column, kind = COMPACT_RELATIONS.get(name, (name, None))
+        if column not in columns:
+            columns.append(column)
+        if kind and kind not in kinds:
+            kinds.append(kind)
+    return columns, kinds
+
+
+def apply_compact(query, columns):
+    """Carga solo las columnas de la reserva; las relaciones van aparte en load_included"""
+    loaded = list(dict.fromkeys(["id", "user_id", *columns]))
+    return query.options(load_only(*[getattr(Booking, c) for c in loaded]))
+
+
+def compact_booking(booking, columns):
+    """Reserva (o reserva archivada) con solo `columns`: las relaciones quedan como IDs"""
+    data = booking.serialize([c for c in columns if c not in ("costume_id", "package_id")])
+    return {c: data[c] if c in data else getattr(booking, c) for c in columns}
+
+
+def load_included(bookings, kinds):
+    """Una consulta IN por tipo: {tipo: {id: entidad serializada}}"""
+    included = {}
+    for kind in kinds:
+        model, foreign_key, columns, serialize = COMPACT_INCLUDED[kind]
+        ids = {getattr(booking, foreign_key) for booking in bookings} - {None}
+        query = model.query.filter(model.id.in_(ids))
+        if columns:
+            query = query.options(load_only(*[getattr(model, c) for c in columns]))
+        included[kind] = {str(entity.id): serialize(entity) for entity in query} if ids else {}
+    return included
+
+
+def compact_payload(bookings, columns, kinds, archived=()):
+    """{"data": [...], "included": {...}}; las archivadas van al final con "archived": true"""
+    data = [compact_booking(booking, columns) for booking in bookings]
+    data.extend(dict(compact_booking(booking, columns), archived=True) for booking in archived)
+    return {"data": data, "included": load_included([*bookings, *archived], kinds)}
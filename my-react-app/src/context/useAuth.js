@@ -40,10 +40,10 @@ export const useProvideAuth = () => {
         }
     };
 
-    const signup = async (name, email, password, role = 'parent') => {
+    const signup = async (name, email, password) => {
         setLoading(true);
         try {
-            const response = await axios.post(`${API_URL}/signup`, { name, email, password, role });
+            const response = await axios.post(`${API_URL}/signup`, { name, email, password });
             setLoading(false);
             return { success: true, message: response.data.msg };
         } catch (error) {
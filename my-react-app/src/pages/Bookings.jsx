@@ -17,6 +17,8 @@ function Bookings() {
   const [loading, setLoading] = react.useState(true);
   const [showForm, setShowForm] = react.useState(false);
   const [editingBooking, setEditingBooking] = react.useState(null);
+  // Misma clave en reintentos de la misma reserva: el backend no la duplica
+  const idempotencyKey = react.useRef(crypto.randomUUID());
 
   const [formData, setFormData] = react.useState({
     booking_type: 'costume', // costume, package, both
@@ -135,12 +137,21 @@ function Bookings() {
   const handleSubmit = async (e) => {
     e.preventDefault();
 
+    // Los selects y el input numérico entregan '' cuando están vacíos: el API espera null
+    const payload = {
+      ...formData,
+      costume_id: formData.costume_id || null,
+      package_id: formData.package_id || null,
+      num_children: formData.num_children || null,
+      total_price: calculatedTotal
+    };
+
     try {
       if (editingBooking) {
         // Actualizar
         await axios.put(
           `${API_URL}/bookings/${editingBooking.id}`,
-          { ...formData, total_price: calculatedTotal },
+          payload,
           { headers: { Authorization: `Bearer ${token}` } }
         );
         alert('Reserva actualizada exitosamente');
@@ -148,9 +159,15 @@ function Bookings() {
         // Crear
         await axios.post(
           `${API_URL}/bookings`,
-          { ...formData, total_price: calculatedTotal },
-          { headers: { Authorization: `Bearer ${token}` } }
+          payload,
+          {
+            headers: {
+              Authorization: `Bearer ${token}`,
+              'Idempotency-Key': idempotencyKey.current
+            }
+          }
         );
+        idempotencyKey.current = crypto.randomUUID();
         alert('Reserva creada exitosamente');
       }
 
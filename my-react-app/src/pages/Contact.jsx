@@ -1,4 +1,4 @@
-import React, { useState } from "react";
+import React, { useRef, useState } from "react";
 import axios from "axios";
 import "../styles/estilosPaguinas.css";
 import { API_URL } from "../config/api";
@@ -6,13 +6,18 @@ import { API_URL } from "../config/api";
 export default function Contact() {
     const [form, setForm] = useState({ name: "", email: "", message: "" });
     const [msg, setMsg] = useState("");
+    // Misma clave en reintentos del mismo envío: el backend no duplica el mensaje
+    const idempotencyKey = useRef(crypto.randomUUID());
 
     const handleSubmit = async (e) => {
         e.preventDefault();
         try {
-            const res = await axios.post(`${API_URL}/contact`, form);
+            const res = await axios.post(`${API_URL}/contact`, form, {
+                headers: { "Idempotency-Key": idempotencyKey.current }
+            });
             setMsg(res.data.msg);
             setForm({ name: "", email: "", message: "" });
+            idempotencyKey.current = crypto.randomUUID();
         } catch (error) {
             setMsg("Error al enviar mensaje");
             console.error(error);
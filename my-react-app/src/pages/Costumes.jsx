@@ -211,7 +211,7 @@ function Costumes() {
                       <Link to={`/costumes/${costume.id}`} className="costume-image-link">
                         <div className="costume-image">
                           {costume.image_url ? (
-                            <img src={resolveImageUrl(costume.image_url)} alt={costume.name} />
+                            <img src={resolveImageUrl(costume.image_variants?.card || costume.image_url)} alt={costume.name} loading="lazy" />
                           ) : (
                             <div className="placeholder-image">
                               <span>🎭</span>
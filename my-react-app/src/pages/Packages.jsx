@@ -158,7 +158,7 @@ function Packages() {
                 <Link to={`/packages/${pkg.id}`} className="package-image-link">
                   <div className="package-image">
                     {pkg.image_url ? (
-                      <img src={resolveImageUrl(pkg.image_url)} alt={pkg.name} />
+                      <img src={resolveImageUrl(pkg.image_variants?.card || pkg.image_url)} alt={pkg.name} loading="lazy" />
                     ) : (
                       <div className="placeholder-image">🎉</div>
                     )}